@@ -0,0 +1,117 @@
+import re
+import aiosqlite
+from fastapi import HTTPException
+from typing import Optional, List, Any, Tuple
+
+# Full-text search over the app catalog (see migration 9). internal_apps_fts is a
+# separate FTS5 table with rowid = internal_apps.id, kept in sync by triggers;
+# capabilities holds the manifest's capabilities.data_types and .operations.
+# status is indexed too so the facet filters inside MATCH: ranking and paging
+# then never join internal_apps, whose plan would hinge on fresh statistics.
+
+TEXT_COLUMNS = "{name display_name description capabilities}"
+
+SEARCH_MAX_LIMIT = 100
+
+def _capabilities(row: str) -> str:
+    """SQL for the space-separated capability words of a row's manifest_data (NULL if invalid)"""
+    return f"""
+        CASE WHEN json_valid({row}manifest_data) THEN (
+            SELECT group_concat(value, ' ') FROM (
+                SELECT value FROM json_each({row}manifest_data, '$.capabilities.data_types')
+                UNION ALL
+                SELECT value FROM json_each({row}manifest_data, '$.capabilities.operations')
+            )
+        ) END
+    """
+
+APP_SEARCH_SCHEMA_SQL: List[str] = [
+    # prefix indexes make 2-3 character prefix queries single range scans
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS internal_apps_fts USING fts5(
+        name, display_name, description, capabilities, status,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    # Persistent rank function: names outweigh descriptions, so ORDER BY rank is served by FTS5 itself
+    "INSERT INTO internal_apps_fts (internal_apps_fts, rank) VALUES ('rank', 'bm25(10.0, 8.0, 2.0, 4.0, 0.0)')",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_fts_insert AFTER INSERT ON internal_apps BEGIN
+        INSERT INTO internal_apps_fts (rowid, name, display_name, description, capabilities, status)
+        VALUES (NEW.id, NEW.name, NEW.display_name, NEW.description, {_capabilities("NEW.")}, NEW.status);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_fts_update
+    AFTER UPDATE OF name, display_name, description, manifest_data, status ON internal_apps BEGIN
+        DELETE FROM internal_apps_fts WHERE rowid = OLD.id;
+        INSERT INTO internal_apps_fts (rowid, name, display_name, description, capabilities, status)
+        VALUES (NEW.id, NEW.name, NEW.display_name, NEW.description, {_capabilities("NEW.")}, NEW.status);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_fts_delete AFTER DELETE ON internal_apps BEGIN
+        DELETE FROM internal_apps_fts WHERE rowid = OLD.id;
+    END
+    """,
+]
+
+# Index the existing catalog (migration 9); rerunning rebuilds the index from scratch
+REBUILD_APP_SEARCH_SQL: List[str] = [
+    "DELETE FROM internal_apps_fts",
+    f"""
+    INSERT INTO internal_apps_fts (rowid, name, display_name, description, capabilities, status)
+    SELECT id, name, display_name, description, {_capabilities("")}, status FROM internal_apps
+    """,
+    "INSERT INTO internal_apps_fts (internal_apps_fts) VALUES ('optimize')",
+]
+
+_WORD = re.compile(r"\w+")
+
+def _facet_words(name: str, value: str) -> List[str]:
+    words = _WORD.findall(value.lower())
+    if not words:
+        # Dropping the facet would widen the search instead of matching nothing
+        raise HTTPException(status_code=400, detail=f"{name} must contain a word to filter on")
+    return words
+
+def match_expression(q: str, capability: Optional[str] = None, status: Optional[str] = None) -> str:
+    """FTS5 MATCH for a free-text query: every word as a prefix of a text column, ANDed, plus the facets
+
+    Words are reduced to letters and digits and quoted, so user input can never
+    inject FTS5 query syntax.
+    """
+    terms = [f'{TEXT_COLUMNS} : "{word}"*' for word in _WORD.findall(q.lower())]
+    if capability:
+        terms += [f'capabilities : "{word}"' for word in _facet_words("capability", capability)]
+    if not terms:
+        raise HTTPException(status_code=400, detail="q or capability must contain a word to search for")
+    if status:
+        terms += [f'status : "{word}"' for word in _facet_words("status", status)]
+    return " AND ".join(terms)
+
+async def search_apps(db: aiosqlite.Connection, q: str, capability: Optional[str] = None,
+                      status: Optional[str] = None, limit: int = 20, offset: int = 0,
+                      count: bool = False) -> Tuple[List[Any], bool, Optional[int]]:
+    """Ranked catalog matches: (rows of this page, whether more follow, total matches if count)"""
+    match = match_expression(q, capability, status)
+    cursor = await db.execute("""
+        SELECT rowid FROM internal_apps_fts WHERE internal_apps_fts MATCH ?
+        ORDER BY rank LIMIT ? OFFSET ?
+    """, (match, limit + 1, offset))
+    ids = [row[0] for row in await cursor.fetchall()]
+    page = ids[:limit]
+
+    rows = []
+    if page:
+        cursor = await db.execute(
+            f"SELECT * FROM internal_apps WHERE id IN ({', '.join('?' * len(page))})", page
+        )
+        by_id = {row['id']: row for row in await cursor.fetchall()}
+        rows = [by_id[app_id] for app_id in page if app_id in by_id]
+
+    total = None
+    if count:
+        cursor = await db.execute("SELECT COUNT(*) FROM internal_apps_fts WHERE internal_apps_fts MATCH ?", (match,))
+        total = (await cursor.fetchone())[0]
+    return rows, len(ids) > limit, total
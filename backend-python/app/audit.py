@@ -0,0 +1,138 @@
+import asyncio
+import os
+import logging
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Any
+from .database import write_connection
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "250"))
+AUDIT_ENQUEUE_TIMEOUT_MS = int(os.getenv("AUDIT_ENQUEUE_TIMEOUT_MS", "100"))
+
+AuditEvent = Tuple[Optional[int], str, Optional[str], Optional[str], Optional[str], Optional[str], str]
+
+INSERT_AUDIT_SQL = """
+    INSERT INTO audit_logs (user_id, action, resource, details, ip_address, user_agent, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+
+class AuditSink:
+    """Background writer that group-commits audit events in batches"""
+
+    def __init__(self, max_queue: int = AUDIT_QUEUE_SIZE, batch_size: int = AUDIT_BATCH_SIZE,
+                 flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS,
+                 enqueue_timeout_ms: int = AUDIT_ENQUEUE_TIMEOUT_MS):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"enqueued": 0, "flushed": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        """Start the background flush task"""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Audit sink started")
+
+    async def stop(self):
+        """Flush every queued event and stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"Audit sink stopped: {self.counters}")
+
+    async def submit(self, event: AuditEvent) -> bool:
+        """Queue an event, waiting briefly when the queue is full; returns False if dropped"""
+        if not self.running:
+            # No background writer (scripts, CLI tools) - write inline
+            await self._flush([event])
+            return True
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Backpressure: hold the caller for a bounded time before shedding the event
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.counters["dropped"] += 1
+                logger.warning(f"Audit queue full, dropped event: {event[1]}")
+                return False
+        self.counters["enqueued"] += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[AuditEvent] = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[AuditEvent]):
+        try:
+            async with write_connection() as db:
+                await db.executemany(INSERT_AUDIT_SQL, batch)
+            self.counters["flushed"] += len(batch)
+            self.counters["batches"] += 1
+        except Exception as e:
+            self.counters["failed"] += len(batch)
+            logger.error(f"Failed to flush {len(batch)} audit events: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and event counters"""
+        return {
+            **self.counters,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.max_queue,
+            "running": self.running,
+        }
+
+audit_sink = AuditSink()
+
+registry.gauge("authcenter_audit_queue_depth", "Audit events waiting for the next batch write",
+               collect=lambda: audit_sink.stats()["queue_depth"])
+registry.counter("authcenter_audit_events_total", "Audit events by outcome", ["outcome"],
+                 collect=lambda: {(k,): audit_sink.counters[k] for k in ("enqueued", "flushed", "dropped", "failed")})
+
+def make_audit_event(action: str, resource: str = None, details: str = None,
+                     ip_address: str = None, user_agent: str = None, user_id: int = None) -> AuditEvent:
+    """Build an audit row, stamping created_at when the event happens rather than when it is flushed"""
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    return (user_id, action, resource, details, ip_address, user_agent, created_at)
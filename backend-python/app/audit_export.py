@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import os
+from typing import Optional, List, AsyncIterator, Tuple, Any, Callable
+from .database import get_pool
+
+AUDIT_EXPORT_CHUNK_SIZE = int(os.getenv("AUDIT_EXPORT_CHUNK_SIZE", "1000"))
+AUDIT_EXPORT_MAX_CONCURRENT = int(os.getenv("AUDIT_EXPORT_MAX_CONCURRENT", "2"))
+
+EXPORT_COLUMNS = ["id", "user_id", "user_email", "action", "resource", "details", "ip_address", "user_agent", "created_at"]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+}
+
+class ExportSlots:
+    """Caps concurrent exports; each one holds its own read connection for its whole duration
+
+    Slots are taken without waiting, so a request either gets one before its
+    response starts or is turned away - excess exports never queue.
+    """
+
+    def __init__(self, limit: int = AUDIT_EXPORT_MAX_CONCURRENT):
+        self.limit = limit
+        self.in_use = 0
+
+    def try_acquire(self) -> Optional[Callable[[], None]]:
+        """Take a slot if one is free; returns its release function (safe to call more than once) or None"""
+        if self.in_use >= self.limit:
+            return None
+        self.in_use += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_use -= 1
+        return release
+
+export_slots = ExportSlots()
+
+def build_export_query(since: Optional[str] = None, until: Optional[str] = None,
+                       actions: Optional[List[str]] = None) -> Tuple[str, List[Any]]:
+    """Audit log export query in created_at order with optional time range and action filters"""
+    conditions = []
+    params: List[Any] = []
+    if since:
+        conditions.append("al.created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("al.created_at < ?")
+        params.append(until)
+    if actions:
+        conditions.append(f"al.action IN ({', '.join('?' for _ in actions)})")
+        params.extend(actions)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"""
+        SELECT al.id, al.user_id, u.email as user_email, al.action, al.resource, al.details,
+               al.ip_address, al.user_agent, al.created_at
+        FROM audit_logs al
+        LEFT JOIN users u ON al.user_id = u.id
+        {where}
+        ORDER BY al.created_at, al.id
+    """
+    return sql, params
+
+def encode_ndjson(rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, separators=(",", ":")) + "\n"
+        for row in rows
+    ).encode("utf-8")
+
+def encode_csv(rows, header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(tuple(row) for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+async def stream_audit_logs(fmt: str, since: Optional[str] = None, until: Optional[str] = None,
+                            actions: Optional[List[str]] = None,
+                            chunk_size: int = AUDIT_EXPORT_CHUNK_SIZE,
+                            release: Optional[Callable[[], None]] = None) -> AsyncIterator[bytes]:
+    """Yield the export in chunks of chunk_size rows straight from a stepping SQLite cursor
+
+    Only one chunk is in memory at a time, and the next chunk is not read until the
+    response has sent the previous one, so a slow client slows the scan instead of
+    making the server buffer. release (the caller's export slot) is called when
+    the stream ends, however it ends.
+    """
+    try:
+        sql, params = build_export_query(since, until, actions)
+        pool = await get_pool()
+        async with pool.dedicated_reader() as db:
+            cursor = await db.execute(sql, params)
+            try:
+                if fmt == "csv":
+                    yield encode_csv([], header=True)
+                while True:
+                    rows = await cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield encode_ndjson(rows) if fmt == "ndjson" else encode_csv(rows)
+            finally:
+                await cursor.close()
+    finally:
+        if release is not None:
+            release()
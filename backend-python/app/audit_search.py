@@ -0,0 +1,233 @@
+import os
+import re
+import aiosqlite
+from fastapi import HTTPException
+from typing import Optional, List, Any, Tuple
+from .pagination import decode_cursor, encode_cursor, next_cursor
+
+# Audit log search (see migration 10). Every structured filter is an equality that
+# leads a (column, created_at) index; with the rowid SQLite appends to each index,
+# a filtered scan comes out in (created_at, id) order and a cursor page stops after
+# limit rows at any depth. Text search goes through audit_logs_fts, an external
+# content FTS5 index over resource and details (plus action, so an action filter
+# narrows the MATCH too): only the index is stored, the text stays in audit_logs.
+# "_" is a token character there as it is in \w, so data_synced is one token.
+
+AUDIT_SEARCH_MAX_LIMIT = 1000
+# Text matching fewer rows than this is looked up by id; commoner text is scanned for
+AUDIT_SEARCH_MATCH_CAP = int(os.getenv("AUDIT_SEARCH_MATCH_CAP", "5000"))
+# Rows a scan reads per request before it returns a short page and a cursor to resume from
+AUDIT_SEARCH_SCAN_LIMIT = int(os.getenv("AUDIT_SEARCH_SCAN_LIMIT", "100000"))
+# Candidates per scan step, checked with one compound SELECT of up to this many terms (SQLite allows 500)
+AUDIT_SEARCH_SCAN_CHUNK = 400
+# Candidate ids closer than this share one rowid range in the check
+AUDIT_SEARCH_RANGE_GAP = 256
+
+TEXT_COLUMNS = "{resource details}"
+
+AUDIT_SEARCH_SCHEMA_SQL: List[str] = [
+    # Also covers GROUP BY action (stats rebuild), so it replaces the single-column index
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_action_created ON audit_logs(action, created_at)",
+    "DROP INDEX IF EXISTS idx_audit_logs_action",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_user_created ON audit_logs(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_resource_created ON audit_logs(resource, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_audit_logs_ip_created ON audit_logs(ip_address, created_at)",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS audit_logs_fts USING fts5(
+        resource, details, action,
+        content = 'audit_logs', content_rowid = 'id',
+        tokenize = "unicode61 remove_diacritics 2 tokenchars '_'"
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_audit_logs_fts_insert AFTER INSERT ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (rowid, resource, details, action)
+        VALUES (NEW.id, NEW.resource, NEW.details, NEW.action);
+    END
+    """,
+    # External content: FTS5 needs the old values to find the index entries it removes
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_audit_logs_fts_update
+    AFTER UPDATE OF resource, details, action ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (audit_logs_fts, rowid, resource, details, action)
+        VALUES ('delete', OLD.id, OLD.resource, OLD.details, OLD.action);
+        INSERT INTO audit_logs_fts (rowid, resource, details, action)
+        VALUES (NEW.id, NEW.resource, NEW.details, NEW.action);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_audit_logs_fts_delete AFTER DELETE ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (audit_logs_fts, rowid, resource, details, action)
+        VALUES ('delete', OLD.id, OLD.resource, OLD.details, OLD.action);
+    END
+    """,
+]
+
+# Index the existing audit log (migration 10); rerunning rebuilds the index from audit_logs
+REBUILD_AUDIT_SEARCH_SQL: List[str] = [
+    "INSERT INTO audit_logs_fts (audit_logs_fts) VALUES ('rebuild')",
+]
+
+# Reads at most AUDIT_SEARCH_MATCH_CAP postings: the count tells rare text from common text,
+# and for rare text the ids are all of its matches
+COLLECT_MATCHES_SQL = """
+    SELECT COUNT(*), group_concat(rowid) FROM (SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH ? LIMIT ?)
+"""
+
+_WORD = re.compile(r"\w+")
+
+def _phrase(text: str, star: str = "") -> Optional[str]:
+    words = _WORD.findall(text.lower())
+    return f'"{" ".join(words)}"{star}' if words else None
+
+def match_expression(q: str, actions: Optional[List[str]] = None) -> Tuple[Optional[str], bool]:
+    """FTS5 MATCH for a free-text query and whether it has a prefix term; (None, False) without words
+
+    Each whitespace-separated term becomes a phrase of its words, so
+    "connection:42" and "10.0.0.7" match exactly those tokens in sequence; a
+    trailing * makes the term a prefix. Terms are ANDed, then narrowed to the
+    actions, if any. Quoting keeps user input from injecting FTS5 syntax.
+    """
+    phrases = [p for p in (_phrase(term, "*" if term.endswith("*") else "") for term in q.split()) if p]
+    if not phrases:
+        return None, False
+    terms = [f"{TEXT_COLUMNS} : {phrase}" for phrase in phrases]
+    action_phrases = [p for p in map(_phrase, actions or []) if p]
+    if action_phrases:
+        # A superset of the action filter (a phrase also matches inside a longer name); the SQL filter is exact
+        terms.append(f"action : ({' OR '.join(action_phrases)})")
+    return " AND ".join(terms), any(phrase.endswith("*") for phrase in phrases)
+
+def build_search_query(actions: Optional[List[str]] = None, user_id: Optional[int] = None,
+                       user_email: Optional[str] = None, resource: Optional[str] = None,
+                       ip: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                       before: Optional[Tuple[str, int]] = None, match: Optional[str] = None,
+                       ids: Optional[List[int]] = None, columns: str = "al.*, u.email as user_email",
+                       limit: int = 100) -> Tuple[str, List[Any]]:
+    """Audit log query for the filters, newest first, from just before the (created_at, id) key
+
+    match keeps the rows whose ids it collects from audit_logs_fts, which
+    costs as much as there are matches; ids keeps those rows only.
+    """
+    conditions = []
+    params: List[Any] = []
+    if actions:
+        conditions.append(f"al.action IN ({', '.join('?' for _ in actions)})")
+        params.extend(actions)
+    if user_id is not None:
+        conditions.append("al.user_id = ?")
+        params.append(user_id)
+    if user_email:
+        conditions.append("al.user_id = (SELECT id FROM users WHERE email = ?)")
+        params.append(user_email)
+    if resource:
+        conditions.append("al.resource = ?")
+        params.append(resource)
+    if ip:
+        conditions.append("al.ip_address = ?")
+        params.append(ip)
+    if since:
+        conditions.append("al.created_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("al.created_at < ?")
+        params.append(until)
+    if before:
+        conditions.append("(al.created_at, al.id) < (?, ?)")
+        params.extend(before)
+    if match is not None:
+        conditions.append("al.id IN (SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH ?)")
+        params.append(match)
+    if ids is not None:
+        conditions.append(f"al.id IN ({', '.join('?' for _ in ids)})")
+        params.extend(ids)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"""
+        SELECT {columns}
+        FROM audit_logs al
+        LEFT JOIN users u ON al.user_id = u.id
+        {where}
+        ORDER BY al.created_at DESC, al.id DESC
+        LIMIT ?
+    """
+    params.append(limit)
+    return sql, params
+
+def id_ranges(ids: List[int], gap: int = AUDIT_SEARCH_RANGE_GAP) -> List[Tuple[int, int]]:
+    """Cover ids with (low, high) ranges, merging neighbours less than gap apart"""
+    ranges: List[Tuple[int, int]] = []
+    for row_id in sorted(ids):
+        if ranges and row_id - ranges[-1][1] < gap:
+            ranges[-1] = (ranges[-1][0], row_id)
+        else:
+            ranges.append((row_id, row_id))
+    return ranges
+
+async def scan_matches(db: aiosqlite.Connection, match: str, filters: dict, before: Optional[Tuple[str, int]],
+                       limit: int) -> Tuple[List[int], Optional[Tuple[str, int]]]:
+    """Ids of up to limit + 1 rows matching the filters and a common match, newest first
+
+    Candidates come from the filters' index AUDIT_SEARCH_SCAN_CHUNK at a time,
+    and each chunk is checked with one MATCH per rowid range it spans. Ids
+    follow insertion order, which is close to created_at order, so the ranges
+    of a chunk are few and tight. Also returns the key to resume from when
+    AUDIT_SEARCH_SCAN_LIMIT candidates were read first.
+    """
+    found: List[int] = []
+    scanned = 0
+    while len(found) <= limit:
+        if scanned >= AUDIT_SEARCH_SCAN_LIMIT:
+            return found, before
+        sql, params = build_search_query(before=before, columns="al.id, al.created_at",
+                                         limit=AUDIT_SEARCH_SCAN_CHUNK, **filters)
+        candidates = await (await db.execute(sql, params)).fetchall()
+        if not candidates:
+            break
+        scanned += len(candidates)
+        ranges = id_ranges([row['id'] for row in candidates])
+        cursor = await db.execute(
+            " UNION ALL ".join(
+                ["SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH ? AND rowid BETWEEN ? AND ?"]
+                * len(ranges)
+            ),
+            [value for low, high in ranges for value in (match, low, high)]
+        )
+        matched = {row[0] for row in await cursor.fetchall()}
+        found.extend(row['id'] for row in candidates if row['id'] in matched)
+        before = (candidates[-1]['created_at'], candidates[-1]['id'])
+        if len(candidates) < AUDIT_SEARCH_SCAN_CHUNK:
+            break
+    return found[:limit + 1], None
+
+async def find_audit_logs(db: aiosqlite.Connection, q: Optional[str] = None, cursor: Optional[str] = None,
+                          limit: int = 100, **filters) -> Tuple[List[Any], Optional[str]]:
+    """A page of audit logs matching q and the build_search_query filters: (rows, next_cursor)
+
+    Text matching fewer than AUDIT_SEARCH_MATCH_CAP rows is looked up by the
+    ids collected while finding that out. Commoner text is scanned for (see
+    scan_matches) and may come back as a short page whose next_cursor resumes
+    the scan, unless it has a prefix term: every MATCH merges a prefix's
+    doclists again, so those are collected in the page query instead.
+    """
+    before = decode_cursor(cursor) if cursor else None
+    match = ids = None
+    if q is not None:
+        match, prefix = match_expression(q, filters.get("actions"))
+        if match is None:
+            raise HTTPException(status_code=400, detail="q must contain a word to search for")
+        collected = await db.execute(COLLECT_MATCHES_SQL, (match, AUDIT_SEARCH_MATCH_CAP))
+        count, id_list = await collected.fetchone()
+        if count < AUDIT_SEARCH_MATCH_CAP:
+            match, ids = None, [int(row_id) for row_id in id_list.split(",")] if id_list else []
+        elif not prefix:
+            found, resume = await scan_matches(db, match, filters, before, limit)
+            rows = []
+            if found:
+                sql, params = build_search_query(ids=found, limit=len(found))
+                rows = await (await db.execute(sql, params)).fetchall()
+            return rows, encode_cursor(*resume) if resume else next_cursor(rows, limit)
+
+    sql, params = build_search_query(before=before, match=match, ids=ids, limit=limit + 1, **filters)
+    rows = await (await db.execute(sql, params)).fetchall()
+    return rows, next_cursor(rows, limit)
@@ -2,20 +2,160 @@ from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 import os
-import bcrypt
-from .database import get_database
+import time
+import json
+import hmac
+import base64
+import hashlib
+import logging
+from .database import read_connection
+from .passwords import check_password
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+JWT_BACKEND = os.getenv("JWT_BACKEND", "jose")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
 class AuthenticationError(Exception):
     pass
 
+class JoseBackend:
+    """python-jose, the reference implementation"""
+    name = "jose"
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError as e:
+            raise AuthenticationError(str(e))
+
+class PyJWTBackend:
+    """PyJWT, if installed"""
+    name = "pyjwt"
+
+    def __init__(self):
+        import jwt as pyjwt
+        self._jwt = pyjwt
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        return self._jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            return self._jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except self._jwt.PyJWTError as e:
+            raise AuthenticationError(str(e))
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+class HS256Backend(JoseBackend):
+    """Stdlib HS256 verifier: one HMAC and one json.loads, no generic JOSE machinery"""
+    name = "hs256"
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        try:
+            header_b64, payload_b64, signature_b64 = token.split(".")
+            header = json.loads(_b64decode(header_b64))
+            if header.get("alg") != ALGORITHM:
+                raise AuthenticationError("The specified alg value is not allowed")
+            expected = hmac.new(SECRET_KEY.encode("utf-8"), f"{header_b64}.{payload_b64}".encode("ascii"),
+                                hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+                raise AuthenticationError("Signature verification failed")
+            payload = json.loads(_b64decode(payload_b64))
+        except (ValueError, TypeError, UnicodeError) as e:
+            raise AuthenticationError(f"Malformed token: {e}")
+
+        now = time.time()
+        if "exp" in payload and (not isinstance(payload["exp"], (int, float)) or payload["exp"] < now):
+            raise AuthenticationError("Signature has expired")
+        if "nbf" in payload and (not isinstance(payload["nbf"], (int, float)) or payload["nbf"] > now):
+            raise AuthenticationError("The token is not yet valid (nbf)")
+        return payload
+
+JWT_BACKENDS = {"jose": JoseBackend, "pyjwt": PyJWTBackend, "hs256": HS256Backend}
+
+def load_jwt_backend(name: str = JWT_BACKEND):
+    """Instantiate the configured JWT backend, falling back to python-jose"""
+    try:
+        return JWT_BACKENDS[name]()
+    except (KeyError, ImportError) as e:
+        logger.warning(f"JWT backend '{name}' unavailable ({e!r}), using python-jose")
+        return JoseBackend()
+
+jwt_backend = load_jwt_backend()
+
+class TokenCache:
+    """Bounded LRU of verified token payloads keyed by a SHA-256 digest of the token"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            # Never serve a token past its exp
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)) or self.max_size <= 0:
+            # Tokens without an expiry are re-verified every time
+            return
+        key = self._key(token)
+        self._entries[key] = (float(expires_at), payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": jwt_backend.name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+token_cache = TokenCache()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -24,9 +164,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt_backend.encode(to_encode)
     return encoded_jwt
 
+def decode_token(token: str) -> Dict[str, Any]:
+    """Verify a token, reusing the cached payload of a token verified earlier"""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt_backend.decode(token)
+        token_cache.put(token, payload)
+    return payload
+
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token"""
     credentials_exception = HTTPException(
@@ -35,35 +183,35 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(secur
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(credentials.credentials)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
         return {"user_id": user_id}
-    except JWTError:
+    except AuthenticationError:
         raise credentials_exception
 
 async def verify_admin_password(password: str) -> bool:
     """Verify admin password against database"""
-    db = await get_database()
-    cursor = await db.execute("SELECT password_hash FROM admin_config WHERE id = 1")
-    row = await cursor.fetchone()
-    
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT password_hash FROM admin_config WHERE id = 1")
+        row = await cursor.fetchone()
+
     if not row:
         return False
-    
+
     stored_hash = row['password_hash']
-    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+    return await check_password(password, stored_hash)
 
 # Optional auth dependency - allows unauthenticated access
 async def optional_auth(credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))):
     """Optional authentication - returns user info if authenticated, None otherwise"""
     if not credentials:
         return None
-    
+
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(credentials.credentials)
         user_id: str = payload.get("sub")
         return {"user_id": user_id} if user_id else None
-    except JWTError:
-        return None
\ No newline at end of file
+    except AuthenticationError:
+        return None
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "authcenter")
+CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("CACHE_MEMORY_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Called with the invalidated keys; runs on every process sharing the cache, including the sender
+InvalidationHandler = Callable[[List[str]], None]
+
+class CacheBackend(ABC):
+    """Shared cache API: bytes values with TTL, multi-get and cross-process invalidation"""
+    name = "base"
+
+    def __init__(self, namespace: str = CACHE_NAMESPACE):
+        self.namespace = namespace
+        self._handlers: List[Tuple[str, InvalidationHandler]] = []
+        self.counters = {"hits": 0, "misses": 0, "sets": 0, "invalidations_sent": 0, "invalidations_received": 0,
+                         "errors": 0}
+
+    def key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.mget([key]))[0]
+
+    @abstractmethod
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Values for keys, None for each missing or expired one"""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store value, expiring after ttl seconds when given"""
+
+    @abstractmethod
+    async def delete(self, keys: Iterable[str]):
+        """Drop keys from this backend only; invalidate() also tells other processes"""
+
+    async def get_json(self, key: str) -> Any:
+        value = await self.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self.set(key, json.dumps(value, separators=(",", ":")).encode("utf-8"), ttl)
+
+    def subscribe(self, prefix: str, handler: InvalidationHandler):
+        """Call handler with invalidated keys starting with prefix"""
+        self._handlers.append((prefix, handler))
+
+    async def invalidate(self, keys: List[str]):
+        """Delete keys and tell every process to drop its local copies of them"""
+        await self.delete(keys)
+        self.counters["invalidations_sent"] += 1
+        await self._broadcast(keys)
+
+    async def _broadcast(self, keys: List[str]):
+        self._dispatch(keys)
+
+    def _dispatch(self, keys: List[str]):
+        self.counters["invalidations_received"] += 1
+        for prefix, handler in self._handlers:
+            matched = [key for key in keys if key.startswith(prefix)]
+            if matched:
+                try:
+                    handler(matched)
+                except Exception as e:
+                    logger.error(f"Cache invalidation handler for '{prefix}' failed: {e}")
+
+    def _count(self, values: List[Optional[bytes]]):
+        hits = sum(1 for value in values if value is not None)
+        self.counters["hits"] += hits
+        self.counters["misses"] += len(values) - hits
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, **self.counters}
+
+class MemoryBackend(CacheBackend):
+    """Per-process LRU; invalidations only reach this process's subscribers"""
+    name = "memory"
+
+    def __init__(self, namespace: str = CACHE_NAMESPACE, max_entries: int = CACHE_MEMORY_MAX_ENTRIES):
+        super().__init__(namespace)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            values.append(entry[1] if entry else None)
+        self._count(values)
+        return values
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.counters["sets"] += 1
+
+    async def delete(self, keys: Iterable[str]):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**await super().stats(), "entries": len(self._entries), "max_entries": self.max_entries}
+
+class RedisBackend(CacheBackend):
+    """Redis shared by every worker; invalidations fan out over pub/sub
+
+    The cache is never the source of truth, so a Redis failure is logged and
+    requests go on to the database. While Redis is unreachable, values are kept in
+    an in-process cache instead, as the memory backend would; it is dropped as
+    soon as Redis answers again.
+    """
+    name = "redis"
+
+    def __init__(self, namespace: str = CACHE_NAMESPACE, url: str = REDIS_URL, client=None):
+        super().__init__(namespace)
+        import redis.asyncio as aioredis
+        from redis.exceptions import RedisError
+        self.url = url
+        self._redis = client if client is not None else aioredis.Redis.from_url(url)
+        self._errors = (RedisError, OSError)
+        self._local = MemoryBackend(namespace)
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        # Lets this process skip its own broadcasts, which it already applied locally
+        self._origin = uuid.uuid4().hex
+        self.channel = self.key("invalidate")
+
+    async def start(self):
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await self._subscribe()
+        except self._errors as e:
+            # Not fatal: the local cache serves until the listener reaches Redis
+            self._failed("subscribe", e)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        await self._redis.aclose()
+
+    async def _subscribe(self):
+        await self._pubsub.subscribe(self.channel)
+        logger.info(f"Redis cache connected, listening for invalidations on {self.channel}")
+
+    async def _listen(self):
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await self._subscribe()
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None:
+                    continue
+                data = json.loads(message["data"])
+                if data.get("origin") != self._origin:
+                    self._dispatch(data["keys"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, self._errors):
+                    self._failed("listen", e)
+                else:
+                    logger.error(f"Cache invalidation listener error: {e}")
+                await asyncio.sleep(1)
+
+    def _failed(self, operation: str, error: Exception):
+        self.counters["errors"] += 1
+        logger.error(f"Redis cache {operation} failed: {error!r}")
+
+    async def mget(self, keys: List[str]) -> List[Optional[bytes]]:
+        try:
+            # One round trip for the whole batch
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.get(self.key(key))
+                values = await pipe.execute()
+        except self._errors as e:
+            self._failed("get", e)
+            values = await self._local.mget(keys)
+        else:
+            # Redis is back; entries kept during the outage may since have been invalidated elsewhere
+            self._local.clear()
+        self._count(values)
+        return values
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        try:
+            await self._redis.set(self.key(key), value, px=int(ttl * 1000) if ttl else None)
+        except self._errors as e:
+            self._failed("set", e)
+            await self._local.set(key, value, ttl)
+        self.counters["sets"] += 1
+
+    async def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        if not keys:
+            return
+        await self._local.delete(keys)
+        try:
+            await self._redis.delete(*[self.key(key) for key in keys])
+        except self._errors as e:
+            # The entries live on until their TTL; callers keep cached TTLs short for this
+            self._failed("delete", e)
+
+    async def _broadcast(self, keys: List[str]):
+        self._dispatch(keys)
+        try:
+            await self._redis.publish(self.channel, json.dumps({"origin": self._origin, "keys": keys}))
+        except self._errors as e:
+            self._failed("publish", e)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**await super().stats(), "url": self.url.split("@")[-1], "listening": self._listener is not None}
+
+CACHE_BACKENDS = {"memory": MemoryBackend, "redis": RedisBackend}
+
+def load_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    """Instantiate the configured cache backend, falling back to the in-process one"""
+    try:
+        return CACHE_BACKENDS[name]()
+    except (KeyError, ImportError) as e:
+        logger.warning(f"Cache backend '{name}' unavailable ({e!r}), using in-process memory")
+        return MemoryBackend()
+
+shared_cache = load_cache_backend()
+
+registry.counter("authcenter_shared_cache_lookups_total", "Shared cache lookups by result", ["result"],
+                 collect=lambda: {("hit",): shared_cache.counters["hits"], ("miss",): shared_cache.counters["misses"]})
+registry.counter("authcenter_shared_cache_invalidations_total", "Invalidation broadcasts sent and received",
+                 ["direction"], collect=lambda: {("sent",): shared_cache.counters["invalidations_sent"],
+                                                 ("received",): shared_cache.counters["invalidations_received"]})
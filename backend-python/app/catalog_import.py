@@ -0,0 +1,241 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Iterator, Callable
+from .database import write_connection
+from .audit import INSERT_AUDIT_SQL, make_audit_event
+from .manifests import Record, validate_batch
+
+logger = logging.getLogger(__name__)
+
+# Validation is pure Python, so it runs in worker processes, leaving a core for the event loop;
+# 0 (the default on a single CPU, where a pool only adds overhead) validates inline
+CATALOG_IMPORT_WORKERS = int(os.getenv("CATALOG_IMPORT_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+# Manifests sent to a worker per task
+CATALOG_IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", "50"))
+# Validated manifests written per transaction; the writer is released between chunks
+CATALOG_IMPORT_CHUNK_SIZE = int(os.getenv("CATALOG_IMPORT_CHUNK_SIZE", "500"))
+
+MANIFEST_SUFFIXES = (".json", ".ndjson", ".jsonl")
+
+async def read_ndjson(chunks: AsyncIterator[bytes], name: str = "line") -> AsyncIterator[Record]:
+    """Split a byte stream (e.g. a request body) into NDJSON records, skipping blank lines"""
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield f"{name} {line_number}", line.decode("utf-8", errors="replace")
+    if buffer.strip():
+        yield f"{name} {line_number + 1}", buffer.decode("utf-8", errors="replace")
+
+def read_path(path: str) -> Iterator[Record]:
+    """Records from a manifest file, or from every manifest file in a directory
+
+    .json files hold one manifest each; .ndjson/.jsonl files one per line.
+    """
+    if os.path.isdir(path):
+        files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(MANIFEST_SUFFIXES))
+    else:
+        files = [path]
+    for file in files:
+        with open(file, encoding="utf-8") as f:
+            if file.endswith(".json"):
+                yield os.path.basename(file), f.read()
+                continue
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield f"{os.path.basename(file)}:{line_number}", line
+
+async def aiter_records(records: Iterator[Record]) -> AsyncIterator[Record]:
+    for record in records:
+        yield record
+
+AuditEventFactory = Callable[[str, str, str], Tuple]
+
+class CatalogImport:
+    """Bulk insert-or-update of internal apps from a stream of PCARP manifests
+
+    Manifests are validated in batches on a process pool while earlier chunks
+    are written. Each chunk is matched against existing (name, display_name)
+    pairs with one indexed lookup, then inserted and updated in one transaction
+    together with its audit records. A pair repeated within the import keeps
+    its first manifest; later ones are rejected.
+    """
+
+    def __init__(self, workers: int = CATALOG_IMPORT_WORKERS, batch_size: int = CATALOG_IMPORT_BATCH_SIZE,
+                 chunk_size: int = CATALOG_IMPORT_CHUNK_SIZE, audit_event: AuditEventFactory = make_audit_event):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.audit_event = audit_event
+        self._pending_rows: List[Dict[str, Any]] = []
+        self._seen: Dict[Tuple[str, str], str] = {}
+        self.report: Dict[str, Any] = {"inserted": [], "updated": [], "unchanged": 0, "rejected": []}
+
+    async def run(self, records: AsyncIterator[Record]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        total = 0
+        if self.workers > 0:
+            # spawn: forking a process that runs aiosqlite and executor threads is not safe
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+                total = await self._validate(records, pool)
+        else:
+            total = await self._validate(records, None)
+        await self._write_pending()
+        if self.report["inserted"]:
+            # A bulk load can change the table by orders of magnitude; stale statistics
+            # would have the planner scan internal_apps instead of using its indexes
+            async with write_connection() as db:
+                await db.execute("ANALYZE internal_apps")
+
+        elapsed = time.perf_counter() - started
+        self.report.update({
+            "total": total,
+            "counts": {
+                "inserted": len(self.report["inserted"]),
+                "updated": len(self.report["updated"]),
+                "unchanged": self.report["unchanged"],
+                "rejected": len(self.report["rejected"]),
+            },
+            "seconds": round(elapsed, 3),
+            "manifests_per_second": round(total / elapsed, 1) if elapsed > 0 else None,
+        })
+        logger.info(f"Catalog import: {self.report['counts']} from {total} manifests in {elapsed:.2f}s")
+        return self.report
+
+    async def _validate(self, records: AsyncIterator[Record], pool: Optional[ProcessPoolExecutor]) -> int:
+        """Feed batches to the pool, keeping a bounded number in flight so the input is streamed"""
+        loop = asyncio.get_running_loop()
+        in_flight: deque = deque()
+        total = 0
+        batch: List[Record] = []
+
+        async def submit(batch: List[Record]):
+            if pool is None:
+                await self._accept(validate_batch(batch))
+                return
+            in_flight.append(loop.run_in_executor(pool, validate_batch, batch))
+            if len(in_flight) >= self.workers * 2:
+                await self._accept(await in_flight.popleft())
+
+        async for record in records:
+            total += 1
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                await submit(batch)
+                batch = []
+        if batch:
+            await submit(batch)
+        while in_flight:
+            await self._accept(await in_flight.popleft())
+        return total
+
+    async def _accept(self, results: List[Dict[str, Any]]):
+        for result in results:
+            if "error" in result:
+                self.report["rejected"].append(result)
+                continue
+            key = (result["name"], result["display_name"])
+            if key in self._seen:
+                self.report["rejected"].append({"source": result["source"], "name": result["name"],
+                                                "error": f"duplicate of {self._seen[key]}"})
+                continue
+            self._seen[key] = result["source"]
+            self._pending_rows.append(result)
+            if len(self._pending_rows) >= self.chunk_size:
+                await self._write_pending()
+
+    async def _write_pending(self):
+        rows, self._pending_rows = self._pending_rows, []
+        if rows:
+            await self.write_chunk(rows)
+
+    async def write_chunk(self, rows: List[Dict[str, Any]]):
+        async with write_connection() as db:
+            # One indexed lookup for the whole chunk; duplicate pairs already stored resolve to the
+            # oldest row, the one /api/admin/apps shows
+            cursor = await db.execute(f"""
+                WITH wanted(name, display_name) AS (VALUES {', '.join(['(?, ?)'] * len(rows))})
+                SELECT MIN(ia.id) AS id, ia.name, ia.display_name, ia.description, ia.logo_url,
+                       ia.api_endpoints, ia.manifest_data
+                FROM wanted
+                JOIN internal_apps ia ON ia.name = wanted.name AND ia.display_name = wanted.display_name
+                GROUP BY ia.name, ia.display_name
+            """, [value for row in rows for value in (row["name"], row["display_name"])])
+            existing = {(row["name"], row["display_name"]): row for row in await cursor.fetchall()}
+
+            inserts, updates, events = [], [], []
+            for row in rows:
+                current = existing.get((row["name"], row["display_name"]))
+                if current is None:
+                    inserts.append(row)
+                elif any(current[column] != row[column]
+                         for column in ("description", "logo_url", "api_endpoints", "manifest_data")):
+                    updates.append((row, current["id"]))
+                else:
+                    self.report["unchanged"] += 1
+
+            if inserts:
+                await db.executemany("""
+                    INSERT INTO internal_apps (name, display_name, description, logo_url, api_endpoints, manifest_data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(row["name"], row["display_name"], row["description"], row["logo_url"],
+                       row["api_endpoints"], row["manifest_data"]) for row in inserts])
+                # One INSERT statement under the write lock, so its rows got consecutive ids
+                cursor = await db.execute("SELECT last_insert_rowid()")
+                first_id = (await cursor.fetchone())[0] - len(inserts) + 1
+                for offset, row in enumerate(inserts):
+                    self.report["inserted"].append(self._entry(row, first_id + offset))
+                    events.append(self.audit_event("app_registered", f"internal_app:{row['name']}",
+                                                   f"Registered new app: {row['display_name']} (catalog import)"))
+            if updates:
+                await db.executemany("""
+                    UPDATE internal_apps
+                    SET description = ?, logo_url = ?, api_endpoints = ?, manifest_data = ?
+                    WHERE id = ?
+                """, [(row["description"], row["logo_url"], row["api_endpoints"], row["manifest_data"], app_id)
+                      for row, app_id in updates])
+                for row, app_id in updates:
+                    self.report["updated"].append(self._entry(row, app_id))
+                    events.append(self.audit_event("app_updated", f"internal_app:{row['name']}",
+                                                   f"Updated app: {row['display_name']} (catalog import)"))
+            if events:
+                await db.executemany(INSERT_AUDIT_SQL, events)
+
+    @staticmethod
+    def _entry(row: Dict[str, Any], app_id: int) -> Dict[str, Any]:
+        return {"source": row["source"], "id": app_id, "name": row["name"], "display_name": row["display_name"]}
+
+async def _main():
+    import argparse
+    import json
+    from .database import init_database, close_database
+
+    parser = argparse.ArgumentParser(description="Import internal apps from PCARP manifests")
+    parser.add_argument("path", help="a .json or .ndjson manifest file, or a directory of them")
+    parser.add_argument("--workers", type=int, default=CATALOG_IMPORT_WORKERS,
+                        help="validation processes (0 validates inline)")
+    parser.add_argument("--batch-size", type=int, default=CATALOG_IMPORT_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=CATALOG_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    await init_database()
+    try:
+        importer = CatalogImport(workers=args.workers, batch_size=args.batch_size, chunk_size=args.chunk_size)
+        report = await importer.run(aiter_records(read_path(args.path)))
+    finally:
+        await close_database()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    # python -m app.catalog_import manifests/ - bulk-load the app catalog without going through the API
+    asyncio.run(_main())
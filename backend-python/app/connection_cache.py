@@ -0,0 +1,45 @@
+import os
+from typing import Optional, Dict, Any
+from .database import read_connection
+from .cache import shared_cache
+
+CONNECTION_CACHE_TTL_SECONDS = float(os.getenv("CONNECTION_CACHE_TTL_SECONDS", "60"))
+
+# OAuth tokens stay in the database: the shared cache may be a Redis other services can read
+SECRET_COLUMNS = ("access_token", "refresh_token")
+
+def connection_key(user_id: Any, provider_id: int) -> str:
+    return f"connections:{user_id}:{provider_id}"
+
+async def get_active_connection(user_id: Any, provider_id: int) -> Optional[Dict[str, Any]]:
+    """The user's active connection to a provider, read through the shared cache
+
+    The row comes back without its tokens; use get_access_token when calling the provider.
+    """
+    key = connection_key(user_id, provider_id)
+    cached = await shared_cache.get_json(key)
+    if cached is not None:
+        return cached or None
+
+    async with read_connection() as db:
+        cursor = await db.execute("""
+            SELECT * FROM connections
+            WHERE user_id = ? AND provider_id = ? AND status = 'active'
+            LIMIT 1
+        """, (user_id, provider_id))
+        row = await cursor.fetchone()
+    connection = {k: v for k, v in dict(row).items() if k not in SECRET_COLUMNS} if row else None
+    # Misses are cached too (as {}) so unconnected users do not hit the database every request
+    await shared_cache.set_json(key, connection or {}, CONNECTION_CACHE_TTL_SECONDS)
+    return connection
+
+async def get_access_token(connection_id: int) -> Optional[str]:
+    """The connection's current access token, always read from the database"""
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT access_token FROM connections WHERE id = ?", (connection_id,))
+        row = await cursor.fetchone()
+    return row['access_token'] if row else None
+
+async def invalidate_connection(user_id: Any, provider_id: int):
+    """Call after any write to a user's connection row (tokens, status)"""
+    await shared_cache.invalidate([connection_key(user_id, provider_id)])
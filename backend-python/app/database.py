@@ -1,37 +1,343 @@
 import aiosqlite
+import asyncio
+import functools
 import os
+import re
+import sqlite3
+import tempfile
+import time
 import logging
-import bcrypt
-from typing import Optional
+from aiosqlite.context import contextmanager
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator, Awaitable, Callable, List
+from .migrations import run_migrations
+from .passwords import hash_password
+from .locks import FileLock
+from .metrics import registry, current_route, METRICS_ENABLED, SQL_BUCKETS
+from .query_stats import query_stats, explain
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "authcenter.db")
-_db_connection: Optional[aiosqlite.Connection] = None
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5.0"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
 
-async def get_database() -> aiosqlite.Connection:
-    """Get database connection singleton"""
-    global _db_connection
-    if _db_connection is None:
-        _db_connection = await aiosqlite.connect(DATABASE_PATH)
-        _db_connection.row_factory = aiosqlite.Row
-    return _db_connection
+statement_duration = registry.histogram("authcenter_db_statement_duration_seconds",
+                                        "execute()/executemany() time by statement kind and table",
+                                        ["statement"], buckets=SQL_BUCKETS)
+pool_wait = registry.histogram("authcenter_db_pool_wait_seconds", "Time spent waiting for a pooled connection",
+                               ["kind"], buckets=SQL_BUCKETS)
+pool_timeouts = registry.counter("authcenter_db_pool_timeouts_total", "Connection acquisitions that timed out",
+                                 ["kind"])
+
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_DML_VERBS = {"select", "insert", "update", "delete", "replace", "with"}
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(sql: str) -> str:
+    """Low-cardinality label for a statement: its verb and first table, e.g. 'select audit_logs'"""
+    verb = sql.split(None, 1)[0].lower() if sql.strip() else "empty"
+    match = _STATEMENT_TABLE.search(sql) if verb in _DML_VERBS else None
+    return f"{verb} {match.group(1)}" if match else verb
+
+class TimedConnection(aiosqlite.Connection):
+    """aiosqlite connection that times every statement and logs slow ones with their plan"""
+
+    @contextmanager
+    async def execute(self, sql: str, parameters=None) -> aiosqlite.Cursor:
+        start = time.perf_counter()
+        try:
+            cursor = await super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self._record(sql, elapsed)
+        if query_stats.is_slow(elapsed):
+            # Plans come from the same connection, so they reflect what this call just did
+            plan = await explain(self, sql, parameters or ()) if query_stats.needs_plan(entry, sql) else None
+            query_stats.log_slow(entry, sql, elapsed, current_route(), plan)
+        return cursor
+
+    @contextmanager
+    async def executemany(self, sql: str, parameters) -> aiosqlite.Cursor:
+        start = time.perf_counter()
+        try:
+            cursor = await super().executemany(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            entry = self._record(sql, elapsed)
+        if query_stats.is_slow(elapsed):
+            query_stats.log_slow(entry, sql, elapsed, current_route(), None)
+        return cursor
+
+    def _record(self, sql: str, elapsed: float):
+        statement_duration.observe(elapsed, (statement_label(sql),))
+        return query_stats.record(sql, elapsed, current_route())
+
+def connect(database: str, **kwargs) -> aiosqlite.Connection:
+    """aiosqlite.connect, with statement timings and the slow-query log when metrics are enabled"""
+    if not METRICS_ENABLED:
+        return aiosqlite.connect(database, **kwargs)
+    return TimedConnection(lambda: sqlite3.connect(database, **kwargs), 64)
+
+class PoolTimeoutError(Exception):
+    pass
+
+class ConnectionPool:
+    """SQLite pool with one writer connection and N read-only connections in WAL mode"""
+
+    def __init__(self, path: str, size: int = DB_POOL_SIZE, timeout: float = DB_POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        # Callbacks of the open write transaction, run once it commits
+        self._after_commit: Optional[List[Callable[[], Awaitable[Any]]]] = None
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._all_readers = []
+        self._metrics = {
+            kind: {"acquired": 0, "timeouts": 0, "in_use": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for kind in ("reader", "writer")
+        }
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path == ":memory:" or self.path.startswith("file::memory:")
+
+    async def open(self):
+        """Open the writer, switch the database to WAL and open the readers"""
+        self._writer = await connect(self.path)
+        self._writer.row_factory = aiosqlite.Row
+        await self._writer.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+        # INSERT OR REPLACE only fires delete triggers with recursive triggers on;
+        # the stats rollups rely on them to stay exact
+        await self._writer.execute("PRAGMA recursive_triggers = ON")
+        if not self.in_memory:
+            # Only takes effect on a new file; lets audit retention hand freed pages back
+            await self._writer.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            await self._writer.execute("PRAGMA journal_mode = WAL")
+            await self._writer.execute("PRAGMA synchronous = NORMAL")
+
+            # Readers share the file through WAL snapshots, so they never wait on the writer
+            uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+            for _ in range(self.size):
+                conn = await connect(uri, uri=True)
+                conn.row_factory = aiosqlite.Row
+                await conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+                await conn.execute("PRAGMA query_only = 1")
+                self._all_readers.append(conn)
+                self._readers.put_nowait(conn)
+
+        logger.info(f"Database pool opened: 1 writer, {len(self._all_readers)} readers")
+
+    async def close(self):
+        """Close every connection in the pool"""
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers = []
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            # Let SQLite refresh statistics for tables whose query patterns changed
+            await self._writer.execute("PRAGMA optimize")
+            await self._writer.close()
+            self._writer = None
+
+    def _record_wait(self, kind: str, started: float):
+        waited = time.perf_counter() - started
+        metrics = self._metrics[kind]
+        metrics["acquired"] += 1
+        metrics["in_use"] += 1
+        metrics["wait_total"] += waited
+        metrics["wait_max"] = max(metrics["wait_max"], waited)
+        pool_wait.observe(waited, (kind,))
+
+    def _timeout_error(self, kind: str) -> PoolTimeoutError:
+        self._metrics[kind]["timeouts"] += 1
+        pool_timeouts.inc((kind,))
+        return PoolTimeoutError(f"Timed out after {self.timeout}s waiting for a {kind} connection")
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Acquire the writer; commits on success and rolls back on error"""
+        started = time.perf_counter()
+        try:
+            # The timeout cancels acquire() inside this task, and a cancelled acquire() never
+            # keeps the lock; wait_for could hand the lock to a task that already gave up
+            async with asyncio.timeout(self.timeout):
+                await self._write_lock.acquire()
+        except TimeoutError:
+            raise self._timeout_error("writer")
+        self._record_wait("writer", started)
+
+        callbacks = self._after_commit = []
+        try:
+            yield self._writer
+            if self._writer.in_transaction:
+                await self._writer.commit()
+        except BaseException:
+            if self._writer.in_transaction:
+                await self._writer.rollback()
+            raise
+        finally:
+            self._after_commit = None
+            self._metrics["writer"]["in_use"] -= 1
+            self._write_lock.release()
+
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"After-commit callback failed: {e}")
+
+    def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        """Run callback once the open write transaction commits; dropped if it rolls back"""
+        if self._after_commit is None:
+            raise RuntimeError("after_commit needs an open writer block")
+        self._after_commit.append(callback)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Acquire a read-only connection, falling back to the writer for in-memory databases"""
+        if not self._all_readers:
+            async with self.writer() as db:
+                yield db
+            return
+
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                conn = await self._readers.get()
+        except TimeoutError:
+            raise self._timeout_error("reader")
+        self._record_wait("reader", started)
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._metrics["reader"]["in_use"] -= 1
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def dedicated_reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Open a private read-only connection for long scans so they do not pin a pool reader"""
+        if self.in_memory:
+            async with self.reader() as db:
+                yield db
+            return
+
+        uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+        conn = await connect(uri, uri=True)
+        conn.row_factory = aiosqlite.Row
+        try:
+            await conn.execute("PRAGMA query_only = 1")
+            yield conn
+        finally:
+            await conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, acquisition counts and wait times in milliseconds"""
+        stats: Dict[str, Any] = {"readers": len(self._all_readers), "timeout": self.timeout}
+        for kind, metrics in self._metrics.items():
+            acquired = metrics["acquired"]
+            stats[kind] = {
+                "acquired": acquired,
+                "timeouts": metrics["timeouts"],
+                "in_use": metrics["in_use"],
+                "wait_avg_ms": round(metrics["wait_total"] / acquired * 1000, 3) if acquired else 0.0,
+                "wait_max_ms": round(metrics["wait_max"] * 1000, 3),
+            }
+        stats["reader"]["available"] = self._readers.qsize()
+        return stats
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+def _pool_connections() -> Dict[Any, int]:
+    if _pool is None:
+        return {}
+    stats = _pool.stats()
+    return {
+        ("reader", "in_use"): stats["reader"]["in_use"],
+        ("reader", "idle"): stats["reader"]["available"],
+        ("writer", "in_use"): stats["writer"]["in_use"],
+    }
+
+registry.gauge("authcenter_db_pool_connections", "Pooled connections by kind and state", ["kind", "state"],
+               collect=_pool_connections)
+
+async def get_pool() -> ConnectionPool:
+    """Get the connection pool singleton, opening it on first use"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(DATABASE_PATH)
+                await pool.open()
+                _pool = pool
+    return _pool
+
+@asynccontextmanager
+async def read_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow a read-only connection from the pool"""
+    pool = await get_pool()
+    async with pool.reader() as db:
+        yield db
+
+@asynccontextmanager
+async def write_connection() -> AsyncIterator[aiosqlite.Connection]:
+    """Borrow the writer connection; the transaction commits when the block exits"""
+    pool = await get_pool()
+    async with pool.writer() as db:
+        yield db
+
+def after_commit(callback: Callable[[], Awaitable[Any]]):
+    """Run callback after the enclosing write_connection() block commits"""
+    if _pool is None:
+        raise RuntimeError("after_commit needs an open writer block")
+    _pool.after_commit(callback)
+
+async def close_database():
+    """Close the connection pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def lock_path(suffix: str, path: str = DATABASE_PATH) -> str:
+    """Lock file next to the database; in-memory databases are private to one process"""
+    if path == ":memory:" or path.startswith("file::memory:"):
+        return os.path.join(tempfile.gettempdir(), f"authcenter-{os.getpid()}{suffix}")
+    return f"{path}{suffix}"
+
+def sibling_path(name: str, path: str = DATABASE_PATH) -> str:
+    """A file or directory beside the database, independent of the working directory"""
+    if path == ":memory:" or path.startswith("file::memory:"):
+        return os.path.join(tempfile.gettempdir(), f"authcenter-{os.getpid()}-{name}")
+    return os.path.join(os.path.dirname(os.path.abspath(path)), name)
 
 async def init_database():
     """Initialize database with all required tables and seed data"""
-    db = await get_database()
-    
-    # Create tables
-    await create_tables(db)
-    
-    # Seed initial data
-    await seed_providers(db)
-    await seed_admin(db)
-    await seed_internal_apps(db)
-    
-    await db.commit()
+    # Serialized across processes so concurrent starts do not race on DDL and seeds
+    async with FileLock(lock_path(".init.lock")):
+        async with write_connection() as db:
+            # Create tables and apply schema migrations
+            await create_tables(db)
+            await run_migrations(db)
+
+            # Seed initial data
+            await seed_providers(db)
+            await seed_admin(db)
+            await seed_internal_apps(db)
+
+            # Jobs left running by a previous server were cut off mid-run
+            await db.execute("UPDATE sync_jobs SET status = 'interrupted' WHERE status = 'running'")
+
     logger.info("Database initialized successfully")
 
 async def create_tables(db: aiosqlite.Connection):
@@ -148,8 +454,13 @@ async def seed_providers(db: aiosqlite.Connection):
 
 async def seed_admin(db: aiosqlite.Connection):
     """Seed admin user with default password"""
+    # Skip the bcrypt work entirely once the admin row exists
+    cursor = await db.execute("SELECT 1 FROM admin_config WHERE id = 1")
+    if await cursor.fetchone():
+        return
+    
     # Hash the default password "De7au!t"
-    password_hash = bcrypt.hashpw(b'De7au!t', bcrypt.gensalt()).decode('utf-8')
+    password_hash = await hash_password('De7au!t')
     
     await db.execute("""
         INSERT OR IGNORE INTO admin_config (id, username, password_hash)
@@ -0,0 +1,146 @@
+import os
+import logging
+import httpx
+from typing import Dict, Any, Optional, List, AsyncIterator, NamedTuple
+from .registry import Provider
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
+GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:3000/callback")
+GOOGLE_API_BASE = os.getenv("GOOGLE_API_BASE", "https://www.googleapis.com")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://openidconnect.googleapis.com/v1/userinfo")
+
+# Per-service list endpoints, relative to GOOGLE_API_BASE
+SERVICE_PATHS = {
+    "gmail": "/gmail/v1/users/me/messages",
+    "calendar": "/calendar/v3/calendars/primary/events",
+}
+
+# Status a service answers an expired delta token with: Gmail history 404s on a
+# startHistoryId it no longer keeps, Calendar answers 410 Gone on an old syncToken
+EXPIRED_DELTA_STATUS = {
+    "gmail": 404,
+    "calendar": 410,
+}
+
+class Page(NamedTuple):
+    """One page of a service listing plus the checkpoint tokens to resume after it"""
+    items: List[Dict[str, Any]]
+    next_page_token: Optional[str]
+    delta_token: Optional[str]
+
+class ProviderError(Exception):
+    pass
+
+def oauth_configured() -> bool:
+    """True when real Google credentials are configured; otherwise routes serve mock data"""
+    return bool(GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET)
+
+class GoogleClient:
+    """Google OAuth and data calls over the shared pooled HTTP client"""
+
+    def __init__(self, http: httpx.AsyncClient, provider: Provider):
+        self.http = http
+        self.token_url = provider.oauth_config.get("tokenUrl")
+
+    async def _json(self, response: httpx.Response) -> Dict[str, Any]:
+        if response.status_code >= 400:
+            raise ProviderError(f"{response.request.method} {response.request.url} -> {response.status_code}")
+        return response.json()
+
+    async def exchange_code(self, code: str) -> Dict[str, Any]:
+        """Exchange an authorization code for access and refresh tokens"""
+        response = await self.http.post(self.token_url, data={
+            "code": code,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "redirect_uri": GOOGLE_REDIRECT_URI,
+            "grant_type": "authorization_code",
+        })
+        return await self._json(response)
+
+    async def refresh_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Get a new access token for a refresh token"""
+        response = await self.http.post(self.token_url, data={
+            "refresh_token": refresh_token,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "grant_type": "refresh_token",
+        })
+        return await self._json(response)
+
+    async def get_userinfo(self, access_token: str) -> Dict[str, Any]:
+        """Fetch the signed-in user's profile"""
+        response = await self.http.get(
+            GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"}
+        )
+        return await self._json(response)
+
+    async def fetch(self, service: str, access_token: str,
+                    params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Fetch one page of a service's list endpoint"""
+        path = SERVICE_PATHS.get(service)
+        if path is None:
+            raise ProviderError(f"Unsupported service: {service}")
+        response = await self.http.get(
+            GOOGLE_API_BASE + path, params=params, headers={"Authorization": f"Bearer {access_token}"}
+        )
+        return await self._json(response)
+
+    async def pages(self, service: str, access_token: str, page_token: Optional[str] = None,
+                    delta_token: Optional[str] = None) -> AsyncIterator[Page]:
+        """Stream a service page by page
+        
+        Without a delta_token this is a full listing (resumable from page_token).
+        With one, only changes since that token are listed: Gmail history from
+        startHistoryId, Calendar events from syncToken. An expired delta_token
+        falls back to a full listing. The last page carries the delta_token for
+        the next run.
+        """
+        if service not in SERVICE_PATHS:
+            raise ProviderError(f"Unsupported service: {service}")
+        headers = {"Authorization": f"Bearer {access_token}"}
+        url = GOOGLE_API_BASE + SERVICE_PATHS[service]
+        params: Dict[str, Any] = {}
+        if delta_token and service == "gmail":
+            url = GOOGLE_API_BASE + "/gmail/v1/users/me/history"
+            params["startHistoryId"] = delta_token
+        elif delta_token:
+            params["syncToken"] = delta_token
+        start_delta = None if delta_token else await self._start_delta(service, headers)
+
+        while True:
+            if page_token:
+                params["pageToken"] = page_token
+            response = await self.http.get(url, params=params, headers=headers)
+            if delta_token and response.status_code == EXPIRED_DELTA_STATUS[service]:
+                logger.info(f"{service} delta token expired, falling back to a full listing")
+                url, params, page_token, delta_token = GOOGLE_API_BASE + SERVICE_PATHS[service], {}, None, None
+                start_delta = await self._start_delta(service, headers)
+                continue
+            body = await self._json(response)
+
+            if "history" in body:
+                items = [added["message"] for entry in body["history"] for added in entry.get("messagesAdded", [])]
+            else:
+                items = body.get("messages" if service == "gmail" else "items", [])
+            page_token = body.get("nextPageToken")
+            new_delta = body.get("historyId") or body.get("nextSyncToken") or start_delta
+            yield Page(items, page_token, new_delta if not page_token else None)
+            if not page_token:
+                return
+
+    async def _start_delta(self, service: str, headers: Dict[str, str]) -> Optional[str]:
+        """Delta token to resume from after a full listing
+
+        messages.list never returns a historyId, so for Gmail the mailbox's current
+        one is taken before listing starts; changes made during the listing are then
+        picked up by the next run. Calendar returns nextSyncToken on the last page.
+        """
+        if service != "gmail":
+            return None
+        response = await self.http.get(GOOGLE_API_BASE + "/gmail/v1/users/me/profile", headers=headers)
+        history_id = (await self._json(response)).get("historyId")
+        return str(history_id) if history_id is not None else None
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import logging
+import httpx
+from typing import Optional, Dict, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+# One app-scoped client for all outbound provider traffic, so calls reuse
+# keep-alive TCP+TLS connections instead of handshaking every time.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "false").lower() in ("1", "true", "yes")
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that frees its per-host slot once the body is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+class PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """Caps concurrent requests per (scheme, host, port) on top of the pool-wide limits"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int = HTTP_MAX_PER_HOST):
+        self._transport = transport
+        self.max_per_host = max_per_host
+        self._semaphores: Dict[Tuple[bytes, str, Optional[int]], asyncio.Semaphore] = {}
+        self.in_flight: Dict[str, int] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = request.url
+        key = (url.raw_scheme, url.host, url.port)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.max_per_host)
+
+        await semaphore.acquire()
+        self.in_flight[url.host] = self.in_flight.get(url.host, 0) + 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight[url.host] -= 1
+                semaphore.release()
+
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def create_http_client(transport: Optional[httpx.AsyncBaseTransport] = None, **kwargs: Any) -> httpx.AsyncClient:
+    """Build the pooled client; pass a transport to point it at a stand-in server"""
+    http2 = HTTP_HTTP2
+    if http2 and not _http2_available():
+        logger.warning("HTTP_HTTP2 is set but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            retries=1,
+        )
+
+    return httpx.AsyncClient(
+        transport=PerHostLimitTransport(transport),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        headers={"User-Agent": "authcenter-backend/1.0"},
+        **kwargs,
+    )
+
+_client: Optional[httpx.AsyncClient] = None
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None):
+    """Create the shared client (lifespan startup)"""
+    global _client
+    if _client is None:
+        _client = create_http_client(transport)
+
+async def close_http_client():
+    """Close the shared client and its pooled connections (lifespan shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """FastAPI dependency returning the shared client"""
+    global _client
+    if _client is None:
+        # Outside the lifespan (scripts, ad-hoc use) - create on first use
+        _client = create_http_client()
+    return _client
@@ -0,0 +1,92 @@
+import asyncio
+import fcntl
+import os
+import logging
+from typing import Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "10"))
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared by every process on the host
+
+    The OS drops the lock when its holder exits, so a crashed process never
+    leaves it stuck.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def _open(self) -> int:
+        return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def try_acquire(self) -> bool:
+        """Take the lock if it is free; never blocks"""
+        if self.held:
+            return True
+        fd = self._open()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    async def acquire(self):
+        """Wait for the lock without blocking the event loop"""
+        if self.held:
+            return
+        fd = self._open()
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    async def __aenter__(self) -> "FileLock":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+class LeaderElection:
+    """Picks one process per host to run the singleton background jobs
+
+    Every worker calls run(); the first to take the lock starts the jobs, the
+    others keep retrying and take over if the leader exits.
+    """
+
+    def __init__(self, path: str, retry_seconds: float = LEADER_RETRY_SECONDS):
+        self.lock = FileLock(path)
+        self.retry_seconds = retry_seconds
+
+    @property
+    def is_leader(self) -> bool:
+        return self.lock.held
+
+    def try_elect(self) -> bool:
+        return self.lock.try_acquire()
+
+    async def run(self, on_elected: Callable[[], Awaitable[None]]):
+        while not self.try_elect():
+            await asyncio.sleep(self.retry_seconds)
+        logger.info(f"Worker {os.getpid()} elected leader, starting background jobs")
+        await on_elected()
+
+    def release(self):
+        self.lock.release()
@@ -0,0 +1,117 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Validation of PCARP app manifests. Kept free of database and web imports so
+# catalog imports can run it in worker processes.
+
+PCARP_VERSIONS = ("1.0",)
+
+Record = Tuple[str, str]  # (source, JSON text), source being e.g. "apps.ndjson:12"
+
+class ManifestError(ValueError):
+    pass
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise ManifestError(message)
+
+def _is_url(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    parsed = urlparse(value)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+def _string_list(container: Dict[str, Any], key: str, where: str) -> List[Any]:
+    value = container.get(key, [])
+    _require(isinstance(value, list) and all(isinstance(v, str) for v in value),
+             f"{where}.{key} must be a list of strings")
+    return value
+
+def validate_manifest(manifest: Dict[str, Any]):
+    """Check the parts of a PCARP manifest the hub relies on"""
+    _require(manifest.get("pcarp_version") in PCARP_VERSIONS,
+             f"unsupported pcarp_version {manifest.get('pcarp_version')!r}")
+
+    app = manifest.get("app")
+    _require(isinstance(app, dict), "app must be an object")
+    _require(isinstance(app.get("name"), str) and app["name"].strip() != "", "app.name is required")
+
+    authentication = manifest.get("authentication", {})
+    _require(isinstance(authentication, dict), "authentication must be an object")
+    _string_list(authentication, "required_scopes", "authentication")
+    for url in _string_list(authentication, "callback_urls", "authentication"):
+        _require(_is_url(url), f"authentication.callback_urls has an invalid URL: {url!r}")
+    if authentication.get("webhook_url") is not None:
+        _require(_is_url(authentication["webhook_url"]), "authentication.webhook_url is not a valid URL")
+
+    capabilities = manifest.get("capabilities", {})
+    _require(isinstance(capabilities, dict), "capabilities must be an object")
+    _string_list(capabilities, "data_types", "capabilities")
+    _string_list(capabilities, "operations", "capabilities")
+    _require(isinstance(capabilities.get("realtime", False), bool), "capabilities.realtime must be a boolean")
+
+def registration_fields(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Registration fields from either a register-app body or a bare PCARP manifest
+
+    A bare manifest takes its name, display name, description and logo from its
+    app section, and its webhook endpoint from authentication.webhook_url.
+    """
+    if "manifest_data" in record:
+        fields = {key: record.get(key) for key in
+                  ("name", "display_name", "description", "logo_url", "api_endpoints", "manifest_data")}
+    else:
+        _require("pcarp_version" in record, "neither a PCARP manifest nor an app registration")
+        app = record.get("app") if isinstance(record.get("app"), dict) else {}
+        authentication = record.get("authentication") if isinstance(record.get("authentication"), dict) else {}
+        webhook = authentication.get("webhook_url")
+        fields = {
+            "name": app.get("name"),
+            "display_name": app.get("display_name") or app.get("name"),
+            "description": app.get("description", ""),
+            "logo_url": app.get("logo_url"),
+            "api_endpoints": record.get("api_endpoints") or ({"webhook": webhook} if webhook else {}),
+            "manifest_data": record,
+        }
+
+    for key in ("name", "display_name"):
+        _require(isinstance(fields[key], str) and fields[key].strip() != "", f"{key} is required")
+    _require(isinstance(fields["description"], str), "description must be a string")
+    _require(fields["logo_url"] is None or isinstance(fields["logo_url"], str), "logo_url must be a string")
+    _require(isinstance(fields["api_endpoints"], dict), "api_endpoints must be an object")
+    for key, url in fields["api_endpoints"].items():
+        _require(_is_url(url), f"api_endpoints.{key} is not a valid URL")
+    _require(isinstance(fields["manifest_data"], dict), "manifest_data must be an object")
+    validate_manifest(fields["manifest_data"])
+    _require(fields["manifest_data"]["app"]["name"] == fields["name"],
+             f"app.name {fields['manifest_data']['app']['name']!r} does not match name {fields['name']!r}")
+    return fields
+
+def _record_name(record: Any) -> Optional[str]:
+    if not isinstance(record, dict):
+        return None
+    app = record.get("app")
+    return record.get("name") or (app.get("name") if isinstance(app, dict) else None)
+
+def validate_record(source: str, text: str) -> Dict[str, Any]:
+    """Parse and validate one manifest into an internal_apps row, or an error"""
+    record = None
+    try:
+        record = json.loads(text)
+        _require(isinstance(record, dict), "expected a JSON object")
+        fields = registration_fields(record)
+    except ValueError as e:  # ManifestError and JSONDecodeError
+        return {"source": source, "name": _record_name(record), "error": str(e)}
+    return {
+        "source": source,
+        "name": fields["name"],
+        "display_name": fields["display_name"],
+        "description": fields["description"],
+        "logo_url": fields["logo_url"],
+        "api_endpoints": json.dumps(fields["api_endpoints"]),
+        "manifest_data": json.dumps(fields["manifest_data"]),
+    }
+
+def validate_batch(records: List[Record]) -> List[Dict[str, Any]]:
+    """validate_record over a batch; the unit of work sent to each worker process"""
+    return [validate_record(source, text) for source, text in records]
@@ -0,0 +1,316 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List, Tuple, Callable, Sequence
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Set by serve.py: each worker publishes its snapshot here so whichever worker answers a scrape reports all of them
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_PUBLISH_SECONDS = float(os.getenv("METRICS_PUBLISH_SECONDS", "5"))
+METRICS_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+Labels = Tuple[str, ...]
+
+class Metric:
+    """A named family of samples keyed by label values
+
+    Samples are either recorded as they happen or, with collect, read from a
+    component's own counters at scrape time.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._collect = collect
+        self.values: Dict[Labels, Any] = {}
+
+    def samples(self) -> Dict[Labels, Any]:
+        if self._collect is None:
+            return self.values
+        value = self._collect()
+        return value if isinstance(value, dict) else {(): value}
+
+    def combine(self, a, b):
+        """Merge one label set's values from two workers"""
+        return a + b
+
+    def lines(self, labels: Labels, value) -> List[str]:
+        return [f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"]
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Any]] = None, aggregate: str = "sum"):
+        super().__init__(name, help, labels, collect)
+        self.aggregate = aggregate
+
+    def set(self, value: float, labels: Labels = ()):
+        self.values[labels] = value
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def combine(self, a, b):
+        return max(a, b) if self.aggregate == "max" else a + b
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: Labels = ()):
+        # [per-bucket counts (last one is +Inf), sum]; made cumulative only when rendered
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def combine(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1]]
+
+    def lines(self, labels: Labels, value) -> List[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = format_labels(self.label_names + ("le",), labels + (format_value(bound),))
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        base = format_labels(self.label_names, labels)
+        lines.append(f"{self.name}_sum{base} {format_value(total)}")
+        lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Labels, values: Labels) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+class MetricsRegistry:
+    """Every metric of this process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = (), collect=None) -> Counter:
+        return self.register(Counter(name, help, labels, collect))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), collect=None, aggregate: str = "sum") -> Gauge:
+        return self.register(Gauge(name, help, labels, collect, aggregate))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def snapshot(self) -> Dict[str, List]:
+        """Current samples as JSON-serializable [labels, value] pairs per metric"""
+        snapshot = {}
+        for name, metric in self.metrics.items():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error(f"Collecting metric {name} failed: {e}")
+                continue
+            snapshot[name] = [[list(labels), value] for labels, value in samples.items()]
+        return snapshot
+
+    def merge(self, snapshots: List[Dict[str, List]]) -> Dict[str, Dict[Labels, Any]]:
+        merged: Dict[str, Dict[Labels, Any]] = {}
+        for snapshot in snapshots:
+            for name, samples in snapshot.items():
+                metric = self.metrics.get(name)
+                if metric is None:
+                    continue
+                target = merged.setdefault(name, {})
+                for labels, value in samples:
+                    key = tuple(labels)
+                    target[key] = value if key not in target else metric.combine(target[key], value)
+        return merged
+
+    def render(self, samples: Dict[str, Dict[Labels, Any]]) -> str:
+        lines = []
+        for name, metric in self.metrics.items():
+            if not samples.get(name):
+                continue
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(samples[name].items()):
+                lines.extend(metric.lines(labels, value))
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("authcenter_http_requests_total", "HTTP requests by route template and status",
+                                 ["method", "route", "status"])
+http_duration = registry.histogram("authcenter_http_request_duration_seconds",
+                                   "Time from request start to the last response byte", ["method", "route"])
+http_in_flight = registry.gauge("authcenter_http_requests_in_flight", "Requests being handled right now")
+loop_lag = registry.histogram("authcenter_event_loop_lag_seconds",
+                              "How late a periodic timer fires; time the event loop was blocked", buckets=SQL_BUCKETS)
+loop_lag_last = registry.gauge("authcenter_event_loop_lag_last_seconds", "Latest event loop lag sample",
+                               aggregate="max")
+
+# ASGI scope of the request the current task serves, so work like slow queries can name its route
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+def current_route() -> str:
+    """'METHOD /route/{template}' of the request being served, or 'background' outside one"""
+    scope = request_scope.get()
+    if scope is None:
+        return "background"
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', None) or scope['path']}"
+
+def exposition() -> str:
+    """This worker's metrics merged with the latest snapshots of its sibling workers"""
+    snapshots = [registry.snapshot()]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for entry in os.scandir(METRICS_DIR):
+            pid, ext = os.path.splitext(entry.name)
+            if ext != ".json" or not pid.isdigit() or int(pid) == os.getpid() or not pid_alive(int(pid)):
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {entry.name}: {e}")
+    return registry.render(registry.merge(snapshots))
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every request under its route template
+
+    Unmatched paths share one label so scanners cannot blow up the series count.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        token = request_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_scope.reset(token)
+            http_in_flight.dec()
+            # The router records the matched route in the shared scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_duration.observe(elapsed, (scope["method"], path))
+            http_requests.inc((scope["method"], path, str(status)))
+
+class WorkerMetrics:
+    """Per-worker background sampling: event-loop lag, plus snapshot publishing under serve.py"""
+
+    def __init__(self, lag_interval: float = METRICS_LOOP_LAG_INTERVAL_SECONDS,
+                 publish_interval: float = METRICS_PUBLISH_SECONDS, directory: Optional[str] = METRICS_DIR):
+        self.lag_interval = lag_interval
+        self.publish_interval = publish_interval
+        self.directory = directory
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks.append(asyncio.create_task(self._sample_loop_lag()))
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self._tasks.append(asyncio.create_task(self._publish()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.directory:
+            try:
+                os.remove(self.snapshot_path)
+            except FileNotFoundError:
+                pass
+
+    async def _sample_loop_lag(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, time.perf_counter() - start - self.lag_interval)
+            loop_lag.observe(lag)
+            loop_lag_last.set(lag)
+
+    async def _publish(self):
+        while True:
+            await asyncio.sleep(self.publish_interval)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                logger.error(f"Failed to publish metrics snapshot: {e}")
+
+    def write_snapshot(self):
+        path = self.snapshot_path
+        with open(path + ".tmp", "w") as f:
+            json.dump(registry.snapshot(), f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+worker_metrics = WorkerMetrics()
@@ -0,0 +1,162 @@
+import aiosqlite
+import logging
+from typing import List, Tuple
+from .stats import STATS_SCHEMA_SQL, REBUILD_STATS_SQL
+from .app_search import APP_SEARCH_SCHEMA_SQL, REBUILD_APP_SEARCH_SQL
+from .audit_search import AUDIT_SEARCH_SCHEMA_SQL, REBUILD_AUDIT_SEARCH_SQL
+
+logger = logging.getLogger(__name__)
+
+# Ordered schema migrations: (version, description, statements).
+# The applied version is tracked in PRAGMA user_version; append new entries, never edit applied ones.
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "hot-path indexes", [
+        # /api/connections and /api/v1/data lookups: user_id = ? AND status = 'active' ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_connections_user_status_created ON connections(user_id, status, created_at)",
+        # /api/admin/stats active connection count
+        "CREATE INDEX IF NOT EXISTS idx_connections_status ON connections(status)",
+        # /api/admin/logs ORDER BY created_at DESC and the created_at > datetime('now', ...) counts
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at ON audit_logs(created_at)",
+        # /api/admin/logs/stats GROUP BY action
+        "CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action)",
+        # /api/mapping/list ORDER BY created_at DESC
+        "CREATE INDEX IF NOT EXISTS idx_app_mappings_created_at ON app_mappings(created_at)",
+        # /api/admin/apps dedup subquery GROUP BY name, display_name and the seed lookup
+        "CREATE INDEX IF NOT EXISTS idx_internal_apps_name_display ON internal_apps(name, display_name)",
+        # /api/mapping/internal-apps and active app count: status = 'active' ORDER BY display_name
+        "CREATE INDEX IF NOT EXISTS idx_internal_apps_status_display ON internal_apps(status, display_name)",
+        # /api/providers: enabled = 1 ORDER BY display_name
+        "CREATE INDEX IF NOT EXISTS idx_providers_enabled_display ON providers(enabled, display_name)",
+    ]),
+    (2, "trigger-maintained dashboard counters", STATS_SCHEMA_SQL + REBUILD_STATS_SQL),
+    (3, "cache version stamps", [
+        """
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        "INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('providers', 1)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_providers_version_insert AFTER INSERT ON providers BEGIN
+            UPDATE cache_versions SET version = version + 1 WHERE name = 'providers';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_providers_version_update AFTER UPDATE ON providers BEGIN
+            UPDATE cache_versions SET version = version + 1 WHERE name = 'providers';
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_providers_version_delete AFTER DELETE ON providers BEGIN
+            UPDATE cache_versions SET version = version + 1 WHERE name = 'providers';
+        END
+        """,
+    ]),
+    (4, "token refresh scan index", [
+        # Token refresh rescans: status = 'active' AND expires_at <= ?
+        "CREATE INDEX IF NOT EXISTS idx_connections_status_expires ON connections(status, expires_at)",
+    ]),
+    (5, "audit log archive index", [
+        # One row per daily archive file written by audit retention
+        """
+        CREATE TABLE IF NOT EXISTS audit_archives (
+            day TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            min_id INTEGER,
+            max_id INTEGER,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        """,
+    ]),
+    (6, "incremental sync checkpoints and jobs", [
+        # Where the next sync of a connection's service resumes: page_token mid-listing,
+        # delta_token (Gmail historyId / Calendar syncToken) once a listing has completed
+        """
+        CREATE TABLE IF NOT EXISTS sync_checkpoints (
+            connection_id INTEGER NOT NULL REFERENCES connections(id) ON DELETE CASCADE,
+            service TEXT NOT NULL,
+            page_token TEXT,
+            delta_token TEXT,
+            records_synced INTEGER NOT NULL DEFAULT 0,
+            last_job_id TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (connection_id, service)
+        ) WITHOUT ROWID
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sync_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            connection_id INTEGER,
+            provider TEXT NOT NULL,
+            service TEXT NOT NULL,
+            status TEXT NOT NULL,
+            records INTEGER DEFAULT 0,
+            bytes INTEGER DEFAULT 0,
+            batches INTEGER DEFAULT 0,
+            pages INTEGER DEFAULT 0,
+            failed_batches INTEGER DEFAULT 0,
+            duration_ms REAL,
+            error TEXT,
+            started_at DATETIME,
+            finished_at DATETIME
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sync_jobs_connection_started ON sync_jobs(connection_id, started_at)",
+    ]),
+    (7, "webhook outbox", [
+        # Times are unix seconds (REAL) so retry backoff and latency keep sub-second precision
+        """
+        CREATE TABLE IF NOT EXISTS webhook_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            app_id INTEGER NOT NULL REFERENCES internal_apps(id) ON DELETE CASCADE,
+            url TEXT NOT NULL,
+            event_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            enqueued_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            delivered_at REAL
+        )
+        """,
+        # Dispatcher scan: status = 'pending' AND next_attempt_at <= ?
+        "CREATE INDEX IF NOT EXISTS idx_webhook_outbox_status_next ON webhook_outbox(status, next_attempt_at)",
+    ]),
+    (8, "one running sync job per connection and service", [
+        "UPDATE sync_jobs SET status = 'interrupted' WHERE status = 'running'",
+        # Enforced by the database so workers in different processes cannot start the same sync
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_running ON sync_jobs(connection_id, service) WHERE status = 'running'",
+    ]),
+    (9, "full-text search over the app catalog", APP_SEARCH_SCHEMA_SQL + REBUILD_APP_SEARCH_SQL),
+    (10, "audit log search indexes", AUDIT_SEARCH_SCHEMA_SQL + REBUILD_AUDIT_SEARCH_SQL),
+]
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Read the applied schema version"""
+    cursor = await db.execute("PRAGMA user_version")
+    row = await cursor.fetchone()
+    return row[0]
+
+async def run_migrations(db: aiosqlite.Connection):
+    """Apply pending migrations, each in its own transaction, then refresh planner statistics"""
+    current = await get_schema_version(db)
+    pending = [m for m in MIGRATIONS if m[0] > current]
+
+    for version, description, statements in pending:
+        await db.execute("BEGIN")
+        for statement in statements:
+            await db.execute(statement)
+        await db.execute(f"PRAGMA user_version = {version}")
+        await db.commit()
+        logger.info(f"Applied migration {version}: {description}")
+
+    if pending:
+        # New indexes need fresh statistics before the planner will trust them
+        await db.execute("ANALYZE")
+        await db.commit()
+
+    await db.execute("PRAGMA optimize")
@@ -0,0 +1,62 @@
+from fastapi import HTTPException
+from typing import Optional, Tuple, Dict, Any
+import base64
+import json
+import aiosqlite
+
+# Keyset pagination over (created_at, id). Cursors are opaque to clients: base64url(JSON).
+
+TOTAL_MODES = ("exact", "approximate", "none")
+# Largest page a list endpoint returns; routes declare limit as Query(ge=1, le=PAGE_MAX_LIMIT)
+# since next_cursor needs at least one row per page to move forward
+PAGE_MAX_LIMIT = 1000
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    """Encode the sort key of the last row on a page"""
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(created_at, str) or not isinstance(row_id, int):
+            raise ValueError("malformed cursor")
+        return created_at, row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def validate_total_mode(total: str) -> str:
+    """Reject unknown total modes"""
+    if total not in TOTAL_MODES:
+        raise HTTPException(status_code=400, detail=f"total must be one of: {', '.join(TOTAL_MODES)}")
+    return total
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """Cursor for the page after rows, or None on the last page (rows holds up to limit + 1 items)"""
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last['created_at'], last['id'])
+
+async def count_rows(db: aiosqlite.Connection, table: str, mode: str) -> Optional[int]:
+    """Row count for a table: exact COUNT(*), an O(1) rowid-span estimate, or None"""
+    if mode == "none":
+        return None
+    if mode == "approximate":
+        # MIN/MAX on the rowid are single b-tree probes; gaps from deletes make this an upper bound
+        cursor = await db.execute(
+            f"SELECT (SELECT MAX(id) FROM {table}) - (SELECT MIN(id) FROM {table}) + 1 AS count"
+        )
+    else:
+        cursor = await db.execute(f"SELECT COUNT(*) AS count FROM {table}")
+    row = await cursor.fetchone()
+    return row['count'] or 0
+
+def page_response(key: str, items: list, limit: int, rows: list, total: Optional[int]) -> Dict[str, Any]:
+    """Response body for a keyset page"""
+    body: Dict[str, Any] = {key: items, "limit": limit, "next_cursor": next_cursor(rows, limit)}
+    if total is not None:
+        body["total"] = total
+    return body
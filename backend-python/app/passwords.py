@@ -0,0 +1,33 @@
+import asyncio
+import os
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# bcrypt is deliberately slow (hundreds of ms per call); run it on a small dedicated
+# pool so hashing never blocks the event loop and a burst of logins cannot occupy
+# more than PASSWORD_HASH_WORKERS threads - extra callers wait on the semaphore.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+    return _semaphore
+
+async def _run(func, *args):
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+
+async def hash_password(password: str) -> str:
+    """Hash a password with a fresh salt off the event loop"""
+    hashed = await _run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+    return hashed.decode('utf-8')
+
+async def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a bcrypt hash off the event loop"""
+    return await _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
@@ -0,0 +1,151 @@
+import aiosqlite
+import functools
+import os
+import re
+import sqlite3
+import time
+import logging
+from typing import Optional, Dict, Any, List, Iterable
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+QUERY_STATS_MAX_STATEMENTS = int(os.getenv("QUERY_STATS_MAX_STATEMENTS", "1000"))
+QUERY_STATS_ORDERS = ("total", "max", "mean", "calls")
+# Statements listed per request; explain=true may run one EXPLAIN for each
+QUERY_STATS_MAX_LIMIT = 100
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "insert", "update", "delete", "replace", "with")
+
+@functools.lru_cache(maxsize=4096)
+def normalize_statement(sql: str) -> str:
+    """Statement text with literals replaced by ? so calls differing only in values share an entry"""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    return _IN_LIST.sub("IN (?...)", sql)
+
+def explainable(sql: str) -> bool:
+    return sql.lstrip()[:7].lower().startswith(_EXPLAINABLE)
+
+def placeholder_count(sql: str) -> int:
+    return _STRING_LITERAL.sub("", sql).count("?")
+
+def format_plan(rows: Iterable) -> str:
+    """EXPLAIN QUERY PLAN rows (id, parent, notused, detail) as an indented tree"""
+    depth: Dict[int, int] = {0: -1}
+    lines = []
+    for row in rows:
+        node_id, parent, detail = row[0], row[1], row[3]
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+async def explain(db, sql: str, parameters: Optional[Iterable] = None) -> str:
+    """EXPLAIN QUERY PLAN for sql; parameters default to NULLs, which leaves the plan shape unchanged"""
+    if parameters is None:
+        parameters = [None] * placeholder_count(sql)
+    try:
+        # Straight to aiosqlite so the EXPLAIN itself is not timed and recorded
+        cursor = await aiosqlite.Connection.execute(db, f"EXPLAIN QUERY PLAN {sql}", parameters)
+        return format_plan(await cursor.fetchall())
+    except sqlite3.Error as e:
+        return f"(plan unavailable: {e})"
+
+class QueryStats:
+    """Per-statement timings for this worker, plus the slow-query log
+
+    Statements are keyed by their normalized text. Once max_statements distinct
+    statements are tracked, new ones are only counted as untracked.
+    """
+
+    def __init__(self, slow_ms: float = SLOW_QUERY_MS, max_statements: int = QUERY_STATS_MAX_STATEMENTS):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.untracked = 0
+        self.since = time.time()
+
+    def is_slow(self, elapsed: float) -> bool:
+        return self.slow_ms > 0 and elapsed * 1000 >= self.slow_ms
+
+    def record(self, sql: str, elapsed: float, route: str) -> Optional[Dict[str, Any]]:
+        """Add one execution; returns the statement's entry, or None when untracked"""
+        key = normalize_statement(sql)
+        entry = self._entries.get(key)
+        if entry is None:
+            if len(self._entries) >= self.max_statements:
+                self.untracked += 1
+                return None
+            entry = self._entries[key] = {
+                "statement": key, "sample": sql, "calls": 0, "total": 0.0, "max": 0.0,
+                "slow_calls": 0, "max_route": None, "routes": set(), "plan": None,
+            }
+        entry["calls"] += 1
+        entry["total"] += elapsed
+        if elapsed > entry["max"]:
+            entry["max"] = elapsed
+            entry["max_route"] = route
+        if len(entry["routes"]) < 5:
+            entry["routes"].add(route)
+        return entry
+
+    def log_slow(self, entry: Optional[Dict[str, Any]], sql: str, elapsed: float, route: str, plan: Optional[str]):
+        if entry is not None:
+            entry["slow_calls"] += 1
+            if plan:
+                entry["plan"] = plan
+        plan_text = f"\n{plan}" if plan else ""
+        logger.warning(f"Slow query {elapsed * 1000:.1f} ms in {route}: {normalize_statement(sql)}{plan_text}")
+
+    def needs_plan(self, entry: Optional[Dict[str, Any]], sql: str) -> bool:
+        """Plans are captured once per statement, on its first slow call"""
+        return explainable(sql) and (entry is None or entry["plan"] is None)
+
+    def top(self, limit: int = 20, order: str = "total") -> List[Dict[str, Any]]:
+        """Most expensive statements, in milliseconds"""
+        keys = {
+            "total": lambda e: e["total"],
+            "max": lambda e: e["max"],
+            "mean": lambda e: e["total"] / e["calls"],
+            "calls": lambda e: e["calls"],
+        }
+        entries = sorted(self._entries.values(), key=keys[order], reverse=True)[:limit]
+        return [{
+            "statement": e["statement"],
+            "calls": e["calls"],
+            "total_ms": round(e["total"] * 1000, 3),
+            "mean_ms": round(e["total"] / e["calls"] * 1000, 3),
+            "max_ms": round(e["max"] * 1000, 3),
+            "max_route": e["max_route"],
+            "slow_calls": e["slow_calls"],
+            "routes": sorted(e["routes"]),
+            "plan": e["plan"],
+        } for e in entries]
+
+    async def capture_plans(self, db, statements: List[str]):
+        """Fill in plans for statements that have not been slow yet, using their sample text"""
+        for statement in statements:
+            entry = self._entries.get(statement)
+            if entry is not None and entry["plan"] is None and explainable(entry["sample"]):
+                entry["plan"] = await explain(db, entry["sample"])
+
+    def reset(self):
+        self._entries.clear()
+        self.untracked = 0
+        self.since = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "since": self.since,
+            "statements": len(self._entries),
+            "untracked_calls": self.untracked,
+            "slow_query_ms": self.slow_ms,
+        }
+
+query_stats = QueryStats()
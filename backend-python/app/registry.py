@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import logging
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Mapping, Tuple
+from fastapi import Request, Response
+from .database import read_connection
+from .cache import shared_cache
+from .serialization import json_backend
+
+logger = logging.getLogger(__name__)
+
+# How often a worker re-reads the providers version stamp to pick up changes from other processes
+PROVIDER_REGISTRY_CHECK_SECONDS = float(os.getenv("PROVIDER_REGISTRY_CHECK_SECONDS", "5"))
+
+@dataclass(frozen=True)
+class Provider:
+    """Immutable provider row with oauth_config and scopes already parsed"""
+    id: int
+    name: str
+    display_name: str
+    oauth_config: Mapping[str, Any]
+    scopes: Tuple[str, ...]
+    enabled: bool
+    created_at: Optional[str]
+
+    @classmethod
+    def from_row(cls, row) -> "Provider":
+        return cls(
+            id=row['id'],
+            name=row['name'],
+            display_name=row['display_name'],
+            oauth_config=MappingProxyType(json.loads(row['oauth_config'])),
+            scopes=tuple(row['scopes'].split(',')),
+            enabled=bool(row['enabled']),
+            created_at=row['created_at'],
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Same shape the provider endpoints have always returned"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "display_name": self.display_name,
+            "oauth_config": dict(self.oauth_config),
+            "scopes": list(self.scopes),
+            "enabled": int(self.enabled),
+            "created_at": self.created_at,
+        }
+
+@dataclass(frozen=True)
+class CachedBody:
+    """Pre-serialized JSON response body and its ETag"""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def from_content(cls, content: Any) -> "CachedBody":
+        body = json_backend.dumps(content)
+        return cls(body=body, etag='"' + hashlib.sha1(body).hexdigest() + '"')
+
+    def response(self, request: Request, headers: Optional[Dict[str, str]] = None) -> Response:
+        """200 with the cached body, or 304 when the client already holds it"""
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache", **(headers or {})}
+        if request.headers.get("if-none-match") == self.etag:
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+class ProviderRegistry:
+    """In-process provider cache, reloaded when the providers version stamp changes"""
+
+    def __init__(self, check_interval: float = PROVIDER_REGISTRY_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self.version: Optional[int] = None
+        self._by_id: Dict[int, Provider] = {}
+        self._by_name: Dict[str, Provider] = {}
+        self._list_body: Optional[CachedBody] = None
+        self._item_bodies: Dict[int, CachedBody] = {}
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """Load every provider and pre-serialize the endpoint responses"""
+        async with read_connection() as db:
+            version = await self._read_version(db)
+            cursor = await db.execute("SELECT * FROM providers ORDER BY display_name")
+            rows = await cursor.fetchall()
+
+        providers = [Provider.from_row(row) for row in rows]
+        self._by_id = {p.id: p for p in providers}
+        self._by_name = {p.name: p for p in providers}
+        self._list_body = CachedBody.from_content(
+            {"providers": [p.to_dict() for p in providers if p.enabled]}
+        )
+        self._item_bodies = {p.id: CachedBody.from_content({"provider": p.to_dict()}) for p in providers}
+        self.version = version
+        self._checked_at = time.monotonic()
+        logger.info(f"Provider registry loaded {len(providers)} providers (version {version})")
+
+    async def _read_version(self, db) -> int:
+        cursor = await db.execute("SELECT version FROM cache_versions WHERE name = 'providers'")
+        row = await cursor.fetchone()
+        return row['version'] if row else 0
+
+    async def ensure_fresh(self):
+        """Reload if the version stamp moved; the stamp is read at most once per check interval"""
+        if self.version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self.version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            if self.version is not None:
+                async with read_connection() as db:
+                    version = await self._read_version(db)
+                if version == self.version:
+                    self._checked_at = time.monotonic()
+                    return
+            await self.load()
+
+    def invalidate(self):
+        """Force a reload on the next access"""
+        self.version = None
+
+    async def get(self, provider_id: int) -> Optional[Provider]:
+        await self.ensure_fresh()
+        return self._by_id.get(provider_id)
+
+    async def get_by_name(self, name: str) -> Optional[Provider]:
+        await self.ensure_fresh()
+        return self._by_name.get(name)
+
+    async def list_body(self) -> CachedBody:
+        await self.ensure_fresh()
+        return self._list_body
+
+    async def item_body(self, provider_id: int) -> Optional[CachedBody]:
+        await self.ensure_fresh()
+        return self._item_bodies.get(provider_id)
+
+provider_registry = ProviderRegistry()
+
+# Lets a provider change reach every worker at once instead of after the next version check
+shared_cache.subscribe("providers", lambda keys: provider_registry.invalidate())
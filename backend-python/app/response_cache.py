@@ -0,0 +1,172 @@
+import asyncio
+import os
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple, Callable, Awaitable, Set
+from .registry import CachedBody
+from .cache import shared_cache
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_STALE_SECONDS = float(os.getenv("RESPONSE_CACHE_STALE_SECONDS", "60"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# (user_id, provider, service, normalized query string)
+CacheKey = Tuple[str, str, str, str]
+
+@dataclass(frozen=True)
+class CacheEntry:
+    cached: CachedBody
+    stored_at: float
+
+def make_cache_key(user_id: Any, provider: str, service: str, query: Dict[str, str]) -> CacheKey:
+    """Cache key with the query parameters in a canonical order"""
+    return (str(user_id), provider, service, "&".join(f"{k}={v}" for k, v in sorted(query.items())))
+
+class ResponseCache:
+    """TTL + LRU cache of serialized responses with single-flight loads and stale-while-revalidate"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS, stale: float = RESPONSE_CACHE_STALE_SECONDS,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, CacheEntry]" = OrderedDict()
+        self._by_user: Dict[str, Set[CacheKey]] = {}
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[CacheKey, asyncio.Future] = {}
+        self._revalidations: Set[asyncio.Task] = set()
+        self._bytes = 0
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "evictions": 0, "invalidations": 0}
+
+    async def get_or_load(self, key: CacheKey,
+                          loader: Callable[[], Awaitable[Any]]) -> Tuple[CachedBody, str]:
+        """Return (body, state) where state is HIT, STALE or MISS"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age < self.ttl:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry.cached, "HIT"
+            if age < self.ttl + self.stale:
+                # Serve the stale copy now and refresh it in the background
+                self._entries.move_to_end(key)
+                self.counters["stale_hits"] += 1
+                if key not in self._inflight:
+                    task = asyncio.create_task(self._revalidate(key, loader))
+                    self._revalidations.add(task)
+                    task.add_done_callback(self._revalidations.discard)
+                return entry.cached, "STALE"
+
+        self.counters["misses"] += 1
+        return await self._load(key, loader), "MISS"
+
+    async def _load(self, key: CacheKey, loader: Callable[[], Awaitable[Any]]) -> CachedBody:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Identical request already going upstream - wait for its result
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only retry when the leading request was cancelled (its client went away), not this one
+                if asyncio.current_task().cancelling() or not inflight.cancelled():
+                    raise
+            return await self._load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generations.get(key[0], 0)
+        try:
+            cached = CachedBody.from_content(await loader())
+            if self._generations.get(key[0], 0) == generation:
+                # Skip storing if the user's entries were invalidated while loading
+                self._store(key, cached)
+            future.set_result(cached)
+            return cached
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        except BaseException:
+            # Cancellation belongs to this caller; waiters see a cancelled future and load again
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _revalidate(self, key: CacheKey, loader: Callable[[], Awaitable[Any]]):
+        try:
+            await self._load(key, loader)
+        except Exception as e:
+            logger.warning(f"Background revalidation of {key[1]}/{key[2]} failed: {e}")
+
+    def _store(self, key: CacheKey, cached: CachedBody):
+        self._discard(key)
+        self._entries[key] = CacheEntry(cached, time.monotonic())
+        self._by_user.setdefault(key[0], set()).add(key)
+        self._bytes += len(cached.body)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.counters["evictions"] += 1
+
+    def _discard(self, key: CacheKey):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.cached.body)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+    def invalidate(self, user_id: Any, provider: Optional[str] = None):
+        """Drop a user's cached responses, optionally only for one provider"""
+        self._generations[str(user_id)] = self._generations.get(str(user_id), 0) + 1
+        for key in list(self._by_user.get(str(user_id), ())):
+            if provider is None or key[1] == provider:
+                self._discard(key)
+                self.counters["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "in_flight": len(self._inflight),
+        }
+
+response_cache = ResponseCache()
+
+registry.gauge("authcenter_response_cache_entries", "Cached provider responses", collect=lambda: len(response_cache._entries))
+registry.gauge("authcenter_response_cache_in_flight", "Upstream loads that concurrent requests are waiting on",
+               collect=lambda: len(response_cache._inflight))
+registry.counter("authcenter_response_cache_lookups_total", "Response cache lookups by result", ["result"],
+                 collect=lambda: {(k,): response_cache.counters[k] for k in ("hits", "stale_hits", "misses", "coalesced")})
+
+async def invalidate_user_responses(user_id: Any, provider: Optional[str] = None):
+    """Drop a user's cached responses in every worker sharing the cache backend"""
+    await shared_cache.invalidate([f"responses:{user_id}:{provider or '*'}"])
+
+def _on_invalidate(keys):
+    for key in keys:
+        _, user_id, provider = key.split(":", 2)
+        response_cache.invalidate(user_id, None if provider == "*" else provider)
+
+shared_cache.subscribe("responses:", _on_invalidate)
@@ -0,0 +1,282 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Iterable, Tuple
+from .database import read_connection, write_connection, sibling_path, lock_path
+from .locks import FileLock
+from .audit_export import build_export_query, encode_ndjson
+
+logger = logging.getLogger(__name__)
+
+# Audit logs older than this many days are moved to archive files; 0 (the default) keeps
+# everything in the database and does not start the retention loop
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "0"))
+# Beside the database by default, so serve.py, main.py and the CLI archive to the same place
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR") or sibling_path("audit_archive")
+AUDIT_RETENTION_BATCH_SIZE = int(os.getenv("AUDIT_RETENTION_BATCH_SIZE", "500"))
+AUDIT_RETENTION_PAUSE_SECONDS = float(os.getenv("AUDIT_RETENTION_PAUSE_SECONDS", "0.1"))
+AUDIT_RETENTION_INTERVAL_SECONDS = float(os.getenv("AUDIT_RETENTION_INTERVAL_SECONDS", "3600"))
+AUDIT_RETENTION_VACUUM_PAGES = int(os.getenv("AUDIT_RETENTION_VACUUM_PAGES", "1000"))
+AUDIT_ARCHIVE_MAX_QUERY_DAYS = int(os.getenv("AUDIT_ARCHIVE_MAX_QUERY_DAYS", "31"))
+
+class RetentionInProgressError(Exception):
+    pass
+
+def archive_path(day: str, archive_dir: str = AUDIT_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"audit_logs_{day}.ndjson.gz")
+
+def _append_archives(batches: Dict[str, List[Any]], archive_dir: str):
+    """Append each day's rows as a new gzip member and fsync before the rows are deleted"""
+    os.makedirs(archive_dir, exist_ok=True)
+    for day, rows in batches.items():
+        with open(archive_path(day, archive_dir), "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                archive.write(encode_ndjson(rows))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+def read_archive(path: str) -> Iterable[Dict[str, Any]]:
+    """Rows of one daily archive file (multi-member gzip NDJSON)"""
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            if line.strip():
+                yield json.loads(line)
+
+class AuditRetention:
+    """Moves old audit logs into daily gzip NDJSON archives in small throttled batches
+
+    Rows are appended and fsynced to the archive before they are deleted, so a crash
+    can at worst archive a batch twice; archive reads skip duplicate ids. A run holds
+    a lock file beside the database, so the leader's loop and a manual run in another
+    worker never append to the same archive at once.
+    """
+
+    def __init__(self, retention_days: int = AUDIT_RETENTION_DAYS, archive_dir: str = AUDIT_ARCHIVE_DIR,
+                 batch_size: int = AUDIT_RETENTION_BATCH_SIZE, pause: float = AUDIT_RETENTION_PAUSE_SECONDS,
+                 interval: float = AUDIT_RETENTION_INTERVAL_SECONDS,
+                 vacuum_pages: int = AUDIT_RETENTION_VACUUM_PAGES):
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+        self._lock_path = lock_path(".retention.lock")
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.counters = {"runs": 0, "archived": 0, "batches": 0, "vacuumed_pages": 0, "failed_runs": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.retention_days > 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def cutoff(self) -> str:
+        return (datetime.utcnow() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    async def start(self):
+        """Start the periodic retention loop"""
+        if self.running or not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Audit retention started: keeping {self.retention_days} days, archiving to {self.archive_dir}")
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except RetentionInProgressError as e:
+                logger.info(f"Skipping audit retention run: {e}")
+            except Exception as e:
+                self.counters["failed_runs"] += 1
+                logger.error(f"Audit retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """Archive everything older than the cutoff, then release the freed pages"""
+        if not self.enabled:
+            return {"archived": 0, "batches": 0, "vacuumed_pages": 0}
+        # A fresh lock per run: flock conflicts between open files, so this also excludes
+        # a second run in this process
+        lock = FileLock(self._lock_path)
+        if not lock.try_acquire():
+            raise RetentionInProgressError("Audit retention is already running")
+        try:
+            started = time.monotonic()
+            cutoff = self.cutoff()
+            sql, params = build_export_query(until=cutoff)
+            sql += " LIMIT ?"
+            archived = batches = 0
+
+            while max_batches is None or batches < max_batches:
+                async with read_connection() as db:
+                    cursor = await db.execute(sql, params + [self.batch_size])
+                    rows = await cursor.fetchall()
+                if not rows:
+                    break
+                await self._archive_batch(rows)
+                archived += len(rows)
+                batches += 1
+                # Yield the writer between batches so request traffic is not starved
+                await asyncio.sleep(self.pause)
+
+            vacuumed = await self.incremental_vacuum() if archived else 0
+            self.counters["runs"] += 1
+            self.counters["archived"] += archived
+            self.counters["batches"] += batches
+            self.counters["vacuumed_pages"] += vacuumed
+            self.last_run = {
+                "cutoff": cutoff,
+                "archived": archived,
+                "batches": batches,
+                "vacuumed_pages": vacuumed,
+                "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                "finished_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            if archived:
+                logger.info(f"Archived {archived} audit logs older than {cutoff} in {batches} batches")
+            return self.last_run
+        finally:
+            lock.release()
+
+    async def _archive_batch(self, rows: List[Any]):
+        by_day: Dict[str, List[Any]] = defaultdict(list)
+        for row in rows:
+            by_day[row['created_at'][:10]].append(row)
+        await asyncio.to_thread(_append_archives, by_day, self.archive_dir)
+
+        ids = [row['id'] for row in rows]
+        async with write_connection() as db:
+            await db.execute(f"DELETE FROM audit_logs WHERE id IN ({', '.join('?' for _ in ids)})", ids)
+            await db.executemany("""
+                INSERT INTO audit_archives (day, path, row_count, min_id, max_id)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(day) DO UPDATE SET
+                    row_count = row_count + excluded.row_count,
+                    min_id = MIN(min_id, excluded.min_id),
+                    max_id = MAX(max_id, excluded.max_id),
+                    updated_at = CURRENT_TIMESTAMP
+            """, [
+                (day, archive_path(day, self.archive_dir), len(day_rows),
+                 min(r['id'] for r in day_rows), max(r['id'] for r in day_rows))
+                for day, day_rows in by_day.items()
+            ])
+
+    async def incremental_vacuum(self) -> int:
+        """Return up to vacuum_pages free pages to the filesystem; needs auto_vacuum=INCREMENTAL"""
+        async with write_connection() as db:
+            mode = (await (await db.execute("PRAGMA auto_vacuum")).fetchone())[0]
+            if mode != 2:
+                logger.info("auto_vacuum is not INCREMENTAL; run python -m app.retention --enable-incremental-vacuum to reclaim space")
+                return 0
+            before = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+            # execute() steps the pragma once, which frees a single page; executescript runs it to completion
+            await db.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+            after = (await (await db.execute("PRAGMA freelist_count")).fetchone())[0]
+        return before - after
+
+    async def query_archive(self, since: str, until: Optional[str] = None, action: Optional[str] = None,
+                            offset: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], bool]:
+        """A page of archived rows with since <= created_at < until, newest first, and whether more follow
+
+        Daily files are read newest first and reading stops once the page is
+        full, so only the page and the current day's matches are held in memory.
+        """
+        until = until or datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        first_day = datetime.fromisoformat(since[:10])
+        last_day = datetime.fromisoformat(until[:10])
+        if last_day < first_day:
+            raise ValueError("until must not be before since")
+        if (last_day - first_day).days >= AUDIT_ARCHIVE_MAX_QUERY_DAYS:
+            raise ValueError(f"Archive queries are limited to {AUDIT_ARCHIVE_MAX_QUERY_DAYS} days")
+
+        async with read_connection() as db:
+            cursor = await db.execute(
+                "SELECT path FROM audit_archives WHERE day BETWEEN ? AND ? ORDER BY day DESC",
+                (since[:10], until[:10])
+            )
+            paths = [row['path'] for row in await cursor.fetchall()]
+
+        def scan() -> List[Dict[str, Any]]:
+            wanted = offset + limit + 1
+            matches: List[Dict[str, Any]] = []
+            for path in paths:
+                if not os.path.exists(path):
+                    logger.warning(f"Audit archive {path} is missing")
+                    continue
+                # Every row in a file is from that day, so sorting one day at a time orders the whole result
+                day: Dict[int, Dict[str, Any]] = {}
+                for row in read_archive(path):
+                    if not since <= row['created_at'] < until or (action and row['action'] != action):
+                        continue
+                    day.setdefault(row['id'], row)
+                matches.extend(sorted(day.values(), key=lambda row: (row['created_at'], row['id']), reverse=True))
+                if len(matches) >= wanted:
+                    break
+            return matches[offset:wanted]
+
+        rows = await asyncio.to_thread(scan)
+        return rows[:limit], len(rows) > limit
+
+    async def stats(self) -> Dict[str, Any]:
+        async with read_connection() as db:
+            cursor = await db.execute(
+                "SELECT COUNT(*) AS days, COALESCE(SUM(row_count), 0) AS rows, MIN(day) AS oldest, MAX(day) AS newest FROM audit_archives"
+            )
+            archives = dict(await cursor.fetchone())
+        return {
+            **self.counters,
+            "retention_days": self.retention_days,
+            "archive_dir": self.archive_dir,
+            "archives": archives,
+            "last_run": self.last_run,
+            "running": self.running,
+        }
+
+audit_retention = AuditRetention()
+
+async def enable_incremental_vacuum():
+    """One-off switch of an existing database to auto_vacuum=INCREMENTAL (rewrites the file)"""
+    async with write_connection() as db:
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.commit()
+        await db.execute("VACUUM")
+
+async def _main():
+    import argparse
+    from .database import init_database, close_database
+
+    parser = argparse.ArgumentParser(description="Archive audit logs past the retention horizon")
+    parser.add_argument("--days", type=int, default=AUDIT_RETENTION_DAYS)
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="convert the database to auto_vacuum=INCREMENTAL first (runs a full VACUUM)")
+    args = parser.parse_args()
+
+    await init_database()
+    if args.enable_incremental_vacuum:
+        await enable_incremental_vacuum()
+    retention = AuditRetention(retention_days=args.days, pause=0)
+    print(await retention.run_once())
+    await close_database()
+
+if __name__ == "__main__":
+    # python -m app.retention - archive old audit logs now instead of waiting for the server loop
+    asyncio.run(_main())
@@ -1,11 +1,27 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import json
 import logging
 from datetime import datetime
-from ..database import get_database
-from ..auth import verify_admin_password
+from ..database import read_connection, write_connection, get_pool
+from ..query_stats import query_stats, QUERY_STATS_ORDERS, QUERY_STATS_MAX_LIMIT
+from ..auth import verify_admin_password, token_cache
+from ..token_refresh import token_refresher
+from ..response_cache import response_cache
+from ..cache import shared_cache
+from ..webhooks import webhook_dispatcher
+from ..audit import audit_sink, make_audit_event, AuditEvent
+from ..stats import get_counters, get_action_counts, count_recent_audit_logs, rebuild_stats
+from ..pagination import decode_cursor, validate_total_mode, count_rows, page_response, PAGE_MAX_LIMIT
+from ..retention import audit_retention, RetentionInProgressError
+from ..audit_export import EXPORT_FORMATS, AUDIT_EXPORT_CHUNK_SIZE, export_slots, stream_audit_logs
+from ..serialization import FastJSONResponse, row_to_dict, APP_JSON_COLUMNS
+from ..catalog_import import CatalogImport, CATALOG_IMPORT_WORKERS, read_ndjson
+from ..app_search import search_apps, SEARCH_MAX_LIMIT
+from ..audit_search import find_audit_logs, AUDIT_SEARCH_MAX_LIMIT
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -24,127 +40,216 @@ class AppRegistration(BaseModel):
 # Admin authentication removed - features are now publicly accessible
 
 @router.get("/logs")
-async def get_audit_logs(skip: int = 0, limit: int = 100):
-    """Get audit logs for admin dashboard"""
-    db = await get_database()
-    
-    # Get logs with pagination
-    cursor = await db.execute("""
-        SELECT al.*, u.email as user_email 
-        FROM audit_logs al 
-        LEFT JOIN users u ON al.user_id = u.id 
-        ORDER BY al.created_at DESC 
-        LIMIT ? OFFSET ?
-    """, (limit, skip))
-    logs = await cursor.fetchall()
-    
-    # Get total count
-    cursor = await db.execute("SELECT COUNT(*) as count FROM audit_logs")
-    total_row = await cursor.fetchone()
-    total = total_row['count']
-    
-    return {
+async def get_audit_logs(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT),
+                         mode: str = "offset", cursor: Optional[str] = None, total: str = "exact",
+                         archived: bool = False, since: Optional[str] = None,
+                         until: Optional[str] = None, action: Optional[str] = None):
+    """Get audit logs for admin dashboard
+    
+    mode=offset (default) pages with skip/limit. mode=cursor, or passing the
+    returned next_cursor, uses keyset pagination with constant cost at any depth.
+    total=exact|approximate|none controls how the total count is computed.
+    archived=true reads rows moved out by audit retention for since/until instead,
+    with next_skip in place of a total.
+    """
+    validate_total_mode(total)
+    
+    if archived:
+        if not since:
+            raise HTTPException(status_code=400, detail="since is required for archived queries")
+        try:
+            logs, more = await audit_retention.query_archive(since, until, action, skip, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {
+            "logs": logs,
+            "skip": skip,
+            "limit": limit,
+            "next_skip": skip + limit if more else None,
+            "source": "archive"
+        }
+    
+    if cursor is not None or mode == "cursor":
+        async with read_connection() as db:
+            if cursor:
+                created_at, last_id = decode_cursor(cursor)
+                rows = await (await db.execute("""
+                    SELECT al.*, u.email as user_email 
+                    FROM audit_logs al 
+                    LEFT JOIN users u ON al.user_id = u.id 
+                    WHERE (al.created_at, al.id) < (?, ?)
+                    ORDER BY al.created_at DESC, al.id DESC 
+                    LIMIT ?
+                """, (created_at, last_id, limit + 1))).fetchall()
+            else:
+                rows = await (await db.execute("""
+                    SELECT al.*, u.email as user_email 
+                    FROM audit_logs al 
+                    LEFT JOIN users u ON al.user_id = u.id 
+                    ORDER BY al.created_at DESC, al.id DESC 
+                    LIMIT ?
+                """, (limit + 1,))).fetchall()
+            count = await count_rows(db, "audit_logs", total)
+        
+        return FastJSONResponse(page_response("logs", [dict(log) for log in rows[:limit]], limit, rows, count))
+    
+    async with read_connection() as db:
+        # Get logs with pagination
+        db_cursor = await db.execute("""
+            SELECT al.*, u.email as user_email 
+            FROM audit_logs al 
+            LEFT JOIN users u ON al.user_id = u.id 
+            ORDER BY al.created_at DESC 
+            LIMIT ? OFFSET ?
+        """, (limit, skip))
+        logs = await db_cursor.fetchall()
+        
+        # Get total count
+        count = await count_rows(db, "audit_logs", total)
+    
+    return FastJSONResponse({
         "logs": [dict(log) for log in logs],
-        "total": total,
+        "total": count,
         "skip": skip,
         "limit": limit
-    }
+    })
+
+@router.get("/logs/search")
+async def search_audit_logs(q: Optional[str] = None, action: Optional[str] = None,
+                            user_id: Optional[int] = None, user_email: Optional[str] = None,
+                            resource: Optional[str] = None, ip: Optional[str] = None,
+                            since: Optional[str] = None, until: Optional[str] = None,
+                            cursor: Optional[str] = None,
+                            limit: int = Query(100, ge=1, le=AUDIT_SEARCH_MAX_LIMIT)):
+    """Search audit logs with composable filters, newest first
+    
+    Filters combine with AND: action takes a comma separated list, resource and ip
+    match exactly, since/until bound created_at (inclusive/exclusive), and q
+    matches words in resource and details (a trailing * for a prefix). Pages are keyset pages;
+    pass the returned next_cursor with the same filters for the next one. A search for
+    common words may return a short page before the end; next_cursor continues it.
+    """
+    actions = [a.strip() for a in action.split(",") if a.strip()] if action else None
+    async with read_connection() as db:
+        rows, next_cursor = await find_audit_logs(db, q, cursor, limit, actions=actions, user_id=user_id,
+                                                  user_email=user_email, resource=resource, ip=ip,
+                                                  since=since, until=until)
+    
+    return FastJSONResponse({"logs": [dict(log) for log in rows[:limit]], "limit": limit, "next_cursor": next_cursor})
+
+@router.get("/logs/export")
+async def export_audit_logs(request: Request, format: str = "ndjson", since: Optional[str] = None,
+                            until: Optional[str] = None, action: Optional[str] = None,
+                            chunk_size: int = AUDIT_EXPORT_CHUNK_SIZE):
+    """Stream audit logs as NDJSON or CSV
+    
+    since/until bound created_at (inclusive/exclusive), action takes a comma separated
+    list. Rows are read and sent chunk_size at a time so memory stays flat for any range.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if not 1 <= chunk_size <= 10000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 10000")
+    # Taken here rather than in the stream so a full house is a 429, not a queued export. The
+    # stream returns the slot when it ends, and the background task if the stream never started
+    release_slot = export_slots.try_acquire()
+    if release_slot is None:
+        raise HTTPException(status_code=429, detail="Too many exports in progress, try again later")
+    
+    actions = [a.strip() for a in action.split(",") if a.strip()] if action else None
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    
+    try:
+        await log_audit_event(
+            "audit_export",
+            "audit_logs",
+            json.dumps({"format": format, "since": since, "until": until, "action": actions}),
+            request
+        )
+    except BaseException:
+        release_slot()
+        raise
+    
+    return StreamingResponse(
+        stream_audit_logs(format, since, until, actions, chunk_size, release_slot),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(release_slot)
+    )
+
+@router.get("/logs/retention")
+async def get_retention_stats():
+    """Get audit retention counters and archive coverage"""
+    return await audit_retention.stats()
+
+@router.post("/logs/retention/run")
+async def run_retention():
+    """Archive audit logs past the retention horizon now"""
+    if not audit_retention.enabled:
+        raise HTTPException(status_code=400, detail="Audit retention is disabled (AUDIT_RETENTION_DAYS=0)")
+    try:
+        return await audit_retention.run_once()
+    except RetentionInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 @router.get("/logs/stats")
 async def get_log_stats():
     """Get log statistics for admin dashboard"""
-    db = await get_database()
-    
     stats = {}
     
-    # Total logs
-    cursor = await db.execute("SELECT COUNT(*) as count FROM audit_logs")
-    row = await cursor.fetchone()
-    stats['total_logs'] = row['count']
-    
-    # Logs by event type
-    cursor = await db.execute("""
-        SELECT action, COUNT(*) as count 
-        FROM audit_logs 
-        GROUP BY action 
-        ORDER BY count DESC
-    """)
-    rows = await cursor.fetchall()
-    stats['by_event_type'] = [dict(row) for row in rows]
-    
-    # Recent logs (last 24 hours)
-    cursor = await db.execute("""
-        SELECT COUNT(*) as count FROM audit_logs 
-        WHERE created_at > datetime('now', '-1 day')
-    """)
-    row = await cursor.fetchone()
-    stats['recent_logs_24h'] = row['count']
-    
-    # Recent logs (last 7 days)
-    cursor = await db.execute("""
-        SELECT COUNT(*) as count FROM audit_logs 
-        WHERE created_at > datetime('now', '-7 days')
-    """)
-    row = await cursor.fetchone()
-    stats['recent_logs_7d'] = row['count']
+    # Served from trigger-maintained rollups rather than COUNT(*) scans
+    async with read_connection() as db:
+        counters = await get_counters(db)
+        stats['total_logs'] = counters.get('total_audit_logs', 0)
+        stats['by_event_type'] = await get_action_counts(db)
+        stats['recent_logs_24h'] = await count_recent_audit_logs(db, '-1 day')
+        stats['recent_logs_7d'] = await count_recent_audit_logs(db, '-7 days')
     
     return stats
 
 @router.get("/stats")
 async def get_admin_stats():
     """Get dashboard statistics"""
-    db = await get_database()
-    
     # Get various stats
     stats = {}
     
-    # Total users
-    cursor = await db.execute("SELECT COUNT(*) as count FROM users")
-    row = await cursor.fetchone()
-    stats['total_users'] = row['count']
-    
-    # Total connections
-    cursor = await db.execute("SELECT COUNT(*) as count FROM connections WHERE status = 'active'")
-    row = await cursor.fetchone()
-    stats['active_connections'] = row['count']
-    
-    # Total internal apps
-    cursor = await db.execute("SELECT COUNT(*) as count FROM internal_apps WHERE status = 'active'")
-    row = await cursor.fetchone()
-    stats['internal_apps'] = row['count']
-    
-    # Recent activity (last 24 hours)
-    cursor = await db.execute("""
-        SELECT COUNT(*) as count FROM audit_logs 
-        WHERE created_at > datetime('now', '-1 day')
-    """)
-    row = await cursor.fetchone()
-    stats['recent_activity'] = row['count']
+    async with read_connection() as db:
+        counters = await get_counters(db)
+        stats['total_users'] = counters.get('total_users', 0)
+        stats['active_connections'] = counters.get('active_connections', 0)
+        stats['internal_apps'] = counters.get('active_internal_apps', 0)
+        
+        # Recent activity (last 24 hours)
+        stats['recent_activity'] = await count_recent_audit_logs(db, '-1 day')
     
     return stats
 
+@router.post("/stats/rebuild")
+async def rebuild_admin_stats():
+    """Recompute dashboard counters from the base tables to reconcile drift"""
+    async with write_connection() as db:
+        return await rebuild_stats(db)
+
 @router.post("/register-app")
 async def register_app(app_data: AppRegistration, request: Request):
     """Register a new internal application"""
-    db = await get_database()
-    
     try:
-        await db.execute("""
-            INSERT INTO internal_apps (name, display_name, description, logo_url, api_endpoints, manifest_data)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            app_data.name,
-            app_data.display_name,
-            app_data.description,
-            app_data.logo_url,
-            json.dumps(app_data.api_endpoints),
-            json.dumps(app_data.manifest_data)
-        ))
-        await db.commit()
+        async with write_connection() as db:
+            await db.execute("""
+                INSERT INTO internal_apps (name, display_name, description, logo_url, api_endpoints, manifest_data)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                app_data.name,
+                app_data.display_name,
+                app_data.description,
+                app_data.logo_url,
+                json.dumps(app_data.api_endpoints),
+                json.dumps(app_data.manifest_data)
+            ))
         
         # Log the registration
         await log_audit_event(
-            db=db,
             action="app_registered",
             resource=f"internal_app:{app_data.name}",
             details=f"Registered new app: {app_data.display_name}",
@@ -157,39 +262,169 @@ async def register_app(app_data: AppRegistration, request: Request):
         logger.error(f"Failed to register app: {e}")
         raise HTTPException(status_code=500, detail="Failed to register application")
 
+@router.get("/apps/search")
+async def search_internal_apps(q: str = "", capability: Optional[str] = None, status: Optional[str] = None,
+                               limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT), offset: int = Query(0, ge=0),
+                               count: bool = False):
+    """Full-text search of the app catalog, best matches first
+    
+    Every word of q matches as a prefix of a word in the name, display name,
+    description or manifest capabilities. capability and status filter the
+    matches; offset/limit page through them and count=true adds the total.
+    """
+    async with read_connection() as db:
+        rows, more, total = await search_apps(db, q, capability, status, limit, offset, count)
+    
+    body = {
+        "apps": [row_to_dict(row, APP_JSON_COLUMNS) for row in rows],
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if more else None,
+    }
+    if total is not None:
+        body["total"] = total
+    return FastJSONResponse(body)
+
+@router.post("/apps/import")
+async def import_apps(request: Request, workers: int = Query(CATALOG_IMPORT_WORKERS, ge=0)):
+    """Bulk register or update internal apps from an NDJSON body of PCARP manifests
+    
+    Each line is a bare manifest or a register-app body. The body is streamed
+    through validation and written in chunks; the report lists inserted,
+    updated and rejected manifests and the import throughput. workers=0
+    validates inline; more than CATALOG_IMPORT_WORKERS processes are never started.
+    """
+    def audit_event(action: str, resource: str, details: str):
+        return request_audit_event(action, resource, details, request)
+    
+    try:
+        importer = CatalogImport(workers=min(workers, CATALOG_IMPORT_WORKERS), audit_event=audit_event)
+        report = await importer.run(read_ndjson(request.stream()))
+    except Exception as e:
+        logger.error(f"Catalog import failed: {e}")
+        raise HTTPException(status_code=500, detail="Catalog import failed")
+    
+    await log_audit_event(
+        action="catalog_imported",
+        resource="internal_apps",
+        details=f"Imported {report['total']} manifests: {report['counts']}",
+        request=request
+    )
+    return FastJSONResponse(report)
+
 @router.get("/apps")
 async def get_internal_apps():
     """Get all internal applications for admin management - deduplicated"""
-    db = await get_database()
-    cursor = await db.execute("""
-        SELECT * FROM internal_apps 
-        WHERE id IN (
-            SELECT MIN(id) FROM internal_apps 
-            GROUP BY name, display_name
-        )
-        ORDER BY display_name
-    """)
-    rows = await cursor.fetchall()
-    
-    apps = []
-    for row in rows:
-        app = dict(row)
-        # Parse JSON fields
-        if app['api_endpoints']:
-            app['api_endpoints'] = json.loads(app['api_endpoints'])
-        if app['manifest_data']:
-            app['manifest_data'] = json.loads(app['manifest_data'])
-        apps.append(app)
-    
-    return {"apps": apps}
-
-async def log_audit_event(db, action: str, resource: str = None, details: str = None, request: Request = None, user_id: int = None):
-    """Helper function to log audit events"""
-    ip_address = request.client.host if request else None
-    user_agent = request.headers.get("user-agent") if request else None
+    async with read_connection() as db:
+        cursor = await db.execute("""
+            SELECT * FROM internal_apps 
+            WHERE id IN (
+                SELECT MIN(id) FROM internal_apps 
+                GROUP BY name, display_name
+            )
+            ORDER BY display_name
+        """)
+        rows = await cursor.fetchall()
     
-    await db.execute("""
-        INSERT INTO audit_logs (user_id, action, resource, details, ip_address, user_agent)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (user_id, action, resource, details, ip_address, user_agent))
-    await db.commit()
\ No newline at end of file
+    apps = [row_to_dict(row, APP_JSON_COLUMNS) for row in rows]
+    
+    return FastJSONResponse({"apps": apps})
+
+@router.get("/db/pool")
+async def get_pool_stats():
+    """Get database connection pool usage and wait times"""
+    pool = await get_pool()
+    return pool.stats()
+
+@router.get("/db/queries")
+async def get_query_stats(limit: int = Query(20, ge=1, le=QUERY_STATS_MAX_LIMIT), order: str = "total",
+                          explain: bool = False):
+    """Get this worker's most expensive SQL statements with their query plans
+    
+    order=total|max|mean|calls. Plans are captured when a statement first runs
+    slower than SLOW_QUERY_MS; explain=true also captures them for listed
+    statements that have not been slow yet.
+    """
+    if order not in QUERY_STATS_ORDERS:
+        raise HTTPException(status_code=400, detail=f"order must be one of: {', '.join(QUERY_STATS_ORDERS)}")
+    queries = query_stats.top(limit, order)
+    if explain:
+        async with read_connection() as db:
+            await query_stats.capture_plans(db, [query['statement'] for query in queries])
+        queries = query_stats.top(limit, order)
+    return {**query_stats.stats(), "order": order, "queries": queries}
+
+@router.post("/db/queries/reset")
+async def reset_query_stats():
+    """Clear this worker's statement timings"""
+    query_stats.reset()
+    return {"success": True}
+
+@router.get("/audit/stats")
+async def get_audit_sink_stats():
+    """Get audit writer queue depth and flushed/dropped counters"""
+    return audit_sink.stats()
+
+@router.get("/auth/token-cache")
+async def get_token_cache_stats():
+    """Get verified-token cache hit/miss counters"""
+    return token_cache.stats()
+
+@router.get("/tokens/refresh")
+async def get_token_refresh_stats():
+    """Get background token refresh scheduler state"""
+    return token_refresher.stats()
+
+@router.get("/cache/responses")
+async def get_response_cache_stats():
+    """Get provider data response cache counters"""
+    return response_cache.stats()
+
+@router.get("/cache/shared")
+async def get_shared_cache_stats():
+    """Get shared cache backend counters"""
+    return await shared_cache.stats()
+
+@router.get("/webhooks/stats")
+async def get_webhook_stats():
+    """Get webhook outbox depth, delivery counters and latency"""
+    return await webhook_dispatcher.stats()
+
+@router.get("/webhooks/dead")
+async def get_dead_webhooks(app_id: Optional[int] = None, limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT)):
+    """List dead-lettered webhook events"""
+    async with read_connection() as db:
+        cursor = await db.execute("""
+            SELECT id, app_id, url, event_type, payload, attempts, last_error, enqueued_at
+            FROM webhook_outbox
+            WHERE status = 'dead' AND (? IS NULL OR app_id = ?)
+            ORDER BY id DESC
+            LIMIT ?
+        """, (app_id, app_id, limit))
+        events = [dict(row) for row in await cursor.fetchall()]
+    for event in events:
+        event['payload'] = json.loads(event['payload'])
+    return {"events": events}
+
+@router.post("/webhooks/dead/retry")
+async def retry_dead_webhooks(request: Request, app_id: Optional[int] = None):
+    """Requeue dead-lettered webhook events"""
+    count = await webhook_dispatcher.retry_dead(app_id)
+    await log_audit_event(
+        "webhooks_retried",
+        f"app:{app_id}" if app_id else "webhooks",
+        f"Requeued {count} dead webhook events",
+        request
+    )
+    return {"requeued": count}
+
+def request_audit_event(action: str, resource: str = None, details: str = None, request: Request = None,
+                        user_id: int = None) -> AuditEvent:
+    """Audit row for an event caused by request, with its client address and user agent"""
+    ip_address = request.client.host if request and request.client else None
+    user_agent = request.headers.get("user-agent") if request else None
+    return make_audit_event(action, resource, details, ip_address, user_agent, user_id)
+
+async def log_audit_event(action: str, resource: str = None, details: str = None, request: Request = None, user_id: int = None):
+    """Helper function to log audit events - queued and group-committed by the audit sink"""
+    await audit_sink.submit(request_audit_event(action, resource, details, request, user_id))
\ No newline at end of file
@@ -1,99 +1,175 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from typing import Dict, Any
 import json
 import httpx
 import logging
-from ..database import get_database
+import time
 from ..auth import verify_token
+from ..registry import provider_registry
+from ..connection_cache import get_active_connection, get_access_token
+from ..http_client import get_http_client
+from ..google import GoogleClient, ProviderError, Page, SERVICE_PATHS, oauth_configured
+from ..token_refresh import token_refresher, parse_db_timestamp
+from ..response_cache import response_cache, make_cache_key
+from ..sync import sync_engine, load_targets, get_checkpoint, reset_checkpoint, get_job, SyncInProgressError
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Served (and synced) when no real Google credentials are configured
+MOCK_DATA = {
+    "gmail": {
+        "messages": [
+            {"id": "1", "subject": "Welcome to Auth Hub", "sender": "admin@company.com", "date": "2025-07-22"},
+            {"id": "2", "subject": "Integration Complete", "sender": "noreply@google.com", "date": "2025-07-22"}
+        ],
+        "total": 2
+    },
+    "calendar": {
+        "events": [
+            {"id": "1", "title": "Team Meeting", "start": "2025-07-22T10:00:00Z", "end": "2025-07-22T11:00:00Z"},
+            {"id": "2", "title": "Project Review", "start": "2025-07-22T14:00:00Z", "end": "2025-07-22T15:00:00Z"}
+        ],
+        "total": 2
+    }
+}
+
 @router.get("/data/{provider}/{service}")
-async def fetch_data(provider: str, service: str, current_user = Depends(verify_token)):
+async def fetch_data(provider: str, service: str, request: Request, current_user = Depends(verify_token),
+                     http: httpx.AsyncClient = Depends(get_http_client)):
     """Fetch data from external provider service"""
-    db = await get_database()
+    user_id = current_user['user_id']
+    key = make_cache_key(user_id, provider, service, dict(request.query_params))
     
     try:
-        # Get user's connection for this provider
-        cursor = await db.execute("""
-            SELECT c.* FROM connections c
-            LEFT JOIN providers p ON c.provider_id = p.id
-            WHERE c.user_id = ? AND p.name = ? AND c.status = 'active'
-            LIMIT 1
-        """, (current_user['user_id'], provider))
-        connection = await cursor.fetchone()
-        
-        if not connection:
-            raise HTTPException(status_code=404, detail=f"No active connection found for {provider}")
+        # Identical concurrent requests share one upstream fetch; repeats within the TTL are served from memory
+        cached, state = await response_cache.get_or_load(
+            key, lambda: load_provider_data(provider, service, user_id, http)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Data fetch error: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch data")
+    
+    return cached.response(request, headers={"X-Cache": state, "Cache-Control": "private, no-cache"})
+
+async def load_provider_data(provider: str, service: str, user_id: str, http: httpx.AsyncClient) -> Dict[str, Any]:
+    """Look up the user's connection and build the provider payload"""
+    # Get user's connection for this provider
+    provider_row = await provider_registry.get_by_name(provider)
+    connection = await get_active_connection(user_id, provider_row.id) if provider_row else None
+    
+    if not connection:
+        raise HTTPException(status_code=404, detail=f"No active connection found for {provider}")
+    
+    if provider == "google" and oauth_configured():
+        if service not in SERVICE_PATHS:
+            raise HTTPException(status_code=400, detail=f"Unsupported service: {service}")
         
-        # Mock data response based on service type
-        if provider == "google":
-            if service == "gmail":
-                mock_data = {
-                    "messages": [
-                        {"id": "1", "subject": "Welcome to Auth Hub", "sender": "admin@company.com", "date": "2025-07-22"},
-                        {"id": "2", "subject": "Integration Complete", "sender": "noreply@google.com", "date": "2025-07-22"}
-                    ],
-                    "total": 2
-                }
-            elif service == "calendar":
-                mock_data = {
-                    "events": [
-                        {"id": "1", "title": "Team Meeting", "start": "2025-07-22T10:00:00Z", "end": "2025-07-22T11:00:00Z"},
-                        {"id": "2", "title": "Project Review", "start": "2025-07-22T14:00:00Z", "end": "2025-07-22T15:00:00Z"}
-                    ],
-                    "total": 2
-                }
+        # Live data over the shared pooled client
+        try:
+            if connection['expires_at'] and parse_db_timestamp(connection['expires_at']) <= time.time():
+                # The background scheduler missed this one; refresh inline (single-flight)
+                access_token = (await token_refresher.refresh(connection['id']))['access_token']
             else:
-                raise HTTPException(status_code=400, detail=f"Unsupported service: {service}")
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported provider: {provider}")
-        
+                access_token = await get_access_token(connection['id'])
+            data = await GoogleClient(http, provider_row).fetch(service, access_token)
+        except ProviderError as e:
+            logger.error(f"Provider fetch error: {e}")
+            raise HTTPException(status_code=502, detail=f"Failed to fetch data from {provider}")
         return {
             "success": True,
             "provider": provider,
             "service": service,
-            "data": mock_data
+            "data": data
         }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Data fetch error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch data")
+    
+    # Mock data response based on service type
+    if provider != "google":
+        raise HTTPException(status_code=400, detail=f"Unsupported provider: {provider}")
+    if service not in MOCK_DATA:
+        raise HTTPException(status_code=400, detail=f"Unsupported service: {service}")
+    
+    return {
+        "success": True,
+        "provider": provider,
+        "service": service,
+        "data": MOCK_DATA[service]
+    }
 
 @router.post("/data/{provider}/{service}")
-async def sync_data(provider: str, service: str, sync_config: Dict[str, Any], current_user = Depends(verify_token)):
-    """Sync data to internal applications"""
-    db = await get_database()
+async def sync_data(provider: str, service: str, sync_config: Dict[str, Any], current_user = Depends(verify_token),
+                    http: httpx.AsyncClient = Depends(get_http_client)):
+    """Sync data to internal applications
     
+    Pulls only what changed since the connection's last checkpoint and pushes it in
+    batches to every internal app mapped to the service. sync_config.full=true
+    discards the checkpoint and re-lists everything.
+    """
+    user_id = current_user['user_id']
     try:
         # Get user's connection for this provider
-        cursor = await db.execute("""
-            SELECT c.* FROM connections c
-            LEFT JOIN providers p ON c.provider_id = p.id
-            WHERE c.user_id = ? AND p.name = ? AND c.status = 'active'
-            LIMIT 1
-        """, (current_user['user_id'], provider))
-        connection = await cursor.fetchone()
+        provider_row = await provider_registry.get_by_name(provider)
+        connection = await get_active_connection(user_id, provider_row.id) if provider_row else None
         
         if not connection:
             raise HTTPException(status_code=404, detail=f"No active connection found for {provider}")
+        if provider != "google" or service not in SERVICE_PATHS:
+            raise HTTPException(status_code=400, detail=f"Unsupported service: {provider}/{service}")
+        running = sync_engine.running_job(connection['id'], service)
+        if running:
+            raise HTTPException(status_code=409, detail=f"Sync job {running} is already running")
         
-        # Mock sync operation
-        logger.info(f"Syncing {provider}/{service} data with config: {sync_config}")
+        targets = await load_targets(user_id, service)
+        if not targets:
+            raise HTTPException(status_code=400, detail=f"No internal apps are mapped to {service}")
+        
+        if sync_config.get("full"):
+            await reset_checkpoint(connection['id'], service)
+        checkpoint = await get_checkpoint(connection['id'], service) or {}
+        
+        if oauth_configured():
+            if connection['expires_at'] and parse_db_timestamp(connection['expires_at']) <= time.time():
+                access_token = (await token_refresher.refresh(connection['id']))['access_token']
+            else:
+                access_token = await get_access_token(connection['id'])
+            pages = GoogleClient(http, provider_row).pages(
+                service, access_token, checkpoint.get('page_token'), checkpoint.get('delta_token')
+            )
+        else:
+            pages = mock_pages(service, checkpoint)
+        
+        result = await sync_engine.run(http, user_id, provider, service, connection['id'], pages, targets)
+        logger.info(f"Sync job {result['job_id']} {provider}/{service}: {result['records']} records, "
+                    f"{result['records_per_second']} records/s")
         
         return {
-            "success": True,
+            "success": result['status'] == "completed",
             "provider": provider,
             "service": service,
-            "synced_records": 5,
-            "sync_timestamp": "2025-07-22T08:30:00Z"
+            "synced_records": result['records'],
+            "sync_timestamp": result['started_at'],
+            "job": result
         }
         
     except HTTPException:
         raise
+    except SyncInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Data sync error: {e}")
-        raise HTTPException(status_code=500, detail="Failed to sync data")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to sync data")
+
+async def mock_pages(service: str, checkpoint: Dict[str, Any]):
+    """Mock provider stream: everything on the first sync, no changes afterwards"""
+    items = [] if checkpoint.get('delta_token') else MOCK_DATA[service]["messages" if service == "gmail" else "events"]
+    yield Page(items, None, "mock")
+
+@router.get("/sync/jobs/{job_id}")
+async def get_sync_job(job_id: str, current_user = Depends(verify_token)):
+    """Get the stats of a sync job"""
+    job = await get_job(job_id)
+    if not job or str(job['user_id']) != str(current_user['user_id']):
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return {"job": job}
@@ -5,9 +5,14 @@ import httpx
 import logging
 import secrets
 import urllib.parse
-from ..database import get_database
+from ..database import read_connection, write_connection
 from ..auth import create_access_token, verify_token
 from ..routes.admin import log_audit_event
+from ..webhooks import notify_apps
+from ..connection_cache import invalidate_connection
+from ..registry import provider_registry
+from ..http_client import get_http_client
+from ..google import GoogleClient, oauth_configured
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -49,47 +54,81 @@ async def initiate_google_auth():
     }
 
 @router.post("/google/callback")
-async def google_oauth_callback(auth_data: GoogleAuthCode, request: Request):
+async def google_oauth_callback(auth_data: GoogleAuthCode, request: Request,
+                                http: httpx.AsyncClient = Depends(get_http_client)):
     """Handle Google OAuth callback"""
-    db = await get_database()
-    
     try:
         # Get Google OAuth config
-        cursor = await db.execute("SELECT oauth_config FROM providers WHERE name = 'google'")
-        provider_row = await cursor.fetchone()
+        google = await provider_registry.get_by_name('google')
         
-        if not provider_row:
+        if not google:
             raise HTTPException(status_code=500, detail="Google provider not configured")
         
-        # TODO: Exchange code for tokens with Google
-        # For now, mock the response
         logger.info(f"Received OAuth code: {auth_data.code}")
         
-        # Mock user data - in production, get this from Google API
-        mock_user = {
-            "id": "google_123456",
-            "email": "user@example.com",
-            "name": "Test User"
-        }
-        
-        # Create or update user
-        await db.execute("""
-            INSERT OR REPLACE INTO users (email, name, updated_at)
-            VALUES (?, ?, CURRENT_TIMESTAMP)
-        """, (mock_user['email'], mock_user['name']))
-        await db.commit()
-        
-        # Get user ID
-        cursor = await db.execute("SELECT id FROM users WHERE email = ?", (mock_user['email'],))
-        user_row = await cursor.fetchone()
-        user_id = user_row['id']
+        tokens = None
+        if oauth_configured():
+            # Exchange code for tokens with Google over the shared client
+            google_client = GoogleClient(http, google)
+            tokens = await google_client.exchange_code(auth_data.code)
+            profile = await google_client.get_userinfo(tokens['access_token'])
+            oauth_user = {
+                "id": profile['sub'],
+                "email": profile['email'],
+                "name": profile.get('name') or profile['email'],
+                "avatar_url": profile.get('picture')
+            }
+        else:
+            # Mock user data - set GOOGLE_CLIENT_ID/GOOGLE_CLIENT_SECRET for the real exchange
+            oauth_user = {
+                "id": "google_123456",
+                "email": "user@example.com",
+                "name": "Test User",
+                "avatar_url": None
+            }
         
-        # Create access token
-        access_token = create_access_token(data={"sub": str(user_id)})
+        async with write_connection() as db:
+            # Create or update user, keeping the id stable so existing connections stay attached
+            await db.execute("""
+                INSERT INTO users (email, name, avatar_url, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(email) DO UPDATE SET
+                    name = excluded.name,
+                    avatar_url = COALESCE(excluded.avatar_url, users.avatar_url),
+                    updated_at = CURRENT_TIMESTAMP
+            """, (oauth_user['email'], oauth_user['name'], oauth_user['avatar_url']))
+            
+            # Get user ID
+            cursor = await db.execute("SELECT id FROM users WHERE email = ?", (oauth_user['email'],))
+            user_row = await cursor.fetchone()
+            user_id = user_row['id']
+            
+            if tokens:
+                # Store the Google connection
+                await db.execute("""
+                    INSERT INTO connections (user_id, provider_id, external_id, access_token, refresh_token,
+                                             expires_at, scopes, status, updated_at)
+                    VALUES (?, ?, ?, ?, ?, datetime('now', ?), ?, 'active', CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id, provider_id, external_id) DO UPDATE SET
+                        access_token = excluded.access_token,
+                        refresh_token = COALESCE(excluded.refresh_token, connections.refresh_token),
+                        expires_at = excluded.expires_at,
+                        scopes = excluded.scopes,
+                        status = 'active',
+                        updated_at = CURRENT_TIMESTAMP
+                """, (
+                    user_id,
+                    google.id,
+                    oauth_user['id'],
+                    tokens['access_token'],
+                    tokens.get('refresh_token'),
+                    f"+{int(tokens.get('expires_in', 3600))} seconds",
+                    ','.join(tokens.get('scope', '').split()) or ','.join(google.scopes)
+                ))
+                await notify_apps(db, "connection.authorized", {"user_id": user_id, "provider": "google"})
         
         # Log authentication
         await log_audit_event(
-            db=db,
             action="user_authenticated",
             resource=f"user:{user_id}",
             details=f"User authenticated via Google OAuth",
@@ -97,6 +136,12 @@ async def google_oauth_callback(auth_data: GoogleAuthCode, request: Request):
             user_id=user_id
         )
         
+        if tokens:
+            await invalidate_connection(user_id, google.id)
+        
+        # Create access token
+        access_token = create_access_token(data={"sub": str(user_id)})
+        
         return TokenResponse(access_token=access_token)
         
     except Exception as e:
@@ -106,12 +151,12 @@ async def google_oauth_callback(auth_data: GoogleAuthCode, request: Request):
 @router.get("/me")
 async def get_current_user(current_user = Depends(verify_token)):
     """Get current authenticated user"""
-    db = await get_database()
-    cursor = await db.execute(
-        "SELECT id, email, name, avatar_url, created_at FROM users WHERE id = ?",
-        (current_user['user_id'],)
-    )
-    row = await cursor.fetchone()
+    async with read_connection() as db:
+        cursor = await db.execute(
+            "SELECT id, email, name, avatar_url, created_at FROM users WHERE id = ?",
+            (current_user['user_id'],)
+        )
+        row = await cursor.fetchone()
     
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
@@ -121,11 +166,8 @@ async def get_current_user(current_user = Depends(verify_token)):
 @router.post("/logout")
 async def logout(request: Request, current_user = Depends(verify_token)):
     """Log out user"""
-    db = await get_database()
-    
     # Log logout
     await log_audit_event(
-        db=db,
         action="user_logout",
         resource=f"user:{current_user['user_id']}",
         details="User logged out",
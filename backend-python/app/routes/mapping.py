@@ -1,15 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import json
+import os
 import logging
 from datetime import datetime
-from ..database import get_database
-from ..routes.admin import log_audit_event
+from ..database import read_connection, write_connection
+from ..routes.admin import log_audit_event, request_audit_event
+from ..audit import INSERT_AUDIT_SQL
+from ..webhooks import notify_apps, notify_apps_many
+from ..pagination import decode_cursor, validate_total_mode, count_rows, page_response, PAGE_MAX_LIMIT
+from ..serialization import FastJSONResponse, row_to_dict, APP_JSON_COLUMNS
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+MAPPING_BULK_MAX_ITEMS = int(os.getenv("MAPPING_BULK_MAX_ITEMS", "5000"))
+
 class MappingCreate(BaseModel):
     external_service: str
     internal_app_id: int
@@ -19,28 +26,32 @@ class MappingUpdate(BaseModel):
     mapping_config: Optional[Dict[str, Any]] = None
     status: Optional[str] = None
 
+class MappingBulkUpdateItem(MappingUpdate):
+    id: int
+
+class MappingBulkCreate(BaseModel):
+    mappings: List[MappingCreate]
+
+class MappingBulkUpdate(BaseModel):
+    mappings: List[MappingBulkUpdateItem]
+
+class MappingBulkDelete(BaseModel):
+    ids: List[int]
+
 @router.get("/internal-apps")
 async def get_internal_apps():
     """Get all active internal applications for mapping"""
-    db = await get_database()
-    cursor = await db.execute("""
-        SELECT * FROM internal_apps 
-        WHERE status = 'active' 
-        ORDER BY display_name
-    """)
-    rows = await cursor.fetchall()
+    async with read_connection() as db:
+        cursor = await db.execute("""
+            SELECT * FROM internal_apps 
+            WHERE status = 'active' 
+            ORDER BY display_name
+        """)
+        rows = await cursor.fetchall()
     
-    apps = []
-    for row in rows:
-        app = dict(row)
-        # Parse JSON fields
-        if app['api_endpoints']:
-            app['api_endpoints'] = json.loads(app['api_endpoints'])
-        if app['manifest_data']:
-            app['manifest_data'] = json.loads(app['manifest_data'])
-        apps.append(app)
+    apps = [row_to_dict(row, APP_JSON_COLUMNS) for row in rows]
     
-    return {"internal_apps": apps}
+    return FastJSONResponse({"internal_apps": apps})
 
 @router.get("/external-services")
 async def get_external_services():
@@ -72,33 +83,35 @@ async def get_external_services():
 @router.post("/create")
 async def create_mapping(mapping: MappingCreate, request: Request):
     """Create a new app-to-app mapping"""
-    db = await get_database()
-    
     try:
-        # Check if internal app exists
-        cursor = await db.execute(
-            "SELECT id, display_name FROM internal_apps WHERE id = ? AND status = 'active'",
-            (mapping.internal_app_id,)
-        )
-        app_row = await cursor.fetchone()
-        
-        if not app_row:
-            raise HTTPException(status_code=404, detail="Internal application not found")
-        
-        # Create the mapping
-        await db.execute("""
-            INSERT INTO app_mappings (external_service, internal_app_id, mapping_config, status)
-            VALUES (?, ?, ?, 'active')
-        """, (
-            mapping.external_service,
-            mapping.internal_app_id,
-            json.dumps(mapping.mapping_config) if mapping.mapping_config else None
-        ))
-        await db.commit()
+        async with write_connection() as db:
+            # Check if internal app exists
+            cursor = await db.execute(
+                "SELECT id, display_name FROM internal_apps WHERE id = ? AND status = 'active'",
+                (mapping.internal_app_id,)
+            )
+            app_row = await cursor.fetchone()
+            
+            if not app_row:
+                raise HTTPException(status_code=404, detail="Internal application not found")
+            
+            # Create the mapping
+            cursor = await db.execute("""
+                INSERT INTO app_mappings (external_service, internal_app_id, mapping_config, status)
+                VALUES (?, ?, ?, 'active')
+            """, (
+                mapping.external_service,
+                mapping.internal_app_id,
+                json.dumps(mapping.mapping_config) if mapping.mapping_config else None
+            ))
+            await notify_apps(db, "mapping.created", {
+                "mapping_id": cursor.lastrowid,
+                "external_service": mapping.external_service,
+                "mapping_config": mapping.mapping_config
+            }, app_id=mapping.internal_app_id)
         
         # Log the mapping creation
         await log_audit_event(
-            db=db,
             action="mapping_created",
             resource=f"mapping:{mapping.external_service}->{app_row['display_name']}",
             details=f"Created mapping from {mapping.external_service} to {app_row['display_name']}",
@@ -114,66 +127,272 @@ async def create_mapping(mapping: MappingCreate, request: Request):
         raise HTTPException(status_code=500, detail="Failed to create mapping")
 
 @router.get("/list")
-async def get_mappings(skip: int = 0, limit: int = 100):
-    """Get all app mappings"""
-    db = await get_database()
-    cursor = await db.execute("""
-        SELECT am.*, ia.display_name as app_name, ia.logo_url 
-        FROM app_mappings am
-        LEFT JOIN internal_apps ia ON am.internal_app_id = ia.id
-        ORDER BY am.created_at DESC
-        LIMIT ? OFFSET ?
-    """, (limit, skip))
-    rows = await cursor.fetchall()
+async def get_mappings(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=PAGE_MAX_LIMIT),
+                       mode: str = "offset", cursor: Optional[str] = None, total: str = "none"):
+    """Get all app mappings
+    
+    mode=cursor, or passing the returned next_cursor, switches from skip/limit
+    to keyset pagination; total=exact|approximate adds a count to cursor pages.
+    """
+    validate_total_mode(total)
+    keyset = cursor is not None or mode == "cursor"
+    
+    async with read_connection() as db:
+        if keyset and cursor:
+            created_at, last_id = decode_cursor(cursor)
+            db_cursor = await db.execute("""
+                SELECT am.*, ia.display_name as app_name, ia.logo_url 
+                FROM app_mappings am
+                LEFT JOIN internal_apps ia ON am.internal_app_id = ia.id
+                WHERE (am.created_at, am.id) < (?, ?)
+                ORDER BY am.created_at DESC, am.id DESC
+                LIMIT ?
+            """, (created_at, last_id, limit + 1))
+        elif keyset:
+            db_cursor = await db.execute("""
+                SELECT am.*, ia.display_name as app_name, ia.logo_url 
+                FROM app_mappings am
+                LEFT JOIN internal_apps ia ON am.internal_app_id = ia.id
+                ORDER BY am.created_at DESC, am.id DESC
+                LIMIT ?
+            """, (limit + 1,))
+        else:
+            db_cursor = await db.execute("""
+                SELECT am.*, ia.display_name as app_name, ia.logo_url 
+                FROM app_mappings am
+                LEFT JOIN internal_apps ia ON am.internal_app_id = ia.id
+                ORDER BY am.created_at DESC
+                LIMIT ? OFFSET ?
+            """, (limit, skip))
+        rows = await db_cursor.fetchall()
+        count = await count_rows(db, "app_mappings", total) if keyset else None
     
-    mappings = []
-    for row in rows:
-        mapping = dict(row)
-        if mapping['mapping_config']:
-            mapping['mapping_config'] = json.loads(mapping['mapping_config'])
-        mappings.append(mapping)
+    mappings = [row_to_dict(row, ("mapping_config",)) for row in rows[:limit]]
     
-    return {"mappings": mappings}
+    if keyset:
+        return FastJSONResponse(page_response("mappings", mappings, limit, rows, count))
+    
+    return FastJSONResponse({"mappings": mappings})
 
-@router.put("/{mapping_id}")
-async def update_mapping(mapping_id: int, mapping_update: MappingUpdate, request: Request):
-    """Update an existing mapping"""
-    db = await get_database()
+def check_bulk_size(count: int):
+    if count > MAPPING_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAPPING_BULK_MAX_ITEMS} items per bulk request")
+
+def bulk_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    succeeded = sum(1 for result in results if result["success"])
+    return {"success": True, "succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+def id_placeholders(ids: List[int]) -> str:
+    return ", ".join("?" * len(ids))
+
+async def find_mappings(db, ids: List[int]) -> Dict[int, Any]:
+    """Existing mappings among ids, in one query"""
+    unique = list(set(ids))
+    if not unique:
+        return {}
+    cursor = await db.execute(
+        f"SELECT id, external_service, internal_app_id FROM app_mappings WHERE id IN ({id_placeholders(unique)})",
+        unique
+    )
+    return {row['id']: row for row in await cursor.fetchall()}
+
+@router.post("/bulk")
+async def create_mappings_bulk(bulk: MappingBulkCreate, request: Request):
+    """Create many mappings in one transaction
     
+    Referenced internal apps are checked in a single query. Items naming a
+    missing or inactive app are reported and skipped; the rest are inserted
+    together with their audit records.
+    """
+    check_bulk_size(len(bulk.mappings))
     try:
-        # Check if mapping exists
-        cursor = await db.execute("SELECT * FROM app_mappings WHERE id = ?", (mapping_id,))
-        existing = await cursor.fetchone()
+        async with write_connection() as db:
+            app_ids = list({m.internal_app_id for m in bulk.mappings})
+            apps = {}
+            if app_ids:
+                cursor = await db.execute(
+                    f"SELECT id, display_name FROM internal_apps WHERE id IN ({id_placeholders(app_ids)}) AND status = 'active'",
+                    app_ids
+                )
+                apps = {row['id']: row['display_name'] for row in await cursor.fetchall()}
+            
+            valid = [(index, m) for index, m in enumerate(bulk.mappings) if m.internal_app_id in apps]
+            mapping_ids = []
+            if valid:
+                await db.executemany("""
+                    INSERT INTO app_mappings (external_service, internal_app_id, mapping_config, status)
+                    VALUES (?, ?, ?, 'active')
+                """, [
+                    (m.external_service, m.internal_app_id, json.dumps(m.mapping_config) if m.mapping_config else None)
+                    for _, m in valid
+                ])
+                # One INSERT statement under the write lock, so its rows got consecutive ids
+                cursor = await db.execute("SELECT last_insert_rowid()")
+                last_id = (await cursor.fetchone())[0]
+                mapping_ids = list(range(last_id - len(valid) + 1, last_id + 1))
+                
+                await db.executemany(INSERT_AUDIT_SQL, [
+                    request_audit_event(
+                        "mapping_created",
+                        f"mapping:{m.external_service}->{apps[m.internal_app_id]}",
+                        f"Created mapping from {m.external_service} to {apps[m.internal_app_id]} (bulk)",
+                        request
+                    ) for _, m in valid
+                ])
+                await notify_apps_many(db, [
+                    ("mapping.created", {
+                        "mapping_id": mapping_id,
+                        "external_service": m.external_service,
+                        "mapping_config": m.mapping_config
+                    }, m.internal_app_id)
+                    for mapping_id, (_, m) in zip(mapping_ids, valid)
+                ])
+        
+        results = [{"index": index, "success": False, "error": "Internal application not found"}
+                   for index in range(len(bulk.mappings))]
+        for mapping_id, (index, _) in zip(mapping_ids, valid):
+            results[index] = {"index": index, "success": True, "mapping_id": mapping_id}
+        return bulk_response(results)
         
-        if not existing:
-            raise HTTPException(status_code=404, detail="Mapping not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to create {len(bulk.mappings)} mappings: {e}")
+        raise HTTPException(status_code=500, detail="Failed to create mappings")
+
+@router.put("/bulk")
+async def update_mappings_bulk(bulk: MappingBulkUpdate, request: Request):
+    """Update many mappings in one transaction
+    
+    Unknown ids are reported per item; items that change nothing succeed
+    without a write.
+    """
+    check_bulk_size(len(bulk.mappings))
+    try:
+        async with write_connection() as db:
+            existing = await find_mappings(db, [item.id for item in bulk.mappings])
+            changed = [item for item in bulk.mappings
+                       if item.id in existing and (item.mapping_config is not None or item.status is not None)]
+            if changed:
+                await db.executemany("""
+                    UPDATE app_mappings 
+                    SET mapping_config = COALESCE(?, mapping_config),
+                        status = COALESCE(?, status),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, [
+                    (json.dumps(item.mapping_config) if item.mapping_config is not None else None, item.status, item.id)
+                    for item in changed
+                ])
+                await db.executemany(INSERT_AUDIT_SQL, [
+                    request_audit_event("mapping_updated", f"mapping:{item.id}", "Updated mapping configuration (bulk)", request)
+                    for item in changed
+                ])
+                await notify_apps_many(db, [
+                    ("mapping.updated", {
+                        "mapping_id": item.id,
+                        "external_service": existing[item.id]['external_service'],
+                        "mapping_config": item.mapping_config,
+                        "status": item.status
+                    }, existing[item.id]['internal_app_id'])
+                    for item in changed
+                ])
         
-        # Update the mapping
-        updates = []
-        params = []
+        return bulk_response([
+            {"index": index, "success": True, "mapping_id": item.id} if item.id in existing
+            else {"index": index, "success": False, "mapping_id": item.id, "error": "Mapping not found"}
+            for index, item in enumerate(bulk.mappings)
+        ])
         
-        if mapping_update.mapping_config is not None:
-            updates.append("mapping_config = ?")
-            params.append(json.dumps(mapping_update.mapping_config))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to update {len(bulk.mappings)} mappings: {e}")
+        raise HTTPException(status_code=500, detail="Failed to update mappings")
+
+@router.delete("/bulk")
+async def delete_mappings_bulk(bulk: MappingBulkDelete, request: Request):
+    """Delete many mappings in one transaction; unknown or repeated ids are reported per item"""
+    check_bulk_size(len(bulk.ids))
+    try:
+        async with write_connection() as db:
+            existing = await find_mappings(db, bulk.ids)
+            deleted = [mapping_id for mapping_id in dict.fromkeys(bulk.ids) if mapping_id in existing]
+            if deleted:
+                await db.executemany("DELETE FROM app_mappings WHERE id = ?", [(mapping_id,) for mapping_id in deleted])
+                await db.executemany(INSERT_AUDIT_SQL, [
+                    request_audit_event("mapping_deleted", f"mapping:{mapping_id}", "Deleted app mapping (bulk)", request)
+                    for mapping_id in deleted
+                ])
+                await notify_apps_many(db, [
+                    ("mapping.deleted", {
+                        "mapping_id": mapping_id,
+                        "external_service": existing[mapping_id]['external_service']
+                    }, existing[mapping_id]['internal_app_id'])
+                    for mapping_id in deleted
+                ])
         
-        if mapping_update.status is not None:
-            updates.append("status = ?")
-            params.append(mapping_update.status)
+        results = []
+        seen = set()
+        for index, mapping_id in enumerate(bulk.ids):
+            if mapping_id not in existing:
+                results.append({"index": index, "success": False, "mapping_id": mapping_id, "error": "Mapping not found"})
+            elif mapping_id in seen:
+                results.append({"index": index, "success": False, "mapping_id": mapping_id, "error": "Duplicate id"})
+            else:
+                results.append({"index": index, "success": True, "mapping_id": mapping_id})
+            seen.add(mapping_id)
+        return bulk_response(results)
         
-        if updates:
-            updates.append("updated_at = CURRENT_TIMESTAMP")
-            params.append(mapping_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to delete {len(bulk.ids)} mappings: {e}")
+        raise HTTPException(status_code=500, detail="Failed to delete mappings")
+
+@router.put("/{mapping_id}")
+async def update_mapping(mapping_id: int, mapping_update: MappingUpdate, request: Request):
+    """Update an existing mapping"""
+    try:
+        async with write_connection() as db:
+            # Check if mapping exists
+            cursor = await db.execute("SELECT * FROM app_mappings WHERE id = ?", (mapping_id,))
+            existing = await cursor.fetchone()
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Mapping not found")
             
-            await db.execute(f"""
-                UPDATE app_mappings 
-                SET {', '.join(updates)}
-                WHERE id = ?
-            """, params)
-            await db.commit()
+            # Update the mapping
+            updates = []
+            params = []
             
+            if mapping_update.mapping_config is not None:
+                updates.append("mapping_config = ?")
+                params.append(json.dumps(mapping_update.mapping_config))
+            
+            if mapping_update.status is not None:
+                updates.append("status = ?")
+                params.append(mapping_update.status)
+            
+            if updates:
+                updates.append("updated_at = CURRENT_TIMESTAMP")
+                params.append(mapping_id)
+                
+                await db.execute(f"""
+                    UPDATE app_mappings 
+                    SET {', '.join(updates)}
+                    WHERE id = ?
+                """, params)
+                await notify_apps(db, "mapping.updated", {
+                    "mapping_id": mapping_id,
+                    "external_service": existing['external_service'],
+                    "mapping_config": mapping_update.mapping_config,
+                    "status": mapping_update.status
+                }, app_id=existing['internal_app_id'])
+        
+        if updates:
             # Log the update
             await log_audit_event(
-                db=db,
                 action="mapping_updated",
                 resource=f"mapping:{mapping_id}",
                 details=f"Updated mapping configuration",
@@ -191,23 +410,24 @@ async def update_mapping(mapping_id: int, mapping_update: MappingUpdate, request
 @router.delete("/{mapping_id}")
 async def delete_mapping(mapping_id: int, request: Request):
     """Delete a mapping"""
-    db = await get_database()
-    
     try:
-        # Check if mapping exists
-        cursor = await db.execute("SELECT * FROM app_mappings WHERE id = ?", (mapping_id,))
-        existing = await cursor.fetchone()
-        
-        if not existing:
-            raise HTTPException(status_code=404, detail="Mapping not found")
-        
-        # Delete the mapping
-        await db.execute("DELETE FROM app_mappings WHERE id = ?", (mapping_id,))
-        await db.commit()
+        async with write_connection() as db:
+            # Check if mapping exists
+            cursor = await db.execute("SELECT * FROM app_mappings WHERE id = ?", (mapping_id,))
+            existing = await cursor.fetchone()
+            
+            if not existing:
+                raise HTTPException(status_code=404, detail="Mapping not found")
+            
+            # Delete the mapping
+            await db.execute("DELETE FROM app_mappings WHERE id = ?", (mapping_id,))
+            await notify_apps(db, "mapping.deleted", {
+                "mapping_id": mapping_id,
+                "external_service": existing['external_service']
+            }, app_id=existing['internal_app_id'])
         
         # Log the deletion
         await log_audit_event(
-            db=db,
             action="mapping_deleted",
             resource=f"mapping:{mapping_id}",
             details=f"Deleted app mapping",
@@ -1,43 +1,21 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
-import json
-from ..database import get_database
+from fastapi import APIRouter, HTTPException, Request
+from ..registry import provider_registry
 
 router = APIRouter()
 
 @router.get("/")
-async def get_providers():
+async def get_providers(request: Request):
     """Get all enabled providers"""
-    db = await get_database()
-    cursor = await db.execute(
-        "SELECT * FROM providers WHERE enabled = 1 ORDER BY display_name"
-    )
-    rows = await cursor.fetchall()
-    
-    providers = []
-    for row in rows:
-        provider = dict(row)
-        # Parse JSON fields
-        provider['oauth_config'] = json.loads(provider['oauth_config'])
-        provider['scopes'] = provider['scopes'].split(',')
-        providers.append(provider)
-    
-    return {"providers": providers}
+    # Served from the registry's pre-serialized body; clients revalidate with If-None-Match
+    cached = await provider_registry.list_body()
+    return cached.response(request)
 
 @router.get("/{provider_id}")
-async def get_provider(provider_id: int):
+async def get_provider(provider_id: int, request: Request):
     """Get specific provider by ID"""
-    db = await get_database()
-    cursor = await db.execute(
-        "SELECT * FROM providers WHERE id = ?", (provider_id,)
-    )
-    row = await cursor.fetchone()
+    cached = await provider_registry.item_body(provider_id)
     
-    if not row:
+    if not cached:
         raise HTTPException(status_code=404, detail="Provider not found")
     
-    provider = dict(row)
-    provider['oauth_config'] = json.loads(provider['oauth_config'])
-    provider['scopes'] = provider['scopes'].split(',')
-    
-    return {"provider": provider}
\ No newline at end of file
+    return cached.response(request)
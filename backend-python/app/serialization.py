@@ -0,0 +1,112 @@
+import functools
+import json
+import os
+import logging
+from typing import Any, Dict, Iterable
+from fastapi.responses import Response
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson")
+JSON_DECODE_CACHE_SIZE = int(os.getenv("JSON_DECODE_CACHE_SIZE", "10000"))
+
+APP_JSON_COLUMNS = ("api_endpoints", "manifest_data")
+
+class StdlibJSON:
+    """json from the standard library, compact and UTF-8"""
+    name = "json"
+
+    def dumps(self, content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonJSON:
+    """orjson, if installed: same output, several times faster"""
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, content: Any) -> bytes:
+        return self._orjson.dumps(content, option=self._options)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+JSON_BACKENDS = {"json": StdlibJSON, "orjson": OrjsonJSON}
+
+def load_json_backend(name: str = JSON_BACKEND):
+    """Instantiate the configured JSON backend, falling back to the standard library"""
+    try:
+        return JSON_BACKENDS[name]()
+    except (KeyError, ImportError) as e:
+        logger.warning(f"JSON backend '{name}' unavailable ({e!r}), using the json module")
+        return StdlibJSON()
+
+json_backend = load_json_backend()
+
+class FastJSONResponse(Response):
+    """JSON response encoded directly by the JSON backend
+
+    Returning one from an endpoint skips FastAPI's jsonable_encoder pass, so
+    content must already be plain JSON types (rows from dict(row) are).
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return json_backend.dumps(content)
+
+class FrozenDict(dict):
+    """A dict that refuses in-place changes; dict(frozen) gives a mutable copy
+
+    Still a dict subclass, so orjson, json and jsonable_encoder serialize it as one.
+    """
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Decoded JSON is shared between callers; copy it with dict() before changing it")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+def freeze_json(value: Any) -> Any:
+    """Decoded JSON with every object made a FrozenDict and every array a tuple"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze_json(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze_json(item) for item in value)
+    return value
+
+@functools.lru_cache(maxsize=JSON_DECODE_CACHE_SIZE)
+def decode_json(text: str) -> Any:
+    """Decode a JSON column, reusing the object decoded for identical text earlier
+
+    Keyed on the stored text itself, so a row rewritten by any worker decodes
+    afresh while unchanged rows cost a dict lookup. The result is shared between
+    callers, so it is frozen: changing it raises TypeError instead of leaking
+    into every later response. Copying on each call would cost more than the
+    decode it saves.
+    """
+    return freeze_json(json_backend.loads(text))
+
+def row_to_dict(row, json_columns: Iterable[str] = ()) -> Dict[str, Any]:
+    """dict(row) with the named JSON text columns decoded"""
+    item = dict(row)
+    for column in json_columns:
+        if item.get(column):
+            item[column] = decode_json(item[column])
+    return item
+
+def _decode_cache_lookups():
+    info = decode_json.cache_info()
+    return {("hit",): info.hits, ("miss",): info.misses}
+
+registry.counter("authcenter_json_decode_cache_lookups_total", "JSON column decodes served from cache",
+                 ["result"], collect=_decode_cache_lookups)
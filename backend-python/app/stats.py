@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import aiosqlite
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Dashboard rollups maintained by triggers (see migration 2), so the admin
+# endpoints read a handful of rows instead of running COUNT(*) over whole tables.
+
+STATS_SCHEMA_SQL: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS stat_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_action_counts (
+        action TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS audit_hourly_counts (
+        bucket TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    # users
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats_insert AFTER INSERT ON users BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'total_users';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_users_stats_delete AFTER DELETE ON users BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'total_users';
+    END
+    """,
+    # connections - only rows with status 'active' are counted
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_connections_stats_insert AFTER INSERT ON connections
+    WHEN NEW.status IS 'active' BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'active_connections';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_connections_stats_update AFTER UPDATE OF status ON connections
+    WHEN (NEW.status IS 'active') != (OLD.status IS 'active') BEGIN
+        UPDATE stat_counters SET value = value + (NEW.status IS 'active') - (OLD.status IS 'active')
+        WHERE name = 'active_connections';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_connections_stats_delete AFTER DELETE ON connections
+    WHEN OLD.status IS 'active' BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'active_connections';
+    END
+    """,
+    # internal_apps - only rows with status 'active' are counted
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_stats_insert AFTER INSERT ON internal_apps
+    WHEN NEW.status IS 'active' BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'active_internal_apps';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_stats_update AFTER UPDATE OF status ON internal_apps
+    WHEN (NEW.status IS 'active') != (OLD.status IS 'active') BEGIN
+        UPDATE stat_counters SET value = value + (NEW.status IS 'active') - (OLD.status IS 'active')
+        WHERE name = 'active_internal_apps';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_internal_apps_stats_delete AFTER DELETE ON internal_apps
+    WHEN OLD.status IS 'active' BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'active_internal_apps';
+    END
+    """,
+    # audit_logs - total, per-action and hourly buckets
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_audit_logs_stats_insert AFTER INSERT ON audit_logs BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'total_audit_logs';
+        INSERT INTO audit_action_counts (action, count) VALUES (NEW.action, 1)
+            ON CONFLICT(action) DO UPDATE SET count = count + 1;
+        INSERT INTO audit_hourly_counts (bucket, count)
+            VALUES (strftime('%Y-%m-%d %H:00:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP)), 1)
+            ON CONFLICT(bucket) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_audit_logs_stats_delete AFTER DELETE ON audit_logs BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'total_audit_logs';
+        UPDATE audit_action_counts SET count = count - 1 WHERE action = OLD.action;
+        UPDATE audit_hourly_counts SET count = count - 1
+            WHERE bucket = strftime('%Y-%m-%d %H:00:00', COALESCE(OLD.created_at, CURRENT_TIMESTAMP));
+    END
+    """,
+]
+
+# Recompute every rollup from the base tables; also used to seed them in migration 2
+REBUILD_STATS_SQL: List[str] = [
+    "DELETE FROM stat_counters",
+    "DELETE FROM audit_action_counts",
+    "DELETE FROM audit_hourly_counts",
+    """
+    INSERT INTO stat_counters (name, value)
+    SELECT 'total_users', COUNT(*) FROM users
+    UNION ALL SELECT 'active_connections', COUNT(*) FROM connections WHERE status = 'active'
+    UNION ALL SELECT 'active_internal_apps', COUNT(*) FROM internal_apps WHERE status = 'active'
+    UNION ALL SELECT 'total_audit_logs', COUNT(*) FROM audit_logs
+    """,
+    """
+    INSERT INTO audit_action_counts (action, count)
+    SELECT action, COUNT(*) FROM audit_logs GROUP BY action
+    """,
+    """
+    INSERT INTO audit_hourly_counts (bucket, count)
+    SELECT strftime('%Y-%m-%d %H:00:00', COALESCE(created_at, CURRENT_TIMESTAMP)) AS bucket, COUNT(*)
+    FROM audit_logs GROUP BY bucket
+    """,
+]
+
+async def get_counters(db: aiosqlite.Connection) -> Dict[str, int]:
+    """Read every maintained counter"""
+    cursor = await db.execute("SELECT name, value FROM stat_counters")
+    rows = await cursor.fetchall()
+    return {row['name']: row['value'] for row in rows}
+
+async def get_action_counts(db: aiosqlite.Connection) -> List[Dict[str, Any]]:
+    """Per-action audit log counts, largest first"""
+    cursor = await db.execute("""
+        SELECT action, count FROM audit_action_counts
+        WHERE count > 0
+        ORDER BY count DESC
+    """)
+    rows = await cursor.fetchall()
+    return [dict(row) for row in rows]
+
+async def count_recent_audit_logs(db: aiosqlite.Connection, window: str) -> int:
+    """Audit logs with created_at > datetime('now', window)
+
+    Whole hours come from the hourly buckets; the partial first hour is counted
+    exactly from the created_at index, so the result matches the COUNT(*) query.
+    """
+    cursor = await db.execute("""
+        SELECT
+            (SELECT COALESCE(SUM(count), 0) FROM audit_hourly_counts
+             WHERE bucket >= strftime('%Y-%m-%d %H:00:00', 'now', ?, '+1 hour'))
+          + (SELECT COUNT(*) FROM audit_logs
+             WHERE created_at > datetime('now', ?)
+               AND created_at < strftime('%Y-%m-%d %H:00:00', 'now', ?, '+1 hour')) AS count
+    """, (window, window, window))
+    row = await cursor.fetchone()
+    return row['count']
+
+async def rebuild_stats(db: aiosqlite.Connection) -> Dict[str, Any]:
+    """Reconcile rollups with the base tables; returns how far each counter had drifted"""
+    before = await get_counters(db)
+    await db.execute("BEGIN")
+    for statement in REBUILD_STATS_SQL:
+        await db.execute(statement)
+    await db.commit()
+    after = await get_counters(db)
+    drift = {name: value - before.get(name, 0) for name, value in after.items()}
+    logger.info(f"Dashboard stats rebuilt, drift: {drift}")
+    return {"counters": after, "drift": drift}
+
+async def _main():
+    from .database import init_database, write_connection, close_database
+    await init_database()
+    async with write_connection() as db:
+        result = await rebuild_stats(db)
+    await close_database()
+    print(result)
+
+if __name__ == "__main__":
+    # python -m app.stats - reconcile dashboard counters with the base tables
+    asyncio.run(_main())
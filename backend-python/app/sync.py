@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Deque
+import httpx
+from .database import read_connection, write_connection
+from .google import Page
+
+logger = logging.getLogger(__name__)
+
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "100"))
+SYNC_MAX_INFLIGHT_BATCHES = int(os.getenv("SYNC_MAX_INFLIGHT_BATCHES", "4"))
+SYNC_PUSH_RETRIES = int(os.getenv("SYNC_PUSH_RETRIES", "2"))
+SYNC_PUSH_RETRY_BASE_SECONDS = float(os.getenv("SYNC_PUSH_RETRY_BASE_SECONDS", "0.5"))
+# A 'running' job older than this whose worker never recorded an end is treated as dead
+SYNC_STALE_JOB_SECONDS = int(os.getenv("SYNC_STALE_JOB_SECONDS", "3600"))
+
+class SyncError(Exception):
+    pass
+
+class SyncInProgressError(SyncError):
+    pass
+
+def utc_now(offset_seconds: float = 0) -> str:
+    return (datetime.utcnow() + timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+def transform_record(provider: str, service: str, item: Dict[str, Any],
+                     fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Normalize a provider item into the record shape pushed to internal apps"""
+    data = {k: item[k] for k in fields if k in item} if fields else item
+    return {"id": item.get("id"), "source": provider, "type": service, "data": data}
+
+async def load_targets(user_id: Any, service: str) -> List[Dict[str, Any]]:
+    """Active mappings for a service with the internal app endpoint each batch goes to"""
+    async with read_connection() as db:
+        cursor = await db.execute("""
+            SELECT m.id, m.mapping_config, ia.display_name, ia.api_endpoints
+            FROM app_mappings m
+            JOIN internal_apps ia ON m.internal_app_id = ia.id
+            WHERE m.external_service = ? AND m.status = 'active' AND ia.status = 'active'
+              AND (m.user_id IS NULL OR m.user_id = ?)
+        """, (service, user_id))
+        rows = await cursor.fetchall()
+
+    targets = []
+    for row in rows:
+        config = json.loads(row['mapping_config']) if row['mapping_config'] else {}
+        endpoints = json.loads(row['api_endpoints']) if row['api_endpoints'] else {}
+        url = config.get("endpoint") or endpoints.get("sync") or endpoints.get("webhook")
+        if not url:
+            logger.warning(f"Mapping {row['id']} to {row['display_name']} has no sync endpoint, skipping")
+            continue
+        targets.append({"mapping_id": row['id'], "app": row['display_name'], "url": url, "fields": config.get("fields")})
+    return targets
+
+async def get_checkpoint(connection_id: int, service: str) -> Optional[Dict[str, Any]]:
+    async with read_connection() as db:
+        cursor = await db.execute(
+            "SELECT * FROM sync_checkpoints WHERE connection_id = ? AND service = ?", (connection_id, service)
+        )
+        row = await cursor.fetchone()
+    return dict(row) if row else None
+
+async def save_checkpoint(connection_id: int, service: str, page_token: Optional[str],
+                          delta_token: Optional[str], records: int, job_id: str):
+    async with write_connection() as db:
+        await db.execute("""
+            INSERT INTO sync_checkpoints (connection_id, service, page_token, delta_token, records_synced, last_job_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(connection_id, service) DO UPDATE SET
+                page_token = excluded.page_token,
+                delta_token = COALESCE(excluded.delta_token, delta_token),
+                records_synced = records_synced + excluded.records_synced,
+                last_job_id = excluded.last_job_id,
+                updated_at = CURRENT_TIMESTAMP
+        """, (connection_id, service, page_token, delta_token, records, job_id))
+
+async def reset_checkpoint(connection_id: int, service: str):
+    async with write_connection() as db:
+        await db.execute("DELETE FROM sync_checkpoints WHERE connection_id = ? AND service = ?", (connection_id, service))
+
+async def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT * FROM sync_jobs WHERE id = ?", (job_id,))
+        row = await cursor.fetchone()
+    return dict(row) if row else None
+
+class SyncEngine:
+    """Pulls provider pages as a stream and pushes transformed batches to mapped apps
+
+    At most max_inflight batch pushes run at once; the page stream is not read
+    further until a slot frees up. The checkpoint only advances past a page once
+    every batch from it (and every page before it) has been delivered, so a failed
+    or interrupted run resumes from the first undelivered page.
+    """
+
+    def __init__(self, batch_size: int = SYNC_BATCH_SIZE, max_inflight: int = SYNC_MAX_INFLIGHT_BATCHES,
+                 push_retries: int = SYNC_PUSH_RETRIES, retry_base: float = SYNC_PUSH_RETRY_BASE_SECONDS,
+                 stale_after: int = SYNC_STALE_JOB_SECONDS):
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight
+        self.push_retries = push_retries
+        self.retry_base = retry_base
+        self.stale_after = stale_after
+        self._running: Dict[Tuple[int, str], str] = {}
+
+    def running_job(self, connection_id: int, service: str) -> Optional[str]:
+        return self._running.get((connection_id, service))
+
+    async def run(self, http: httpx.AsyncClient, user_id: Any, provider: str, service: str,
+                  connection_id: int, pages: AsyncIterator[Page],
+                  targets: List[Dict[str, Any]], job_id: Optional[str] = None) -> Dict[str, Any]:
+        """Run one sync job to completion and return its stats"""
+        key = (connection_id, service)
+        if key in self._running:
+            raise SyncInProgressError(f"Sync {self._running[key]} is already running for {provider}/{service}")
+        job_id = job_id or uuid.uuid4().hex
+        self._running[key] = job_id
+
+        stats = {"records": 0, "bytes": 0, "batches": 0, "pages": 0, "failed_batches": 0}
+        started_at = utc_now()
+        started = time.monotonic()
+        try:
+            if not await self._start_job(job_id, user_id, connection_id, provider, service, started_at):
+                raise SyncInProgressError(f"A sync is already running for {provider}/{service} in another worker")
+        except BaseException:
+            del self._running[key]
+            raise
+
+        slots = asyncio.Semaphore(self.max_inflight)
+        # (push tasks for a page, page) in stream order, awaiting delivery
+        pending: Deque[Tuple[List[asyncio.Task], Page, int]] = deque()
+        error: Optional[str] = None
+
+        async def push(target: Dict[str, Any], batch: List[Dict[str, Any]], number: int):
+            try:
+                records = [transform_record(provider, service, item, target["fields"]) for item in batch]
+                body = json.dumps({
+                    "job_id": job_id, "provider": provider, "service": service,
+                    "batch": number, "records": records
+                }, separators=(",", ":")).encode("utf-8")
+                await self._deliver(http, target["url"], body)
+                stats["bytes"] += len(body)
+                stats["batches"] += 1
+            except Exception:
+                stats["failed_batches"] += 1
+                raise
+            finally:
+                slots.release()
+
+        async def advance(wait: bool):
+            """Checkpoint past every leading page whose batches have all been delivered"""
+            delivered = 0
+            last: Optional[Page] = None
+            failure: Optional[BaseException] = None
+            while pending and (wait or all(task.done() for task in pending[0][0])):
+                tasks, page, count = pending.popleft()
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+                failures = [r for r in results if isinstance(r, BaseException)]
+                if failures:
+                    failure = failures[0]
+                    break
+                delivered += count
+                last = page
+            if last is not None:
+                stats["records"] += delivered
+                await save_checkpoint(connection_id, service, last.next_page_token, last.delta_token, delivered, job_id)
+            if failure is not None:
+                raise SyncError(f"Push to internal app failed: {failure}")
+
+        # Stays 'interrupted' if the task is cancelled before the run ends
+        status = "interrupted"
+        try:
+            number = 0
+            async for page in pages:
+                stats["pages"] += 1
+                tasks = []
+                for i in range(0, len(page.items), self.batch_size):
+                    batch = page.items[i:i + self.batch_size]
+                    number += 1
+                    for target in targets:
+                        # Backpressure: wait for a free slot before reading further
+                        await slots.acquire()
+                        tasks.append(asyncio.create_task(push(target, batch, number)))
+                pending.append((tasks, page, len(page.items)))
+                await advance(wait=False)
+            await advance(wait=True)
+            status = "completed"
+        except Exception as e:
+            status = "failed"
+            error = str(e)
+            leftover = [task for tasks, _, _ in pending for task in tasks]
+            for task in leftover:
+                task.cancel()
+            await asyncio.gather(*leftover, return_exceptions=True)
+            logger.error(f"Sync job {job_id} for {provider}/{service} failed: {e}")
+        finally:
+            # Nothing here may skip the terminal status write: a row left 'running'
+            # blocks every later sync of this connection and service
+            try:
+                if hasattr(pages, "aclose"):
+                    await pages.aclose()
+            except Exception as e:
+                logger.warning(f"Closing the page stream of sync job {job_id} failed: {e}")
+            try:
+                duration = time.monotonic() - started
+                stats.update({
+                    "duration_ms": round(duration * 1000, 1),
+                    "records_per_second": round(stats["records"] / duration, 1) if duration else 0.0,
+                    "bytes_per_second": round(stats["bytes"] / duration, 1) if duration else 0.0,
+                })
+                async with write_connection() as db:
+                    await db.execute("""
+                        UPDATE sync_jobs SET status = ?, records = ?, bytes = ?, batches = ?, pages = ?,
+                            failed_batches = ?, duration_ms = ?, error = ?, finished_at = ?
+                        WHERE id = ?
+                    """, (status, stats["records"], stats["bytes"], stats["batches"], stats["pages"],
+                          stats["failed_batches"], stats["duration_ms"], error, utc_now(), job_id))
+            except Exception as e:
+                # The row stays 'running' until it is old enough for _start_job to reclaim it
+                logger.error(f"Could not record the end of sync job {job_id} ({status}): {e}")
+            finally:
+                del self._running[key]
+
+        return {"job_id": job_id, "status": status, "error": error, "targets": len(targets),
+                "started_at": started_at, **stats}
+
+    async def _start_job(self, job_id: str, user_id: Any, connection_id: int, provider: str,
+                         service: str, started_at: str) -> bool:
+        """Insert the job as 'running'; False if a live job already holds the slot
+
+        A 'running' row older than stale_after belongs to a worker that died (or
+        failed to record the end) mid-run, so it is marked interrupted and the
+        insert is retried once.
+        """
+        insert = """
+            INSERT INTO sync_jobs (id, user_id, connection_id, provider, service, status, started_at)
+            VALUES (?, ?, ?, ?, ?, 'running', ?)
+        """
+        values = (job_id, user_id, connection_id, provider, service, started_at)
+        async with write_connection() as db:
+            try:
+                await db.execute(insert, values)
+                return True
+            except sqlite3.IntegrityError:
+                pass
+            cursor = await db.execute("""
+                UPDATE sync_jobs SET status = 'interrupted', error = 'stale running job', finished_at = ?
+                WHERE connection_id = ? AND service = ? AND status = 'running' AND started_at < ?
+            """, (started_at, connection_id, service, utc_now(-self.stale_after)))
+            if not cursor.rowcount:
+                return False
+            logger.warning(f"Marked a stale sync job for {provider}/{service} as interrupted")
+            await db.execute(insert, values)
+            return True
+
+    async def _deliver(self, http: httpx.AsyncClient, url: str, body: bytes):
+        attempt = 0
+        while True:
+            try:
+                response = await http.post(url, content=body, headers={"Content-Type": "application/json"})
+                if response.status_code < 400:
+                    return
+                raise SyncError(f"POST {url} -> {response.status_code}")
+            except (httpx.HTTPError, SyncError):
+                if attempt >= self.push_retries:
+                    raise
+                await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+                attempt += 1
+
+sync_engine = SyncEngine()
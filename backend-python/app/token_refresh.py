@@ -0,0 +1,310 @@
+import asyncio
+import heapq
+import os
+import random
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable
+from .database import read_connection, write_connection
+from .registry import provider_registry
+from .http_client import get_http_client
+from .google import GoogleClient, ProviderError, oauth_configured
+from .cache import shared_cache
+from .connection_cache import connection_key
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REFRESH_ENABLED = os.getenv("TOKEN_REFRESH_ENABLED", "auto").lower()
+TOKEN_REFRESH_LEAD_SECONDS = float(os.getenv("TOKEN_REFRESH_LEAD_SECONDS", "300"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "4"))
+TOKEN_REFRESH_MAX_RETRIES = int(os.getenv("TOKEN_REFRESH_MAX_RETRIES", "3"))
+TOKEN_REFRESH_RETRY_BASE_SECONDS = float(os.getenv("TOKEN_REFRESH_RETRY_BASE_SECONDS", "1"))
+TOKEN_REFRESH_RESCAN_SECONDS = float(os.getenv("TOKEN_REFRESH_RESCAN_SECONDS", "60"))
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "50"))
+TOKEN_REFRESH_FLUSH_SECONDS = float(os.getenv("TOKEN_REFRESH_FLUSH_SECONDS", "1"))
+
+Refresher = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+def parse_db_timestamp(value: str) -> float:
+    """SQLite CURRENT_TIMESTAMP/datetime() text (UTC) to a unix timestamp"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def format_db_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+async def google_refresher(connection: Dict[str, Any]) -> Dict[str, Any]:
+    """Default refresher: call the connection's provider token endpoint"""
+    provider = await provider_registry.get(connection['provider_id'])
+    if provider is None or provider.name != "google":
+        raise ProviderError(f"No refresher for provider {connection['provider_id']}")
+    return await GoogleClient(get_http_client(), provider).refresh_token(connection['refresh_token'])
+
+class TokenRefreshScheduler:
+    """Refreshes connection tokens a lead time before they expire
+
+    Connections sit in a min-heap ordered by refresh due time. Refreshes run with
+    bounded concurrency, retry with jittered exponential backoff, and are
+    single-flight per connection; new tokens are written back in batches.
+    """
+
+    def __init__(self, refresher: Refresher = google_refresher,
+                 lead_seconds: float = TOKEN_REFRESH_LEAD_SECONDS,
+                 concurrency: int = TOKEN_REFRESH_CONCURRENCY,
+                 max_retries: int = TOKEN_REFRESH_MAX_RETRIES,
+                 retry_base: float = TOKEN_REFRESH_RETRY_BASE_SECONDS,
+                 rescan_seconds: float = TOKEN_REFRESH_RESCAN_SECONDS,
+                 batch_size: int = TOKEN_REFRESH_BATCH_SIZE,
+                 flush_seconds: float = TOKEN_REFRESH_FLUSH_SECONDS):
+        self.refresher = refresher
+        self.lead_seconds = lead_seconds
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.rescan_seconds = rescan_seconds
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._pending_writes: List[Tuple[str, Optional[str], str, int]] = []
+        self._pending_owners: Dict[int, Tuple[int, int]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._workers: set = set()
+        self._claimed: set = set()
+        self.counters = {"refreshed": 0, "failed": 0, "retries": 0, "coalesced": 0, "written": 0, "write_batches": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Load expiring connections and start the scheduling and flush loops"""
+        if self.running:
+            return
+        self._semaphore = asyncio.Semaphore(self._concurrency)
+        self._wakeup = asyncio.Event()
+        await self.rescan()
+        self._tasks = [asyncio.create_task(self._schedule_loop()), asyncio.create_task(self._flush_loop())]
+        logger.info(f"Token refresh scheduler started with {len(self._due)} connections queued")
+
+    async def stop(self):
+        """Stop scheduling, let in-flight refreshes finish and persist their results"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        await self.flush()
+
+    def schedule(self, connection_id: int, expires_at: float):
+        """Queue (or re-queue) a connection to refresh lead_seconds before expires_at"""
+        due = expires_at - self.lead_seconds
+        if self._due.get(connection_id) == due:
+            return
+        self._due[connection_id] = due
+        heapq.heappush(self._heap, (due, connection_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def rescan(self):
+        """Pick up active connections expiring before the next rescan"""
+        horizon = f"+{int(self.lead_seconds + self.rescan_seconds)} seconds"
+        async with read_connection() as db:
+            cursor = await db.execute("""
+                SELECT id, expires_at FROM connections
+                WHERE status = 'active' AND expires_at <= datetime('now', ?)
+                  AND refresh_token IS NOT NULL
+            """, (horizon,))
+            rows = await cursor.fetchall()
+        for row in rows:
+            # Rows already queued or being refreshed still carry their old expires_at
+            if row['id'] not in self._due and row['id'] not in self._claimed:
+                self.schedule(row['id'], parse_db_timestamp(row['expires_at']))
+
+    async def _schedule_loop(self):
+        loop = asyncio.get_running_loop()
+        next_rescan = loop.time() + self.rescan_seconds
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, connection_id = heapq.heappop(self._heap)
+                if self._due.get(connection_id) != due:
+                    continue  # superseded by a later schedule() call
+                del self._due[connection_id]
+                self._claimed.add(connection_id)
+                worker = asyncio.create_task(self._refresh_in_background(connection_id))
+                self._workers.add(worker)
+                worker.add_done_callback(self._workers.discard)
+
+            if loop.time() >= next_rescan:
+                try:
+                    await self.rescan()
+                except Exception as e:
+                    logger.error(f"Token refresh rescan failed: {e}")
+                next_rescan = loop.time() + self.rescan_seconds
+
+            timeout = next_rescan - loop.time()
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - time.time())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh_in_background(self, connection_id: int):
+        try:
+            await self.refresh(connection_id)
+        except Exception as e:
+            logger.error(f"Token refresh for connection {connection_id} failed: {e}")
+        finally:
+            self._claimed.discard(connection_id)
+
+    async def refresh(self, connection_id: int) -> Dict[str, Any]:
+        """Refresh a connection now; concurrent callers for the same connection share one call"""
+        inflight = self._inflight.get(connection_id)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Only retry when the leading caller was cancelled (its client went away), not this one
+                if asyncio.current_task().cancelling() or not inflight.cancelled():
+                    raise
+            return await self.refresh(connection_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[connection_id] = future
+        try:
+            result = await self._refresh(connection_id)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unawaited failure is not logged as never retrieved
+            future.exception()
+            raise
+        except BaseException:
+            # Cancellation belongs to this caller; waiters see a cancelled future and refresh again
+            future.cancel()
+            raise
+        finally:
+            del self._inflight[connection_id]
+
+    async def _refresh(self, connection_id: int) -> Dict[str, Any]:
+        async with read_connection() as db:
+            cursor = await db.execute(
+                "SELECT id, user_id, provider_id, refresh_token, status FROM connections WHERE id = ?",
+                (connection_id,)
+            )
+            row = await cursor.fetchone()
+        if row is None or row['status'] != 'active' or not row['refresh_token']:
+            raise ProviderError(f"Connection {connection_id} is not refreshable")
+        connection = dict(row)
+
+        semaphore = self._semaphore or asyncio.Semaphore(self._concurrency)
+        attempt = 0
+        while True:
+            try:
+                async with semaphore:
+                    tokens = await self.refresher(connection)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.counters["failed"] += 1
+                    if self.running:
+                        # Try again on the next rescan rather than hammering the provider
+                        self.schedule(connection_id, time.time() + self.lead_seconds + self.rescan_seconds)
+                    raise
+                # Full jitter keeps a fleet of failing refreshes from retrying in lockstep
+                delay = random.uniform(0, self.retry_base * (2 ** attempt))
+                attempt += 1
+                self.counters["retries"] += 1
+                logger.warning(f"Token refresh for connection {connection_id} failed ({e}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        expires_at = time.time() + int(tokens.get('expires_in', 3600))
+        self._pending_writes.append((
+            tokens['access_token'],
+            tokens.get('refresh_token'),
+            format_db_timestamp(expires_at),
+            connection_id
+        ))
+        self._pending_owners[connection_id] = (connection['user_id'], connection['provider_id'])
+        self.counters["refreshed"] += 1
+        if self.running:
+            self.schedule(connection_id, expires_at)
+        if not self.running or len(self._pending_writes) >= self.batch_size:
+            # Without the flush loop (scheduler disabled, or not the leader worker) nothing
+            # else would persist an inline refresh, and the cached row would keep the old token
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist refreshed token for connection {connection_id}: {e}")
+        return {"connection_id": connection_id, "access_token": tokens['access_token'],
+                "expires_at": format_db_timestamp(expires_at)}
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to persist refreshed tokens: {e}")
+
+    async def flush(self):
+        """Write pending token updates in one transaction"""
+        if not self._pending_writes:
+            return
+        batch, self._pending_writes = self._pending_writes, []
+        try:
+            async with write_connection() as db:
+                await db.executemany("""
+                    UPDATE connections SET
+                        access_token = ?,
+                        refresh_token = COALESCE(?, refresh_token),
+                        expires_at = ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, batch)
+        except Exception:
+            self._pending_writes = batch + self._pending_writes
+            raise
+        self.counters["written"] += len(batch)
+        self.counters["write_batches"] += 1
+        # Cached connection rows still hold the old access token
+        owners = [self._pending_owners.pop(write[3]) for write in batch if write[3] in self._pending_owners]
+        if owners:
+            await shared_cache.invalidate([connection_key(user_id, provider_id) for user_id, provider_id in owners])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "queued": len(self._due),
+            "in_flight": len(self._inflight),
+            "pending_writes": len(self._pending_writes),
+            "next_due_in": round(self._heap[0][0] - time.time(), 3) if self._heap else None,
+            "running": self.running,
+        }
+
+def refresh_enabled() -> bool:
+    """TOKEN_REFRESH_ENABLED=auto runs the scheduler only when real OAuth credentials are configured"""
+    if TOKEN_REFRESH_ENABLED == "auto":
+        return oauth_configured()
+    return TOKEN_REFRESH_ENABLED in ("1", "true", "yes")
+
+token_refresher = TokenRefreshScheduler()
+
+registry.gauge("authcenter_token_refresh_queue", "Token refreshes queued, running and awaiting their batch write",
+               ["state"], collect=lambda: {("queued",): len(token_refresher._due), ("in_flight",): len(token_refresher._inflight),
+                                           ("pending_write",): len(token_refresher._pending_writes)})
+registry.counter("authcenter_token_refreshes_total", "Token refreshes by outcome", ["outcome"],
+                 collect=lambda: {(k,): token_refresher.counters[k] for k in ("refreshed", "failed", "retries")})
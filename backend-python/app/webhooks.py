@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import random
+import time
+import logging
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Deque, Tuple
+import aiosqlite
+from .database import read_connection, write_connection, after_commit
+from .http_client import get_http_client
+from .cache import shared_cache
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WEBHOOKS_ENABLED = os.getenv("WEBHOOKS_ENABLED", "true").lower() in ("1", "true", "yes")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_PER_APP_CONCURRENCY = int(os.getenv("WEBHOOK_PER_APP_CONCURRENCY", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "50"))
+WEBHOOK_COALESCE_MS = int(os.getenv("WEBHOOK_COALESCE_MS", "100"))
+WEBHOOK_POLL_SECONDS = float(os.getenv("WEBHOOK_POLL_SECONDS", "5"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "2"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "600"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+WEBHOOK_RETAIN_DELIVERED_SECONDS = float(os.getenv("WEBHOOK_RETAIN_DELIVERED_SECONDS", "86400"))
+
+# Outbox rows scanned per dispatch pass
+SCAN_LIMIT = 1000
+# Recent samples kept for the latency percentiles
+LATENCY_SAMPLES = 1000
+
+def webhook_url(api_endpoints: Optional[str]) -> Optional[str]:
+    return (json.loads(api_endpoints) if api_endpoints else {}).get("webhook")
+
+def is_realtime(manifest_data: Optional[str]) -> bool:
+    manifest = json.loads(manifest_data) if manifest_data else {}
+    return bool(manifest.get("capabilities", {}).get("realtime"))
+
+def percentiles(samples) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": round(ordered[-1] * 1000, 1)}
+
+class WebhookDispatcher:
+    """Delivers outbox events to internal app webhooks
+
+    Events are persisted to webhook_outbox first, so nothing is lost across
+    restarts. Pending events are coalesced per app into batched POSTs over the
+    shared keep-alive client, with a cap on in-flight batches per app and overall.
+    Failed batches retry with jittered exponential backoff until max_attempts,
+    after which their events move to the dead state.
+    """
+
+    def __init__(self, workers: int = WEBHOOK_WORKERS, per_app: int = WEBHOOK_PER_APP_CONCURRENCY,
+                 batch_size: int = WEBHOOK_BATCH_SIZE, coalesce_ms: int = WEBHOOK_COALESCE_MS,
+                 poll_seconds: float = WEBHOOK_POLL_SECONDS, max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+                 retry_base: float = WEBHOOK_RETRY_BASE_SECONDS, retry_max: float = WEBHOOK_RETRY_MAX_SECONDS):
+        self.workers = workers
+        self.per_app = per_app
+        self.batch_size = batch_size
+        self.coalesce = coalesce_ms / 1000
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._deliveries: set = set()
+        self._claimed: set = set()
+        self._app_inflight: Dict[int, int] = defaultdict(int)
+        self._event_latency: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._post_latency: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"published": 0, "delivered": 0, "batches": 0, "failed_attempts": 0, "dead": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Webhook dispatcher started")
+
+    async def stop(self):
+        """Stop dispatching and wait for in-flight batches to record their outcome"""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._deliveries:
+            await asyncio.gather(*self._deliveries, return_exceptions=True)
+
+    async def publish(self, event_type: str, payload: Dict[str, Any], app_id: Optional[int] = None) -> int:
+        """Queue an event for one app, or for every active realtime app, in its own transaction"""
+        return await self.publish_many([(event_type, payload, app_id)])
+
+    async def publish_many(self, events: List[Tuple[str, Dict[str, Any], Optional[int]]]) -> int:
+        """Queue (event_type, payload, app_id) events in their own write transaction"""
+        async with write_connection() as db:
+            return await self.enqueue(db, events)
+
+    async def enqueue(self, db: aiosqlite.Connection, events: List[Tuple[str, Dict[str, Any], Optional[int]]]) -> int:
+        """Insert outbox rows for (event_type, payload, app_id) events on the caller's writer connection
+
+        The rows commit or roll back with the caller's transaction, so an event is
+        queued exactly when the change it describes is. The dispatcher is woken once
+        the transaction commits. Returns the number of rows inserted.
+        """
+        app_ids = {app_id for _, _, app_id in events}
+        if None in app_ids:
+            cursor = await db.execute(
+                "SELECT id, api_endpoints, manifest_data FROM internal_apps WHERE status = 'active'"
+            )
+        else:
+            cursor = await db.execute(f"""
+                SELECT id, api_endpoints, manifest_data FROM internal_apps
+                WHERE id IN ({', '.join('?' * len(app_ids))}) AND status = 'active'
+            """, list(app_ids))
+        apps = await cursor.fetchall()
+
+        urls = {
+            app['id']: webhook_url(app['api_endpoints'])
+            for app in apps
+            if webhook_url(app['api_endpoints']) and is_realtime(app['manifest_data'])
+        }
+        now = time.time()
+        rows = []
+        for event_type, payload, app_id in events:
+            targets = urls if app_id is None else [app_id] if app_id in urls else []
+            if not targets:
+                continue
+            body = json.dumps(payload, separators=(",", ":"))
+            rows.extend((target, urls[target], event_type, body, now, now) for target in targets)
+        if not rows:
+            return 0
+        await db.executemany("""
+            INSERT INTO webhook_outbox (app_id, url, event_type, payload, enqueued_at, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        after_commit(lambda: self._published(len(rows)))
+        return len(rows)
+
+    async def _published(self, count: int):
+        self.counters["published"] += count
+        if self.running:
+            self._wakeup.set()
+        else:
+            # The dispatcher lives in the leader worker; nudge it instead of waiting for its next poll
+            await shared_cache.invalidate(["webhooks:pending"])
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        pruned_at = 0.0
+        while True:
+            if time.monotonic() - pruned_at > 60:
+                try:
+                    await self.prune()
+                except Exception as e:
+                    logger.error(f"Webhook outbox prune failed: {e}")
+                pruned_at = time.monotonic()
+            # Cleared before the pass so a batch finishing mid-pass still wakes the next one
+            self._wakeup.clear()
+            try:
+                next_due = await self.dispatch_due()
+            except Exception as e:
+                logger.error(f"Webhook dispatch pass failed: {e}")
+                next_due = None
+
+            timeout = self.poll_seconds
+            if next_due is not None:
+                timeout = min(timeout, max(next_due - time.time(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                # Give a burst of events a moment to accumulate into one batch
+                await asyncio.sleep(self.coalesce)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_due(self) -> Optional[float]:
+        """Start batches for due events; returns when the next waiting event becomes due"""
+        now = time.time()
+        async with read_connection() as db:
+            cursor = await db.execute("""
+                SELECT id, app_id, url, event_type, payload, attempts, enqueued_at
+                FROM webhook_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id
+                LIMIT ?
+            """, (now, SCAN_LIMIT))
+            due = [row for row in await cursor.fetchall() if row['id'] not in self._claimed]
+            cursor = await db.execute(
+                "SELECT MIN(next_attempt_at) AS next_due FROM webhook_outbox WHERE status = 'pending' AND next_attempt_at > ?",
+                (now,)
+            )
+            next_due = (await cursor.fetchone())['next_due']
+
+        by_app: Dict[int, List[Any]] = defaultdict(list)
+        for row in due:
+            by_app[row['app_id']].append(row)
+
+        for app_id, rows in by_app.items():
+            while rows and self._app_inflight[app_id] < self.per_app and len(self._deliveries) < self.workers:
+                # One batch per URL; an app's webhook may have changed between events
+                url = rows[0]['url']
+                batch = [row for row in rows if row['url'] == url][:self.batch_size]
+                batch_ids = {row['id'] for row in batch}
+                rows = [row for row in rows if row['id'] not in batch_ids]
+                self._claimed.update(batch_ids)
+                self._app_inflight[app_id] += 1
+                task = asyncio.create_task(self._deliver(app_id, url, batch))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+        # Events left behind by the concurrency limits go out when a batch finishes and wakes the loop
+        return next_due
+
+    async def _deliver(self, app_id: int, url: str, batch: List[Any]):
+        ids = [row['id'] for row in batch]
+        try:
+            body = json.dumps({
+                "events": [
+                    {"id": row['id'], "type": row['event_type'], "payload": json.loads(row['payload']),
+                     "enqueued_at": datetime.utcfromtimestamp(row['enqueued_at']).isoformat() + "Z"}
+                    for row in batch
+                ]
+            }, separators=(",", ":")).encode("utf-8")
+
+            started = time.monotonic()
+            error = None
+            try:
+                response = await get_http_client().post(url, content=body, timeout=WEBHOOK_TIMEOUT_SECONDS, headers={
+                    "Content-Type": "application/json",
+                    "X-Webhook-Batch-Size": str(len(batch)),
+                })
+                if response.status_code >= 300:
+                    error = f"HTTP {response.status_code}"
+            except Exception as e:
+                # Not only httpx.HTTPError: a malformed webhook URL raises httpx.InvalidURL
+                error = f"{type(e).__name__}: {e}"
+            self._post_latency.append(time.monotonic() - started)
+
+            if error is None:
+                await self._mark_delivered(ids, batch)
+            else:
+                await self._mark_failed(app_id, ids, batch, error)
+        except Exception as e:
+            logger.error(f"Failed to record webhook outcome for app {app_id}: {e}")
+        finally:
+            self._claimed.difference_update(ids)
+            self._app_inflight[app_id] -= 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _mark_delivered(self, ids: List[int], batch: List[Any]):
+        now = time.time()
+        async with write_connection() as db:
+            await db.execute(f"""
+                UPDATE webhook_outbox SET status = 'delivered', attempts = attempts + 1,
+                    delivered_at = ?, last_error = NULL
+                WHERE id IN ({', '.join('?' for _ in ids)})
+            """, [now, *ids])
+        self._event_latency.extend(now - row['enqueued_at'] for row in batch)
+        self.counters["delivered"] += len(ids)
+        self.counters["batches"] += 1
+
+    async def _mark_failed(self, app_id: int, ids: List[int], batch: List[Any], error: str):
+        # Every event in a batch shares the attempt count of its oldest member
+        attempts = max(row['attempts'] for row in batch) + 1
+        self.counters["failed_attempts"] += 1
+        if attempts >= self.max_attempts:
+            status, next_attempt = "dead", None
+            self.counters["dead"] += len(ids)
+            logger.error(f"Webhook batch of {len(ids)} events to app {app_id} dead-lettered after {attempts} attempts: {error}")
+        else:
+            # Full jitter so a recovering receiver is not hit by every app at once
+            delay = random.uniform(0, min(self.retry_max, self.retry_base * (2 ** attempts)))
+            status, next_attempt = "pending", time.time() + delay
+            logger.warning(f"Webhook batch to app {app_id} failed ({error}), attempt {attempts}, retry in {delay:.1f}s")
+        async with write_connection() as db:
+            await db.execute(f"""
+                UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+                    last_error = ?
+                WHERE id IN ({', '.join('?' for _ in ids)})
+            """, [status, attempts, next_attempt, error, *ids])
+
+    async def prune(self):
+        """Drop delivered events older than the retention window"""
+        async with write_connection() as db:
+            await db.execute(
+                "DELETE FROM webhook_outbox WHERE status = 'delivered' AND delivered_at < ?",
+                (time.time() - WEBHOOK_RETAIN_DELIVERED_SECONDS,)
+            )
+
+    async def retry_dead(self, app_id: Optional[int] = None) -> int:
+        """Move dead events back to pending for immediate delivery"""
+        async with write_connection() as db:
+            cursor = await db.execute("""
+                UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = ?
+                WHERE status = 'dead' AND (? IS NULL OR app_id = ?)
+            """, (time.time(), app_id, app_id))
+            count = cursor.rowcount
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    async def stats(self) -> Dict[str, Any]:
+        """Outbox depth by state plus delivery counters and latency percentiles in milliseconds"""
+        async with read_connection() as db:
+            cursor = await db.execute("SELECT status, COUNT(*) AS count FROM webhook_outbox GROUP BY status")
+            depth = {row['status']: row['count'] for row in await cursor.fetchall()}
+            cursor = await db.execute(
+                "SELECT MIN(enqueued_at) AS oldest FROM webhook_outbox WHERE status = 'pending'"
+            )
+            oldest = (await cursor.fetchone())['oldest']
+        return {
+            **self.counters,
+            "queue_depth": {state: depth.get(state, 0) for state in ("pending", "delivered", "dead")},
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+            "in_flight_batches": len(self._deliveries),
+            "in_flight_by_app": {app: count for app, count in self._app_inflight.items() if count},
+            "event_latency_ms": percentiles(self._event_latency),
+            "post_latency_ms": percentiles(self._post_latency),
+            "running": self.running,
+        }
+
+webhook_dispatcher = WebhookDispatcher()
+
+registry.gauge("authcenter_webhook_batches_in_flight", "Webhook batch POSTs in progress",
+               collect=lambda: len(webhook_dispatcher._deliveries))
+registry.counter("authcenter_webhook_events_total", "Webhook outbox events by outcome", ["outcome"],
+                 collect=lambda: {(k,): webhook_dispatcher.counters[k]
+                                  for k in ("published", "delivered", "failed_attempts", "dead")})
+
+shared_cache.subscribe("webhooks:", lambda keys: webhook_dispatcher.wake())
+
+async def notify_apps(db: aiosqlite.Connection, event_type: str, payload: Dict[str, Any],
+                      app_id: Optional[int] = None):
+    """Queue a webhook event from a request handler, inside its write transaction
+
+    Call it in the handler's write_connection() block, with that block's connection.
+    An outbox failure raises and rolls the change back with it, so no committed
+    change goes without its event.
+    """
+    if WEBHOOKS_ENABLED:
+        await webhook_dispatcher.enqueue(db, [(event_type, payload, app_id)])
+
+async def notify_apps_many(db: aiosqlite.Connection, events: List[Tuple[str, Dict[str, Any], Optional[int]]]):
+    """notify_apps for a batch of (event_type, payload, app_id) events"""
+    if WEBHOOKS_ENABLED and events:
+        await webhook_dispatcher.enqueue(db, events)
@@ -0,0 +1,114 @@
+"""Latency of /api/admin/apps/search on a large synthetic app catalog, checked against a p99 budget.
+
+Run from backend-python/:  python -m benchmarks.app_search [--apps 50000] [--db catalog.db] [--budget-ms 100]
+
+Without --db a catalog of --apps apps (other tables minimal) is generated into
+a temporary directory; the search index is filled by its triggers as the rows
+go in. Each query shape gets --warmup requests, then --requests at
+--concurrency over ASGI, like benchmarks.routers. Any shape whose p99 exceeds
+--budget-ms makes the exit status 1.
+
+The budget is per request, so requests run one at a time by default: at
+higher concurrency on few cores p99 measures queueing. Ranking is the cost
+that grows with the match set; a 2-letter prefix can match every app.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.dataset import APP_WORDS, APP_DATA_TYPES, generate
+from benchmarks.routers import Scenario, measure, print_row
+
+
+def scenarios() -> list:
+    def word(rng):
+        return rng.choice(APP_WORDS)
+
+    def search(query):
+        return lambda rng, user: f"/api/admin/apps/search?{query(rng)}"
+
+    return [
+        Scenario("search", "prefix_2", "GET", search(lambda rng: f"q={word(rng)[:2]}")),
+        Scenario("search", "prefix_4", "GET", search(lambda rng: f"q={word(rng)[:4]}")),
+        Scenario("search", "word", "GET", search(lambda rng: f"q={word(rng)}")),
+        Scenario("search", "two_words", "GET", search(lambda rng: f"q={word(rng)}+{word(rng)[:3]}")),
+        Scenario("search", "app_number", "GET", search(lambda rng: f"q={rng.randint(1, 50_000)}")),
+        Scenario("search", "capability", "GET",
+                 search(lambda rng: f"q={word(rng)}&capability={rng.choice(APP_DATA_TYPES)}&status=active")),
+        Scenario("search", "page_5", "GET", search(lambda rng: f"q={word(rng)[:3]}&limit=20&offset=80")),
+        Scenario("search", "count", "GET", search(lambda rng: f"q={word(rng)}&count=true")),
+        Scenario("search", "no_match", "GET", search(lambda rng: "q=zzzzqx")),
+    ]
+
+
+async def run(args, selected: list) -> dict:
+    from main import app
+
+    rng = random.Random(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in selected:
+                await measure(client, scenario, {0: None}, rng, args.warmup, args.concurrency)
+                result = await measure(client, scenario, {0: None}, rng, args.requests, args.concurrency)
+                results[scenario.name] = result
+                print_row(scenario.router, scenario.name, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="existing database to search (default: generate one)")
+    parser.add_argument("--apps", type=int, default=50_000, help="catalog size when generating")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per query shape")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="p99 each query shape must stay under")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    path = args.db
+    if path is None:
+        path = os.path.join(workdir.name, "catalog.db")
+        start = time.perf_counter()
+        generate(path, {"users": 100, "connections": 100, "audit_logs": 100, "apps": args.apps, "mappings": 100},
+                 seed=args.seed)
+        print(f"Generated {args.apps} apps in {time.perf_counter() - start:.1f}s")
+    os.environ.update({
+        "DATABASE_PATH": path,
+        "AUDIT_ARCHIVE_DIR": os.path.join(workdir.name, "audit_archive"),
+        "AUDIT_RETENTION_DAYS": "0",
+        "WEBHOOKS_ENABLED": "false",
+        "TOKEN_REFRESH_ENABLED": "false",
+    })
+    db = sqlite3.connect(path)
+    apps, indexed = db.execute(
+        "SELECT (SELECT COUNT(*) FROM internal_apps), (SELECT COUNT(*) FROM internal_apps_fts)").fetchone()
+    db.close()
+    print(f"internal_apps: {apps}, indexed: {indexed}, p99 budget: {args.budget_ms:.0f} ms")
+    print(f"{'router':<12} {'scenario':<14} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    try:
+        results = asyncio.run(run(args, scenarios()))
+    finally:
+        workdir.cleanup()
+
+    over = [name for name, result in results.items() if result["p99_ms"] > args.budget_ms or result["errors"]]
+    for name in over:
+        r = results[name]
+        print(f"FAILED {name}: p99 {r['p99_ms']:.2f} ms, {r['errors']} errors")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
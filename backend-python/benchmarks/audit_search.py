@@ -0,0 +1,184 @@
+"""Latency of /api/admin/logs/search on a multi-million-row audit log, checked against a p99 budget.
+
+Run from backend-python/:  python -m benchmarks.audit_search [--audit-logs 2000000] [--db bench.db] [--plans]
+
+Without --db a database of the medium scale with --audit-logs audit rows is
+generated into a temporary directory (that takes minutes; reuse one with
+--db). Each filter shape gets --warmup requests, then --requests one at a
+time over ASGI, like benchmarks.routers; "deep" shapes start from a cursor at
+a random point in the log. --plans prints the query plan of each shape. Any
+shape whose p99 exceeds --budget-ms makes the exit status 1.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import httpx
+
+from benchmarks.dataset import AUDIT_ACTIONS, SCALES, generate
+from benchmarks.routers import Scenario, measure, print_row
+
+
+def scenarios(db: sqlite3.Connection) -> list:
+    from app.pagination import encode_cursor
+
+    users, connections = (db.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+                          for table in ("users", "connections"))
+    oldest, newest, max_id = db.execute("SELECT MIN(created_at), MAX(created_at), MAX(id) FROM audit_logs").fetchone()
+    start = datetime.strptime(oldest, "%Y-%m-%d %H:%M:%S")
+    span = (datetime.strptime(newest, "%Y-%m-%d %H:%M:%S") - start).total_seconds()
+
+    def moment(rng, days_back: float = 0) -> str:
+        return (start + timedelta(seconds=rng.uniform(days_back * 86400, span))).strftime("%Y-%m-%d %H:%M:%S")
+
+    def user(rng) -> int:
+        return rng.randint(1, users)
+
+    def search(params):
+        return lambda rng, _: f"/api/admin/logs/search?{urlencode(params(rng))}"
+
+    def deep(params):
+        return search(lambda rng: {**params(rng), "cursor": encode_cursor(moment(rng), max_id + 1)})
+
+    def day(rng) -> dict:
+        since = moment(rng, 1)
+        until = (datetime.strptime(since, "%Y-%m-%d %H:%M:%S") + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+        return {"since": since, "until": until}
+
+    return [
+        Scenario("search", "unfiltered", "GET", search(lambda rng: {})),
+        Scenario("search", "deep", "GET", deep(lambda rng: {})),
+        Scenario("search", "action", "GET", search(lambda rng: {"action": rng.choice(AUDIT_ACTIONS)})),
+        Scenario("search", "action_deep", "GET", deep(lambda rng: {"action": rng.choice(AUDIT_ACTIONS)})),
+        Scenario("search", "actions_2", "GET",
+                 search(lambda rng: {"action": ",".join(rng.sample(AUDIT_ACTIONS, 2))})),
+        Scenario("search", "user", "GET", search(lambda rng: {"user_id": user(rng)})),
+        Scenario("search", "user_email", "GET",
+                 search(lambda rng: {"user_email": f"user{user(rng)}@bench.example"})),
+        Scenario("search", "ip", "GET",
+                 search(lambda rng: {"ip": f"172.16.0.{rng.randrange(256)}"})),
+        Scenario("search", "resource", "GET",
+                 search(lambda rng: {"resource": f"connection:{rng.randint(1, connections)}"})),
+        Scenario("search", "day", "GET", search(day)),
+        Scenario("search", "day_action", "GET",
+                 search(lambda rng: {**day(rng), "action": rng.choice(AUDIT_ACTIONS)})),
+        Scenario("search", "user_action", "GET",
+                 search(lambda rng: {"user_id": user(rng), "action": rng.choice(AUDIT_ACTIONS)})),
+        Scenario("search", "text_rare", "GET",
+                 search(lambda rng: {"q": f"connection:{rng.randint(1, connections)}"})),
+        Scenario("search", "text_common", "GET", search(lambda rng: {"q": "google"})),
+        Scenario("search", "text_deep", "GET", deep(lambda rng: {"q": "google"})),
+        Scenario("search", "text_action", "GET",
+                 search(lambda rng: {"q": "gmail", "action": "data_synced"})),
+        Scenario("search", "text_day", "GET", search(lambda rng: {**day(rng), "q": "deleted"})),
+        Scenario("search", "text_user", "GET",
+                 search(lambda rng: {"q": "google", "user_id": user(rng)})),
+        Scenario("search", "text_prefix", "GET", search(lambda rng: {"q": f"user{user(rng)}*"})),
+        Scenario("search", "text_disjoint", "GET",
+                 search(lambda rng: {"q": "google", "action": "mapping_created"})),
+        Scenario("search", "no_match", "GET", search(lambda rng: {"q": "zzzzqx"})),
+    ]
+
+
+def print_plans(db: sqlite3.Connection, selected: list, rng: random.Random):
+    """Plan of each shape's main statement: the page query, or a scan's candidate query"""
+    from urllib.parse import urlsplit, parse_qs
+    from app.audit_search import AUDIT_SEARCH_MATCH_CAP, COLLECT_MATCHES_SQL, build_search_query, match_expression
+
+    for scenario in selected:
+        params = {key: values[0] for key, values in parse_qs(urlsplit(scenario.path(rng, 0)).query).items()}
+        filters = {"actions": params["action"].split(",") if "action" in params else None,
+                   "user_id": int(params["user_id"]) if "user_id" in params else None,
+                   "user_email": params.get("user_email"), "resource": params.get("resource"),
+                   "ip": params.get("ip"), "since": params.get("since"), "until": params.get("until")}
+        match, ids, strategy = None, None, ""
+        if "q" in params:
+            match, prefix = match_expression(params["q"], filters["actions"])
+            count, id_list = db.execute(COLLECT_MATCHES_SQL, (match, AUDIT_SEARCH_MATCH_CAP)).fetchone()
+            ids = [int(row_id) for row_id in id_list.split(",")] if id_list else []
+            if count < AUDIT_SEARCH_MATCH_CAP:
+                match, strategy = None, f" ({count} ids)"
+            elif prefix:
+                ids, strategy = None, " (prefix)"
+            else:
+                match, ids, strategy = None, None, " (scan)"
+        sql, args = build_search_query(match=match, ids=ids, **filters)
+        print(f"{scenario.name}{strategy}:")
+        for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", args):
+            print(f"    {row[3]}")
+
+
+async def run(args, selected: list) -> dict:
+    from main import app
+
+    rng = random.Random(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in selected:
+                await measure(client, scenario, {0: None}, rng, args.warmup, 1)
+                result = await measure(client, scenario, {0: None}, rng, args.requests, 1)
+                results[scenario.name] = result
+                print_row(scenario.router, scenario.name, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="existing database to search (default: generate one)")
+    parser.add_argument("--audit-logs", type=int, default=2_000_000, help="audit rows when generating")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per filter shape")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--budget-ms", type=float, default=100.0, help="p99 each filter shape must stay under")
+    parser.add_argument("--scenario", action="append", help="only run these shapes (repeatable)")
+    parser.add_argument("--plans", action="store_true", help="print each shape's query plan first")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    path = args.db
+    if path is None:
+        path = os.path.join(workdir.name, "audit.db")
+        start = time.perf_counter()
+        generate(path, {**SCALES["medium"], "audit_logs": args.audit_logs}, seed=args.seed)
+        print(f"Generated {args.audit_logs} audit logs in {time.perf_counter() - start:.1f}s")
+    os.environ.update({
+        "DATABASE_PATH": path,
+        "AUDIT_ARCHIVE_DIR": os.path.join(workdir.name, "audit_archive"),
+        "AUDIT_RETENTION_DAYS": "0",
+        "WEBHOOKS_ENABLED": "false",
+        "TOKEN_REFRESH_ENABLED": "false",
+    })
+
+    db = sqlite3.connect(path)
+    selected = [s for s in scenarios(db) if not args.scenario or s.name in args.scenario]
+    if args.plans:
+        print_plans(db, selected, random.Random(args.seed))
+    logs = db.execute("SELECT COUNT(*) FROM audit_logs").fetchone()[0]
+    db.close()
+    print(f"audit_logs: {logs}, p99 budget: {args.budget_ms:.0f} ms")
+    print(f"{'router':<12} {'scenario':<14} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    try:
+        results = asyncio.run(run(args, selected))
+    finally:
+        workdir.cleanup()
+
+    over = [name for name, result in results.items() if result["p99_ms"] > args.budget_ms or result["errors"]]
+    for name in over:
+        r = results[name]
+        print(f"FAILED {name}: p99 {r['p99_ms']:.2f} ms, {r['errors']} errors")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Synthetic database for the benchmarks: users, connections, audit logs, apps and mappings.
+
+Run from backend-python/:  python -m benchmarks.dataset --out bench-large.db [--scale large]
+
+The schema comes from init_database(), so the file matches what the server
+creates, migrations included. Rows are then bulk inserted with the stdlib
+sqlite3 driver in created_at order, spread over the last --days days so audit
+retention leaves them alone, and ANALYZE refreshes the planner statistics.
+Generation is deterministic for a given --seed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    "small": {"users": 1_000, "connections": 10_000, "audit_logs": 50_000, "apps": 50, "mappings": 500},
+    "medium": {"users": 10_000, "connections": 100_000, "audit_logs": 500_000, "apps": 200, "mappings": 2_000},
+    "large": {"users": 100_000, "connections": 1_000_000, "audit_logs": 5_000_000, "apps": 500, "mappings": 5_000},
+}
+
+BATCH_SIZE = 50_000
+SERVICES = ("gmail", "calendar")
+APP_WORDS = ("analytics", "billing", "calendar", "campaign", "content", "crm", "directory", "docs",
+             "finance", "helpdesk", "hiring", "inventory", "ledger", "marketing", "newsletter", "payroll",
+             "planner", "portal", "reporting", "scheduler", "support", "survey", "travel", "wiki")
+APP_DATA_TYPES = ("email", "calendar", "contacts", "files", "tasks")
+APP_OPERATIONS = ("read", "sync", "publish", "write")
+AUDIT_ACTIONS = ("oauth_connected", "connection_deleted", "user_logout", "data_synced",
+                 "mapping_created", "mapping_updated", "app_registered")
+
+
+def timestamps(rng: random.Random, count: int, days: int):
+    """count ascending 'YYYY-MM-DD HH:MM:SS' timestamps within the last days days"""
+    start = datetime.utcnow() - timedelta(days=days)
+    span = days * 86400
+    for offset in sorted(rng.randrange(span) for _ in range(count)):
+        yield (start + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def batched(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(db: sqlite3.Connection, sql: str, rows) -> int:
+    count = 0
+    for batch in batched(rows):
+        db.executemany(sql, batch)
+        db.commit()
+        count += len(batch)
+    return count
+
+
+def user_rows(rng, counts, days):
+    for i, created_at in enumerate(timestamps(rng, counts["users"], days), start=1):
+        yield (f"user{i}@bench.example", f"Bench User {i}", None, created_at, created_at)
+
+
+def connection_rows(rng, counts, days, provider_id):
+    users = counts["users"]
+    expires = (datetime.utcnow() + timedelta(days=30)).strftime("%Y-%m-%d %H:%M:%S")
+    for i, created_at in enumerate(timestamps(rng, counts["connections"], days)):
+        user_id = i % users + 1
+        # Every user's first connection is active; older re-authorizations are revoked
+        status = "active" if i < users else rng.choice(("revoked", "revoked", "expired"))
+        yield (user_id, provider_id, f"ext-{i}", f"at-{i}", f"rt-{i}", expires,
+               "email,profile", json.dumps({"email": f"user{user_id}@bench.example"}), status,
+               created_at, created_at)
+
+
+def audit_event(rng, action, user_id, counts):
+    """resource and details in the shape the routes write them"""
+    if action in ("oauth_connected", "connection_deleted", "data_synced"):
+        connection_id = rng.randint(1, counts["connections"])
+        if action == "data_synced":
+            details = json.dumps({"service": rng.choice(SERVICES), "records": rng.randint(1, 500)})
+        elif action == "oauth_connected":
+            details = f"Connected google account user{user_id}@bench.example"
+        else:
+            details = f"Deleted google connection {connection_id}"
+        return f"connection:{connection_id}", details
+    if action in ("mapping_created", "mapping_updated"):
+        mapping_id = rng.randint(1, counts["mappings"])
+        verb = "Created" if action == "mapping_created" else "Updated"
+        return f"mapping:{mapping_id}", f"{verb} mapping {rng.choice(SERVICES)} -> {rng.choice(APP_WORDS)}"
+    if action == "app_registered":
+        name = f"bench-app-{rng.randint(1, counts['apps'])}"
+        return f"internal_app:{name}", f"Registered new app: {rng.choice(APP_WORDS).title()} ({name})"
+    return f"user:{user_id}", f"User user{user_id}@bench.example logged out"
+
+
+def audit_rows(rng, counts, days):
+    users = counts["users"]
+    for created_at in timestamps(rng, counts["audit_logs"], days):
+        action = rng.choice(AUDIT_ACTIONS)
+        user_id = rng.randint(1, users)
+        resource, details = audit_event(rng, action, user_id, counts)
+        # Users mostly come from their own address, sometimes from a shared one
+        ip_address = f"10.{user_id // 65536 % 256}.{user_id // 256 % 256}.{user_id % 256}" \
+            if rng.random() < 0.9 else f"172.16.0.{rng.randrange(256)}"
+        yield (user_id, action, resource, details, ip_address, "bench/1.0", created_at)
+
+
+def app_rows(rng, counts, days):
+    for i, created_at in enumerate(timestamps(rng, counts["apps"], days), start=1):
+        name = f"bench-app-{i}"
+        words = rng.sample(APP_WORDS, 3)
+        data_types = rng.sample(APP_DATA_TYPES, rng.randint(1, 3))
+        manifest = {"pcarp_version": "1.0", "app": {"name": name, "type": "internal", "version": "1.0.0"},
+                    "capabilities": {"data_types": data_types,
+                                     "operations": rng.sample(APP_OPERATIONS, rng.randint(1, 3))}}
+        endpoints = {"sync": f"https://{name}.bench.example/sync", "health": f"https://{name}.bench.example/health"}
+        # One app in ten is retired, so status filters have something to drop
+        status = "inactive" if rng.random() < 0.1 else "active"
+        yield (name, f"{words[0].title()} {words[1].title()} {i}",
+               f"Synthetic {words[2]} app {i} handling {' and '.join(data_types)}", None,
+               json.dumps(endpoints), json.dumps(manifest), status, created_at)
+
+
+def mapping_rows(rng, counts, days, app_ids):
+    users = counts["users"]
+    for created_at in timestamps(rng, counts["mappings"], days):
+        config = {"fields": ["id", "subject", "date"], "batch_size": rng.choice((50, 100, 200))}
+        yield (rng.choice(SERVICES), rng.choice(app_ids), rng.randint(1, users), json.dumps(config),
+               "active", created_at, created_at)
+
+
+async def create_schema():
+    from app.database import init_database, close_database
+    await init_database()
+    await close_database()
+
+
+def generate(path: str, counts: dict, days: int = 60, seed: int = 1) -> dict:
+    """Create the schema at path and fill it with counts rows per table; returns the row counts"""
+    # app.database reads DATABASE_PATH at import time
+    os.environ["DATABASE_PATH"] = path
+    asyncio.run(create_schema())
+
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA synchronous = OFF")
+    # Room for the index builds and FTS merges; the default 2 MB cache rereads pages from disk
+    db.execute("PRAGMA cache_size = -262144")
+    try:
+        provider_id = db.execute("SELECT id FROM providers WHERE name = 'google'").fetchone()[0]
+        inserted = {}
+        inserted["users"] = insert(db, """
+            INSERT INTO users (email, name, avatar_url, created_at, updated_at) VALUES (?, ?, ?, ?, ?)
+        """, user_rows(rng, counts, days))
+        inserted["connections"] = insert(db, """
+            INSERT INTO connections (user_id, provider_id, external_id, access_token, refresh_token,
+                                     expires_at, scopes, metadata, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, connection_rows(rng, counts, days, provider_id))
+        # The audit search indexes take keys in random order: load without them, then build them
+        # with their migration's statements, as a server upgrading an existing log would
+        from app.audit_search import AUDIT_SEARCH_SCHEMA_SQL, REBUILD_AUDIT_SEARCH_SQL
+        deferred = db.execute("""
+            SELECT type, name FROM sqlite_master
+            WHERE tbl_name = 'audit_logs' AND (name LIKE 'trg_audit_logs_fts_%'
+                  OR (type = 'index' AND name LIKE 'idx_audit_logs_%' AND name != 'idx_audit_logs_created_at'))
+        """).fetchall()
+        for kind, name in deferred:
+            db.execute(f"DROP {kind.upper()} {name}")
+        inserted["audit_logs"] = insert(db, """
+            INSERT INTO audit_logs (user_id, action, resource, details, ip_address, user_agent, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, audit_rows(rng, counts, days))
+        for statement in AUDIT_SEARCH_SCHEMA_SQL + REBUILD_AUDIT_SEARCH_SQL:
+            db.execute(statement)
+        db.commit()
+        inserted["apps"] = insert(db, """
+            INSERT INTO internal_apps (name, display_name, description, logo_url, api_endpoints,
+                                       manifest_data, status, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, app_rows(rng, counts, days))
+        app_ids = [row[0] for row in db.execute("SELECT id FROM internal_apps")]
+        inserted["mappings"] = insert(db, """
+            INSERT INTO app_mappings (external_service, internal_app_id, user_id, mapping_config,
+                                      status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, mapping_rows(rng, counts, days, app_ids))
+        # Planner statistics as a maintained database would have them, not those of the empty schema
+        db.execute("ANALYZE")
+        db.commit()
+    finally:
+        db.close()
+    return inserted
+
+
+def scale_counts(args) -> dict:
+    counts = dict(SCALES[args.scale])
+    for table in counts:
+        if getattr(args, table) is not None:
+            counts[table] = getattr(args, table)
+    return counts
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for table in SCALES["small"]:
+        parser.add_argument(f"--{table.replace('_', '-')}", dest=table, type=int, help=f"override the {table} count")
+    parser.add_argument("--days", type=int, default=60, help="spread created_at over this many days")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", required=True, help="database file to create")
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.out):
+        parser.error(f"{args.out} already exists")
+
+    start = time.perf_counter()
+    inserted = generate(args.out, scale_counts(args), args.days, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{'table':<12} {'rows':>10}")
+    for table, count in inserted.items():
+        print(f"{table:<12} {count:>10}")
+    print(f"{args.out}: {os.path.getsize(args.out) / 1e6:.1f} MB in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Old vs new serialization of a large list response (internal apps with JSON columns).
+
+Run from backend-python/:  python -m benchmarks.json_responses [--rows N] [--rounds N]
+
+old:  dict(row) + json.loads per JSON column, then what FastAPI does with a
+      returned dict: jsonable_encoder and JSONResponse.
+new:  row_to_dict through the JSON column decode cache, rendered by
+      FastJSONResponse. "cold" clears the cache before every round, "warm"
+      keeps it (the steady state for rows that did not change), per backend.
+
+The decode cache is sized for up to 50k rows unless JSON_DECODE_CACHE_SIZE is
+set: an LRU smaller than a listing it scans in order misses on every row.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+os.environ.setdefault("JSON_DECODE_CACHE_SIZE", "100000")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import serialization
+from app.serialization import FastJSONResponse, row_to_dict, decode_json, APP_JSON_COLUMNS
+
+
+def make_rows(count: int) -> list:
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.execute("""
+        CREATE TABLE internal_apps (id INTEGER PRIMARY KEY, name TEXT, display_name TEXT, description TEXT,
+                                    logo_url TEXT, api_endpoints TEXT, manifest_data TEXT, status TEXT, created_at TEXT)
+    """)
+    rows = []
+    for i in range(count):
+        endpoints = {"sync": f"https://app{i}.example/sync", "webhook": f"https://app{i}.example/hook",
+                     "health": f"https://app{i}.example/health"}
+        manifest = {"pcarp_version": "1.0",
+                    "app": {"name": f"app-{i}", "type": "internal", "version": "1.0.0", "developer": "Bench Ltd"},
+                    "authentication": {"required_scopes": ["email.read", "calendar.read"],
+                                       "callback_urls": [f"https://app{i}.example/callback"]},
+                    "capabilities": {"data_types": ["email", "calendar"], "operations": ["read", "sync"],
+                                     "realtime": i % 2 == 0}}
+        rows.append((f"app-{i}", f"App {i}", f"Benchmark app number {i}", None,
+                     json.dumps(endpoints), json.dumps(manifest), "active", "2025-07-22 10:00:00"))
+    db.executemany("""
+        INSERT INTO internal_apps (name, display_name, description, logo_url, api_endpoints, manifest_data,
+                                   status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return db.execute("SELECT * FROM internal_apps ORDER BY display_name").fetchall()
+
+
+def old_path(rows) -> bytes:
+    apps = []
+    for row in rows:
+        app = dict(row)
+        if app['api_endpoints']:
+            app['api_endpoints'] = json.loads(app['api_endpoints'])
+        if app['manifest_data']:
+            app['manifest_data'] = json.loads(app['manifest_data'])
+        apps.append(app)
+    return JSONResponse(jsonable_encoder({"apps": apps})).body
+
+
+def new_path(rows) -> bytes:
+    return FastJSONResponse({"apps": [row_to_dict(row, APP_JSON_COLUMNS) for row in rows]}).body
+
+
+def timed(fn, rows, rounds: int, before=None) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=5, help="best of N")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    baseline = timed(old_path, rows, args.rounds)
+    expected = json.loads(old_path(rows))
+    print(f"{args.rows} rows, best of {args.rounds}")
+    print(f"{'path':<22} {'ms':>8} {'speedup':>8} {'bytes':>10} {'cache hits':>11}")
+    print(f"{'old':<22} {baseline * 1000:>8.1f} {1:>7.2f}x {len(old_path(rows)):>10} {'-':>11}")
+
+    for backend in serialization.JSON_BACKENDS:
+        try:
+            serialization.json_backend = serialization.load_json_backend(backend)
+        except Exception:
+            continue
+        if serialization.json_backend.name != backend:
+            continue
+        decode_json.cache_clear()
+        body = new_path(rows)
+        assert json.loads(body) == expected, f"{backend} output differs from the old path"
+        for label, before in (("cold", decode_json.cache_clear), ("warm", None)):
+            elapsed = timed(new_path, rows, args.rounds, before)
+            info = decode_json.cache_info()
+            hits = info.hits / (info.hits + info.misses)
+            print(f"{'new ' + backend + ' ' + label:<22} {elapsed * 1000:>8.1f} {baseline / elapsed:>7.2f}x "
+                  f"{len(body):>10} {hits:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
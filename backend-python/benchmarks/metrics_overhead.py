@@ -0,0 +1,96 @@
+"""Per-request and per-statement cost of the metrics instrumentation.
+
+Run from backend-python/:  python -m benchmarks.metrics_overhead [--requests N] [--statements N]
+
+Calls a trivial ASGI app directly, with and without MetricsMiddleware, and runs
+a primary-key SELECT on a plain and a timed aiosqlite connection. Plain and
+instrumented rounds alternate and the medians are compared, so drift on a busy
+machine cancels out. The difference is what instrumentation adds per call.
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import aiosqlite
+
+from app.database import TimedConnection
+from app.metrics import MetricsMiddleware, exposition
+
+
+class FakeRoute:
+    path = "/bench/{item_id}"
+
+
+async def endpoint(scope, receive, send):
+    scope["route"] = FakeRoute
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def requests_per_call(app, count: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await app({"type": "http", "method": "GET", "path": "/bench/1"}, receive, send)
+    return (time.perf_counter() - start) / count
+
+
+async def statements_per_call(conn: aiosqlite.Connection, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        cursor = await conn.execute("SELECT id, name FROM items WHERE id = ?", (i % 100 + 1,))
+        await cursor.fetchone()
+    return (time.perf_counter() - start) / count
+
+
+async def compare(plain, instrumented, count: int, rounds: int = 10):
+    """Median per-call time of each, from alternating rounds of count/rounds calls"""
+    a, b = [], []
+    for _ in range(rounds):
+        a.append(await plain(count // rounds))
+        b.append(await instrumented(count // rounds))
+    return sorted(a)[rounds // 2], sorted(b)[rounds // 2]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--statements", type=int, default=20_000)
+    args = parser.parse_args()
+
+    middleware = MetricsMiddleware(endpoint)
+    plain, timed = await compare(lambda n: requests_per_call(endpoint, n),
+                                 lambda n: requests_per_call(middleware, n), args.requests)
+    print(f"{'what':<10} {'plain us':>9} {'instrumented us':>16} {'added us':>9}")
+    print(f"{'request':<10} {plain * 1e6:>9.2f} {timed * 1e6:>16.2f} {(timed - plain) * 1e6:>9.2f}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "bench.db")
+        with sqlite3.connect(path) as db:
+            db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+            db.executemany("INSERT INTO items (name) VALUES (?)", [(f"item {i}",) for i in range(100)])
+        conn = await aiosqlite.connect(path)
+        timed_conn = await TimedConnection(lambda: sqlite3.connect(path), 64)
+        try:
+            plain, timed = await compare(lambda n: statements_per_call(conn, n),
+                                         lambda n: statements_per_call(timed_conn, n), args.statements)
+        finally:
+            await conn.close()
+            await timed_conn.close()
+    print(f"{'statement':<10} {plain * 1e6:>9.2f} {timed * 1e6:>16.2f} {(timed - plain) * 1e6:>9.2f}")
+
+    start = time.perf_counter()
+    body = exposition()
+    print(f"/metrics render: {(time.perf_counter() - start) * 1000:.2f} ms for {len(body)} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Event-loop latency during a burst of admin password checks.
+
+Run from backend-python/:  python -m benchmarks.password_burst [--burst N]
+
+A ticker coroutine sleeps 5 ms in a loop and records how late it wakes up.
+With bcrypt inline the loop stalls for the whole burst; offloaded to the
+password pool the lag should stay close to the idle baseline.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import bcrypt
+
+from app.passwords import check_password
+
+TICK = 0.005
+
+
+async def ticker(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - start - TICK) * 1000)
+
+
+async def inline_check(password: str, password_hash: str) -> bool:
+    # What verify_admin_password used to do
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+async def measure(check, burst: int, password_hash: str) -> dict:
+    stop = asyncio.Event()
+    lags: list = []
+    tick_task = asyncio.create_task(ticker(stop, lags))
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*[check("De7au!t", password_hash) for _ in range(burst)])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await tick_task
+    assert all(results)
+    lags.sort()
+    return {
+        "elapsed_s": elapsed,
+        "lag_p50_ms": statistics.median(lags),
+        "lag_p99_ms": lags[int(len(lags) * 0.99) - 1] if len(lags) > 1 else lags[-1],
+        "lag_max_ms": lags[-1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst", type=int, default=16, help="concurrent password checks")
+    args = parser.parse_args()
+
+    password_hash = bcrypt.hashpw(b"De7au!t", bcrypt.gensalt()).decode('utf-8')
+
+    print(f"{'mode':<10} {'elapsed s':>10} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for name, check in (("inline", inline_check), ("offloaded", check_password)):
+        r = await measure(check, args.burst, password_hash)
+        print(f"{name:<10} {r['elapsed_s']:>10.2f} {r['lag_p50_ms']:>11.2f} "
+              f"{r['lag_p99_ms']:>11.2f} {r['lag_max_ms']:>11.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,253 @@
+"""Per-router latency and throughput of the FastAPI app, driven in-process over ASGI.
+
+Run from backend-python/:  python -m benchmarks.routers [--db bench.db | --scale small] [--output results.json]
+                           python -m benchmarks.routers --db bench.db --baseline results.json [--threshold 0.2]
+
+Without --db a dataset of --scale is generated into a temporary directory (see
+benchmarks/dataset.py; build large ones once and pass --db). The app runs with
+its normal lifespan against that database, background jobs and webhooks off.
+Every scenario gets --warmup requests, then --requests at --concurrency, and
+reports req/s and p50/p95/p99. Write scenarios (mapping create/update, logout)
+add rows, so reuse a --db copy if runs must be comparable.
+
+--output saves the results as JSON. --baseline compares against an earlier
+file: a scenario regresses when its p95 grows, or its req/s drops, by more than
+--threshold (a fraction); any regression makes the exit status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+import httpx
+
+from benchmarks.dataset import add_dataset_arguments, generate, scale_counts
+
+ROUTERS = ("auth", "providers", "connections", "api", "admin", "mapping")
+OK_STATUSES = (200, 304)
+
+
+class Scenario(NamedTuple):
+    router: str
+    name: str
+    method: str
+    # Both called with (rng, user_id) for the sampled user making the request
+    path: Callable[[random.Random, int], str]
+    body: Optional[Callable[[random.Random, int], dict]] = None
+    auth: bool = False
+
+
+class Fixture(NamedTuple):
+    """Ids sampled from the database that the scenarios address"""
+    user_ids: list
+    connections: dict
+    mapping_ids: list
+    app_ids: list
+
+
+def load_fixture(path: str, sample: int = 1000) -> Fixture:
+    db = sqlite3.connect(path)
+    try:
+        user_ids = [row[0] for row in db.execute("""
+            SELECT user_id FROM connections WHERE status = 'active' GROUP BY user_id ORDER BY RANDOM() LIMIT ?
+        """, (sample,))]
+        connections = {}
+        marks = ",".join("?" * len(user_ids))
+        for connection_id, user_id in db.execute(
+                f"SELECT id, user_id FROM connections WHERE user_id IN ({marks})", user_ids):
+            connections.setdefault(user_id, []).append(connection_id)
+        mapping_ids = [row[0] for row in db.execute(
+            "SELECT id FROM app_mappings ORDER BY RANDOM() LIMIT ?", (sample,))]
+        app_ids = [row[0] for row in db.execute("SELECT id FROM internal_apps WHERE status = 'active'")]
+    finally:
+        db.close()
+    return Fixture(user_ids, connections, mapping_ids, app_ids)
+
+
+def scenarios(fixture: Fixture) -> list:
+    return [
+        Scenario("auth", "initiate", "GET", lambda rng, user: "/api/auth/google"),
+        Scenario("auth", "me", "GET", lambda rng, user: "/api/auth/me", auth=True),
+        Scenario("auth", "logout", "POST", lambda rng, user: "/api/auth/logout", auth=True),
+        Scenario("providers", "list", "GET", lambda rng, user: "/api/providers/"),
+        Scenario("providers", "item", "GET", lambda rng, user: "/api/providers/1"),
+        Scenario("connections", "list", "GET", lambda rng, user: "/api/connections/", auth=True),
+        Scenario("connections", "item", "GET",
+                 lambda rng, user: f"/api/connections/{rng.choice(fixture.connections[user])}", auth=True),
+        Scenario("api", "gmail", "GET", lambda rng, user: "/api/v1/data/google/gmail", auth=True),
+        Scenario("api", "calendar", "GET", lambda rng, user: "/api/v1/data/google/calendar", auth=True),
+        Scenario("admin", "logs_offset", "GET", lambda rng, user: f"/api/admin/logs?limit=50&skip={rng.randrange(0, 5000, 50)}"),
+        Scenario("admin", "logs_cursor", "GET", lambda rng, user: "/api/admin/logs?limit=50&mode=cursor&total=approximate"),
+        Scenario("admin", "logs_stats", "GET", lambda rng, user: "/api/admin/logs/stats"),
+        Scenario("admin", "stats", "GET", lambda rng, user: "/api/admin/stats"),
+        Scenario("admin", "apps", "GET", lambda rng, user: "/api/admin/apps"),
+        Scenario("mapping", "internal_apps", "GET", lambda rng, user: "/api/mapping/internal-apps"),
+        Scenario("mapping", "list_offset", "GET", lambda rng, user: f"/api/mapping/list?limit=100&skip={rng.randrange(0, 400, 100)}"),
+        Scenario("mapping", "list_cursor", "GET", lambda rng, user: "/api/mapping/list?limit=100&mode=cursor"),
+        Scenario("mapping", "create", "POST", lambda rng, user: "/api/mapping/create",
+                 body=lambda rng, user: {"external_service": rng.choice(("gmail", "calendar")),
+                                         "internal_app_id": rng.choice(fixture.app_ids),
+                                         "mapping_config": {"fields": ["id", "subject"]}}),
+        Scenario("mapping", "update", "PUT", lambda rng, user: f"/api/mapping/{rng.choice(fixture.mapping_ids)}",
+                 body=lambda rng, user: {"mapping_config": {"fields": ["id", "date"]}, "status": "active"}),
+    ]
+
+
+async def measure(client: httpx.AsyncClient, scenario: Scenario, tokens: dict, rng: random.Random,
+                  requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = requests
+    users = list(tokens)
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            user = rng.choice(users)
+            headers = {"Authorization": f"Bearer {tokens[user]}"} if scenario.auth else None
+            body = scenario.body(rng, user) if scenario.body else None
+            start = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path(rng, user), json=body, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in OK_STATUSES:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+async def run_suite(args, selected: list, fixture: Fixture) -> dict:
+    # Imported here: the app's modules read DATABASE_PATH and their flags at import time
+    from main import app
+    from app.auth import create_access_token
+
+    tokens = {user_id: create_access_token({"sub": str(user_id)}, timedelta(hours=1)) for user_id in fixture.user_ids}
+    rng = random.Random(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in selected:
+                await measure(client, scenario, tokens, rng, args.warmup, args.concurrency)
+                result = await measure(client, scenario, tokens, rng, args.requests, args.concurrency)
+                results[f"{scenario.router}.{scenario.name}"] = result
+                print_row(scenario.router, scenario.name, result)
+    return results
+
+
+def print_row(router: str, name: str, r: dict):
+    print(f"{router:<12} {name:<14} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.0f} "
+          f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios whose p95 or req/s moved the wrong way by more than threshold"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {previous['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{key}: req/s {previous['rps']:.0f} -> {current['rps']:.0f}")
+    return regressions
+
+
+def dataset_counts(path: str) -> dict:
+    db = sqlite3.connect(path)
+    try:
+        return {table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("users", "connections", "audit_logs", "internal_apps", "app_mappings")}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="existing database from benchmarks.dataset (default: generate one)")
+    add_dataset_arguments(parser)
+    parser.add_argument("--routers", default=",".join(ROUTERS), help="comma separated routers to run")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95/req/s change, as a fraction")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory()
+    path = args.db
+    if path is None:
+        path = os.path.join(workdir.name, "bench.db")
+        print(f"Generating a {args.scale} dataset ...")
+        generate(path, scale_counts(args), args.days, args.seed)
+    os.environ.update({
+        "DATABASE_PATH": path,
+        "AUDIT_ARCHIVE_DIR": os.path.join(workdir.name, "audit_archive"),
+        "AUDIT_RETENTION_DAYS": "0",
+        "WEBHOOKS_ENABLED": "false",
+        "TOKEN_REFRESH_ENABLED": "false",
+    })
+
+    routers = args.routers.split(",")
+    fixture = load_fixture(path)
+    selected = [s for s in scenarios(fixture) if s.router in routers]
+    counts = dataset_counts(path)
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+    print(f"{'router':<12} {'scenario':<14} {'requests':>8} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    try:
+        results = asyncio.run(run_suite(args, selected, fixture))
+    finally:
+        workdir.cleanup()
+
+    if args.output:
+        report = {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpus": os.cpu_count(),
+            "dataset": counts,
+            "settings": {"requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"{len(regressions)} regression(s) against {args.baseline} at threshold {args.threshold:.0%}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Cold vs warm bearer token verification throughput.
+
+Run from backend-python/:  python -m benchmarks.token_verification [--tokens N] [--rounds N]
+
+Cold: every token is new to the process, so each call does a full decode and
+HMAC check. Warm: the same tokens again, answered from the verified-token cache.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from app import auth
+
+
+def run(backend_name: str, tokens: list, rounds: int) -> dict:
+    auth.jwt_backend = auth.load_jwt_backend(backend_name)
+    auth.token_cache.clear()
+
+    start = time.perf_counter()
+    for token in tokens:
+        auth.decode_token(token)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for token in tokens:
+            auth.decode_token(token)
+    warm = time.perf_counter() - start
+
+    return {
+        "backend": auth.jwt_backend.name,
+        "cold_per_sec": len(tokens) / cold,
+        "warm_per_sec": len(tokens) * rounds / warm,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=2000, help="distinct tokens")
+    parser.add_argument("--rounds", type=int, default=20, help="warm passes over the tokens")
+    parser.add_argument("--backends", default="jose,hs256,pyjwt")
+    args = parser.parse_args()
+
+    tokens = [auth.create_access_token({"sub": str(i)}, timedelta(minutes=30)) for i in range(args.tokens)]
+
+    print(f"{'backend':<8} {'cold tok/s':>12} {'warm tok/s':>12} {'speedup':>8}")
+    for name in args.backends.split(","):
+        if name not in auth.JWT_BACKENDS:
+            continue
+        result = run(name, tokens, args.rounds)
+        if result["backend"] != name:
+            print(f"{name:<8} unavailable")
+            continue
+        print(f"{name:<8} {result['cold_per_sec']:>12,.0f} {result['warm_per_sec']:>12,.0f} "
+              f"{result['warm_per_sec'] / result['cold_per_sec']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
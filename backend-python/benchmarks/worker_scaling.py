@@ -0,0 +1,113 @@
+"""Request throughput of serve.py as the worker count grows.
+
+Run from backend-python/:  python -m benchmarks.worker_scaling [--workers 1,2,4] [--seconds N]
+
+Each worker count gets a fresh server on a temporary database. Load comes from
+several client processes so the load generator is not the bottleneck. Scaling
+is bounded by the CPU count, which is printed alongside the results; on a
+single-core machine every row should come out roughly the same.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+SERVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "serve.py")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def client_load(url: str, concurrency: int, seconds: float) -> list:
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def loop():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await client.get(url)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+        await asyncio.gather(*[loop() for _ in range(concurrency)])
+    return latencies
+
+
+def client_process(args) -> list:
+    return asyncio.run(client_load(*args))
+
+
+def start_server(workers: int, port: int, workdir: str) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_PATH": os.path.join(workdir, "bench.db"), "WEBHOOKS_ENABLED": "false"}
+    server = subprocess.Popen(
+        [sys.executable, SERVE, "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                # Give the remaining workers time to finish their startup too
+                time.sleep(1 + 0.2 * workers)
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"server with {workers} workers did not start")
+
+
+def run(workers: int, path: str, clients: int, concurrency: int, seconds: float) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(workers, port, workdir)
+        try:
+            url = f"http://127.0.0.1:{port}{path}"
+            with multiprocessing.Pool(clients) as pool:
+                results = pool.map(client_process, [(url, concurrency, seconds)] * clients)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+    latencies = sorted(l for result in results for l in result)
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    parser.add_argument("--path", default="/api/providers/", help="endpoint to load")
+    parser.add_argument("--clients", type=int, default=4, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"CPUs: {os.cpu_count()}  endpoint: {args.path}  "
+          f"load: {args.clients} x {args.concurrency} connections for {args.seconds:g}s")
+    print(f"{'workers':>7} {'requests':>9} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        r = run(workers, args.path, args.clients, args.concurrency, args.seconds)
+        baseline = baseline or r["rps"]
+        print(f"{workers:>7} {r['requests']:>9} {r['rps']:>9.0f} {r['rps'] / baseline:>7.2f}x "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,67 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
-from app.database import init_database
+from app.database import init_database, close_database, lock_path
+from app.locks import LeaderElection
+from app.metrics import MetricsMiddleware, worker_metrics, exposition, METRICS_ENABLED
+from app.cache import shared_cache
+from app.audit import audit_sink
+from app.retention import audit_retention
+from app.webhooks import webhook_dispatcher, WEBHOOKS_ENABLED
+from app.registry import provider_registry
+from app.http_client import start_http_client, close_http_client
+from app.token_refresh import token_refresher, refresh_enabled
 from app.routes import auth, providers, connections, api, admin, mapping
 
 load_dotenv()
 
+# One worker per host runs the singleton background jobs (see serve.py)
+leader = LeaderElection(lock_path(".leader.lock"))
+
+async def start_background_jobs():
+    if refresh_enabled():
+        await token_refresher.start()
+    await audit_retention.start()
+    if WEBHOOKS_ENABLED:
+        await webhook_dispatcher.start()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await init_database()
+    # Startup - serve.py initializes the database once before forking workers
+    if os.getenv("AUTHCENTER_DB_INITIALIZED") != "1":
+        await init_database()
+    await shared_cache.start()
+    await provider_registry.load()
+    await audit_sink.start()
+    await start_http_client()
+    if METRICS_ENABLED:
+        await worker_metrics.start()
+    election = None
+    if leader.try_elect():
+        await start_background_jobs()
+    else:
+        # Stand by to take over if the leader worker exits
+        election = asyncio.create_task(leader.run(start_background_jobs))
     yield
-    # Shutdown - cleanup if needed
+    # Shutdown - flush queued audit events before closing the pool
+    if election is not None:
+        election.cancel()
+        await asyncio.gather(election, return_exceptions=True)
+    await webhook_dispatcher.stop()
+    await audit_retention.stop()
+    await token_refresher.stop()
+    leader.release()
+    await worker_metrics.stop()
+    await close_http_client()
+    await audit_sink.stop()
+    await shared_cache.close()
+    await close_database()
 
 app = FastAPI(
     title="Authentication Hub Backend",
@@ -45,9 +91,18 @@ app.include_router(api.router, prefix="/api/v1", tags=["api"])
 app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 app.include_router(mapping.router, prefix="/api/mapping", tags=["mapping"])
 
+if METRICS_ENABLED:
+    # Added last so it is outermost and times CORS handling too
+    app.add_middleware(MetricsMiddleware)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "timestamp": "2025-07-22T08:30:00.000Z"}
+    return {"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of every worker's metrics"""
+    return Response(exposition(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 3001))
@@ -0,0 +1,67 @@
+"""Production server: one process initializes the database, then N uvicorn workers serve.
+
+Run from backend-python/:  python serve.py [--workers N] [--port 3001]
+
+main.py keeps the single-process auto-reload server for development.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+
+import uvicorn
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger("serve")
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+async def initialize():
+    """Schema, migrations and seeds, exactly once before any worker starts"""
+    from app.database import init_database, close_database
+    await init_database()
+    await close_database()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with multiple worker processes")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="worker processes (default: WEB_CONCURRENCY or the CPU count)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 3001)))
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("GRACEFUL_TIMEOUT_SECONDS", "30")),
+                        help="seconds a stopping worker waits for in-flight requests")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    asyncio.run(initialize())
+    # Workers inherit the environment and skip init_database in the lifespan
+    os.environ["AUTHCENTER_DB_INITIALIZED"] = "1"
+    if args.workers > 1:
+        # Workers publish metric snapshots here so a scrape of any one of them covers all
+        from app.database import lock_path
+        metrics_dir = os.environ.setdefault("METRICS_DIR", lock_path(".metrics"))
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+    if args.workers > 1 and os.getenv("CACHE_BACKEND", "memory") != "redis":
+        logger.warning("CACHE_BACKEND is not redis: each worker invalidates only its own caches, "
+                       "so other workers can serve stale entries until their TTL expires")
+
+    # uvicorn's supervisor binds the socket once and passes SIGTERM/SIGINT on to every
+    # worker; each worker stops accepting, drains in-flight requests for up to
+    # graceful_timeout, then runs the lifespan shutdown (audit flush, pool close)
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+if __name__ == "__main__":
+    main()
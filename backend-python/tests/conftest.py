@@ -0,0 +1,65 @@
+import os
+import tempfile
+
+import pytest
+
+# Module-level config is read at import time, so the environment is set before any app import.
+# Each test still gets its own database file (see the database fixture).
+_workdir = tempfile.mkdtemp(prefix="authcenter-tests-")
+os.environ.update({
+    "DATABASE_PATH": os.path.join(_workdir, "authcenter.db"),
+    "AUDIT_ARCHIVE_DIR": os.path.join(_workdir, "audit_archive"),
+    "AUDIT_RETENTION_DAYS": "0",
+    "WEBHOOKS_ENABLED": "false",
+    "TOKEN_REFRESH_ENABLED": "false",
+    "CACHE_BACKEND": "memory",
+})
+
+import httpx
+
+from app import database
+from app.auth import create_access_token
+from app.cache import shared_cache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def empty_shared_cache():
+    """The in-process cache is a module singleton; rows cached by one test must not leak into the next"""
+    shared_cache._entries.clear()
+
+
+@pytest.fixture
+async def db_path(tmp_path, monkeypatch):
+    """A fresh database file for the test; the pool opens it on first use"""
+    path = str(tmp_path / "authcenter.db")
+    monkeypatch.setattr(database, "DATABASE_PATH", path)
+    yield path
+    await database.close_database()
+
+
+@pytest.fixture
+async def migrated_db(db_path):
+    """The schema, every migration and the seeds, as the server creates them"""
+    await database.init_database()
+    return db_path
+
+
+@pytest.fixture
+async def client(db_path):
+    """httpx client for the app with its lifespan (startup and shutdown) running"""
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+def auth_headers():
+    return {"Authorization": f"Bearer {create_access_token({'sub': '1'})}"}
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.app_search import match_expression, search_apps
+from app.database import read_connection, write_connection
+
+pytestmark = pytest.mark.anyio
+
+APPS = [
+    # name, display_name, description, data_types, operations, status
+    ("ledger", "Ledger", "Bookkeeping for invoices", ["finance"], ["read"], "active"),
+    ("invoicer", "Invoicer", "Sends invoices from calendar events", ["calendar"], ["write"], "active"),
+    ("mailroom", "Mailroom", "Shared inbox", ["email"], ["read", "sync"], "active"),
+    ("archive", "Archive", "Old invoices", ["finance"], ["read"], "inactive"),
+]
+
+
+@pytest.fixture
+async def catalog(migrated_db):
+    async with write_connection() as db:
+        await db.executemany("""
+            INSERT INTO internal_apps (name, display_name, description, manifest_data, status)
+            VALUES (?, ?, ?, ?, ?)
+        """, [
+            (name, display, description,
+             json.dumps({"capabilities": {"data_types": data_types, "operations": operations}}), status)
+            for name, display, description, data_types, operations, status in APPS
+        ])
+
+
+async def search(q: str, **kwargs):
+    async with read_connection() as db:
+        rows, more, total = await search_apps(db, q, **kwargs)
+    return [row["name"] for row in rows], more, total
+
+
+def test_match_expression_quotes_every_word():
+    assert match_expression('Inv" OR x*') == '{name display_name description capabilities} : "inv"* AND ' \
+                                             '{name display_name description capabilities} : "or"* AND ' \
+                                             '{name display_name description capabilities} : "x"*'
+
+
+@pytest.mark.parametrize("args", [{"q": '"*()', "status": "active"}, {"q": "inv", "status": "--"},
+                                  {"q": "inv", "capability": "*"}])
+def test_match_expression_needs_a_word(args):
+    with pytest.raises(HTTPException) as error:
+        match_expression(**args)
+    assert error.value.status_code == 400
+
+
+async def test_words_match_as_prefixes_and_names_rank_first(catalog):
+    names, _, _ = await search("invoic")
+    # Invoicer matches by name, the others only by description
+    assert names[0] == "invoicer"
+    assert set(names) == {"invoicer", "ledger", "archive"}
+
+
+async def test_every_word_must_match(catalog):
+    assert (await search("invoices calendar"))[0] == ["invoicer"]
+
+
+async def test_capability_and_status_filter(catalog):
+    # The seeded Magnetiq CMS lists sync among its operations too
+    assert set((await search("", capability="sync"))[0]) == {"mailroom", "magnetiq"}
+    assert (await search("invoices", status="inactive"))[0] == ["archive"]
+    assert set((await search("", capability="finance", status="active"))[0]) == {"ledger"}
+
+
+async def test_index_follows_updates_and_deletes(catalog):
+    async with write_connection() as db:
+        await db.execute("UPDATE internal_apps SET description = 'Payroll runs' WHERE name = 'ledger'")
+        await db.execute("DELETE FROM internal_apps WHERE name = 'archive'")
+
+    assert (await search("payroll"))[0] == ["ledger"]
+    assert (await search("invoices"))[0] == ["invoicer"]
+
+
+async def test_route_pages_with_next_offset_and_count(catalog, client):
+    first = (await client.get("/api/admin/apps/search", params={"q": "invoic", "limit": 2, "count": "true"})).json()
+    second = (await client.get("/api/admin/apps/search", params={"q": "invoic", "limit": 2, "offset": 2})).json()
+
+    assert (len(first["apps"]), first["next_offset"], first["total"]) == (2, 2, 3)
+    assert (len(second["apps"]), second["next_offset"]) == (1, None)
+    assert {app["name"] for app in first["apps"] + second["apps"]} == {"invoicer", "ledger", "archive"}
+    assert first["apps"][0]["manifest_data"]["capabilities"]["data_types"] == ["calendar"]
+
+
+@pytest.mark.parametrize("params, status_code", [
+    ({"q": "x", "limit": 0}, 422),
+    ({"q": "x", "limit": 1000}, 422),
+    ({"q": "x", "offset": -1}, 422),
+    ({"q": "()"}, 400),
+    ({"q": "x", "status": "!"}, 400),
+])
+async def test_route_rejects_bad_requests(client, params, status_code):
+    assert (await client.get("/api/admin/apps/search", params=params)).status_code == status_code
@@ -0,0 +1,57 @@
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from app.audit_export import ExportSlots, export_slots
+from app.database import write_connection
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def audit_rows(client):
+    async with write_connection() as db:
+        await db.executemany(
+            "INSERT INTO audit_logs (action, resource, created_at) VALUES (?, ?, ?)",
+            [("login" if i % 2 else "logout", f"user:{i}", f"2026-01-01 00:00:{i:02d}") for i in range(10)]
+        )
+    return client
+
+
+def test_slots_release_once():
+    slots = ExportSlots(limit=1)
+    release = slots.try_acquire()
+    assert slots.try_acquire() is None
+    release()
+    release()
+    assert slots.in_use == 0
+    assert slots.try_acquire() is not None
+
+
+async def test_ndjson_export_filters_by_action_and_range(audit_rows):
+    response = await audit_rows.get("/api/admin/logs/export", params={
+        "action": "login", "since": "2026-01-01 00:00:02", "until": "2026-01-01 00:00:08", "chunk_size": 2
+    })
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["resource"] for row in rows] == ["user:3", "user:5", "user:7"]
+    assert export_slots.in_use == 0
+
+
+async def test_csv_export_has_a_header(audit_rows):
+    response = await audit_rows.get("/api/admin/logs/export", params={"format": "csv", "action": "logout"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][:4] == ["id", "user_id", "user_email", "action"]
+    assert len(rows) == 6
+
+
+async def test_exports_beyond_the_limit_are_turned_away(audit_rows, monkeypatch):
+    monkeypatch.setattr(export_slots, "limit", 1)
+    responses = await asyncio.gather(*(audit_rows.get("/api/admin/logs/export") for _ in range(3)))
+
+    assert sorted(response.status_code for response in responses) == [200, 429, 429]
+    assert export_slots.in_use == 0
+    assert (await audit_rows.get("/api/admin/logs/export")).status_code == 200
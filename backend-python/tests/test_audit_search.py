@@ -0,0 +1,127 @@
+import pytest
+from fastapi import HTTPException
+
+from app import audit_search
+from app.audit_search import find_audit_logs, id_ranges, match_expression
+from app.database import read_connection, write_connection
+
+pytestmark = pytest.mark.anyio
+
+ACTIONS = ("login", "data_synced", "mapping_created")
+
+
+def make_row(i: int) -> dict:
+    return {
+        "user_id": 1 if i % 3 == 0 else None,
+        "action": ACTIONS[i % 3],
+        "resource": f"connection:{i % 5}",
+        "details": "synced gmail messages" if i % 2 else f"calendar import batch {i}",
+        "ip_address": "10.0.0.7" if i % 4 == 0 else "10.0.0.8",
+        # Rows share timestamps in pairs, so the id breaks ties
+        "created_at": f"2026-01-01 00:{i // 2:02d}:00",
+    }
+
+
+ROWS = [make_row(i) for i in range(60)]
+
+
+@pytest.fixture
+async def audit_rows(migrated_db):
+    """The rows with their database ids, newest first as every search returns them"""
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        await db.executemany("""
+            INSERT INTO audit_logs (user_id, action, resource, details, ip_address, created_at)
+            VALUES (:user_id, :action, :resource, :details, :ip_address, :created_at)
+        """, ROWS)
+        cursor = await db.execute("SELECT * FROM audit_logs WHERE action IN ('login', 'data_synced', 'mapping_created')")
+        rows = [dict(row) for row in await cursor.fetchall()]
+    return sorted(rows, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+
+
+def expected(rows, predicate):
+    return [row["id"] for row in rows if predicate(row)]
+
+
+async def walk(q=None, limit=4, **filters):
+    """Every id a search returns, following next_cursor to the end"""
+    ids, cursor, pages = [], None, []
+    while True:
+        async with read_connection() as db:
+            rows, cursor = await find_audit_logs(db, q, cursor, limit, **filters)
+        page = [row["id"] for row in rows[:limit]]
+        pages.append(len(page))
+        ids += page
+        if cursor is None:
+            return ids, pages
+        assert len(pages) < 100
+
+
+def test_match_expression_builds_quoted_phrases():
+    match, prefix = match_expression('connection:42 cal* "x', ["data_synced"])
+    assert match == '{resource details} : "connection 42" AND {resource details} : "cal"* AND ' \
+                    '{resource details} : "x" AND action : ("data_synced")'
+    assert prefix
+    assert match_expression("*:()") == (None, False)
+
+
+def test_id_ranges_merge_close_ids():
+    assert id_ranges([900, 1, 5, 300], gap=10) == [(1, 5), (300, 300), (900, 900)]
+
+
+async def test_rare_text_is_collected_by_id(audit_rows):
+    ids, _ = await walk("connection:3")
+    assert ids == expected(audit_rows, lambda row: row["resource"] == "connection:3")
+
+
+async def test_common_text_is_scanned(audit_rows, monkeypatch):
+    monkeypatch.setattr(audit_search, "AUDIT_SEARCH_MATCH_CAP", 5)
+    ids, _ = await walk("gmail", actions=["login", "data_synced"])
+    assert ids == expected(audit_rows, lambda row: "gmail" in row["details"] and row["action"] != "mapping_created")
+
+
+async def test_common_prefix_is_matched_in_the_page_query(audit_rows, monkeypatch):
+    monkeypatch.setattr(audit_search, "AUDIT_SEARCH_MATCH_CAP", 5)
+    ids, _ = await walk("cal*", ip="10.0.0.7")
+    assert ids == expected(audit_rows, lambda row: "calendar" in row["details"] and row["ip_address"] == "10.0.0.7")
+
+
+async def test_scan_resumes_after_its_row_budget(audit_rows, monkeypatch):
+    monkeypatch.setattr(audit_search, "AUDIT_SEARCH_MATCH_CAP", 5)
+    monkeypatch.setattr(audit_search, "AUDIT_SEARCH_SCAN_CHUNK", 4)
+    monkeypatch.setattr(audit_search, "AUDIT_SEARCH_SCAN_LIMIT", 8)
+
+    ids, pages = await walk("gmail", limit=5)
+
+    assert ids == expected(audit_rows, lambda row: "gmail" in row["details"])
+    # Short pages still carried a cursor, and the walk saw each row once
+    assert min(pages[:-1]) < 5
+    assert len(ids) == len(set(ids))
+
+
+async def test_filters_without_text(audit_rows):
+    ids, _ = await walk(user_id=1, since="2026-01-01 00:10:00", until="2026-01-01 00:20:00")
+    assert ids == expected(audit_rows, lambda row: row["user_id"] == 1
+                           and "2026-01-01 00:10:00" <= row["created_at"] < "2026-01-01 00:20:00")
+
+
+async def test_query_without_words_is_rejected(audit_rows):
+    async with read_connection() as db:
+        with pytest.raises(HTTPException):
+            await find_audit_logs(db, "*")
+
+
+async def test_route_combines_filters(audit_rows, client):
+    params = {"q": "calendar", "action": "login, mapping_created", "user_email": "user1@example.com", "limit": 3}
+    seen, cursor = [], None
+    while True:
+        body = (await client.get("/api/admin/logs/search", params={**params, **({"cursor": cursor} if cursor else {})})).json()
+        seen += [log["id"] for log in body["logs"]]
+        assert all(log["user_email"] == "user1@example.com" for log in body["logs"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == expected(audit_rows, lambda row: "calendar" in row["details"] and row["user_id"] == 1
+                            and row["action"] in ("login", "mapping_created"))
+    assert (await client.get("/api/admin/logs/search", params={"q": "()"})).status_code == 400
@@ -0,0 +1,297 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app import connection_cache
+from app.cache import CacheBackend, MemoryBackend, RedisBackend
+from app.connection_cache import get_access_token, get_active_connection
+from app.database import write_connection
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRedisServer:
+    """In-process stand-in for one Redis server, with a clock the test moves"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.data: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.channels: Dict[str, List[asyncio.Queue]] = {}
+        self.round_trips = 0
+        self.down = False
+
+    def client(self) -> "FakeRedis":
+        return FakeRedis(self)
+
+
+class FakeRedis:
+    """The slice of redis.asyncio.Redis the cache backend uses"""
+
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.server.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.server.now:
+            del self.server.data[key]
+            entry = None
+        return entry[0] if entry else None
+
+    async def set(self, key: str, value: bytes, px: Optional[int] = None):
+        self.server.round_trips += 1
+        self.server.data[key] = (value, self.server.now + px / 1000 if px else None)
+
+    async def delete(self, *keys: str):
+        self.server.round_trips += 1
+        for key in keys:
+            self.server.data.pop(key, None)
+
+    async def publish(self, channel: str, message: str):
+        self.server.round_trips += 1
+        for queue in self.server.channels.get(channel, []):
+            queue.put_nowait({"type": "message", "channel": channel, "data": message.encode()})
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> "FakePubSub":
+        return FakePubSub(self.server)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.keys: List[str] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def get(self, key: str):
+        self.keys.append(key)
+
+    async def execute(self) -> List[Optional[bytes]]:
+        self.redis.server.round_trips += 1
+        return [await self.redis.get(key) for key in self.keys]
+
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.subscribed = False
+
+    async def subscribe(self, channel: str):
+        self.server.channels.setdefault(channel, []).append(self.queue)
+        self.subscribed = True
+
+    async def get_message(self, timeout: float):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        for queues in self.server.channels.values():
+            if self.queue in queues:
+                queues.remove(self.queue)
+
+
+class DownPipeline(FakePipeline):
+    async def execute(self):
+        raise RedisConnectionError("Connection refused")
+
+
+class DownRedis(FakeRedis):
+    """Every command fails the way redis-py does when the server is unreachable"""
+
+    async def set(self, key, value, px=None):
+        raise RedisConnectionError("Connection refused")
+
+    async def delete(self, *keys):
+        raise RedisConnectionError("Connection refused")
+
+    async def publish(self, channel, message):
+        raise RedisConnectionError("Connection refused")
+
+    def pipeline(self, transaction=True):
+        return DownPipeline(self)
+
+
+class OutageRedis(FakeRedis):
+    """Fails like DownRedis while server.down is set and recovers once it is cleared"""
+
+    def _check(self):
+        if self.server.down:
+            raise RedisConnectionError("Connection refused")
+
+    async def get(self, key):
+        self._check()
+        return await super().get(key)
+
+    async def set(self, key, value, px=None):
+        self._check()
+        await super().set(key, value, px)
+
+    async def delete(self, *keys):
+        self._check()
+        await super().delete(*keys)
+
+    async def publish(self, channel, message):
+        self._check()
+        await super().publish(channel, message)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return OutagePubSub(self.server)
+
+
+class OutagePubSub(FakePubSub):
+    async def subscribe(self, channel):
+        if self.server.down:
+            raise RedisConnectionError("Connection refused")
+        await super().subscribe(channel)
+
+    async def get_message(self, timeout):
+        if self.server.down:
+            raise RedisConnectionError("Connection refused")
+        return await super().get_message(timeout)
+
+
+@pytest.fixture
+async def workers():
+    """Two Redis backends sharing one fake server, as two worker processes would"""
+    server = FakeRedisServer()
+    backends = [RedisBackend(client=server.client()) for _ in range(2)]
+    for backend in backends:
+        await backend.start()
+    yield server, backends
+    for backend in backends:
+        await backend.close()
+
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CacheBackend()
+
+
+async def test_mget_is_one_round_trip(workers):
+    server, (cache, _) = workers
+    await cache.set("a", b"1")
+    await cache.set("c", b"3")
+    server.round_trips = 0
+
+    assert await cache.mget(["a", "b", "c"]) == [b"1", None, b"3"]
+    assert server.round_trips == 1
+    assert (cache.counters["hits"], cache.counters["misses"]) == (2, 1)
+
+
+async def test_values_expire_after_their_ttl(workers):
+    server, (cache, _) = workers
+    await cache.set_json("k", {"v": 1}, ttl=1.5)
+    assert server.data[cache.key("k")][1] == 1.5
+
+    server.now = 1.0
+    assert await cache.get_json("k") == {"v": 1}
+    server.now = 1.6
+    assert await cache.get_json("k") is None
+
+
+async def test_invalidation_reaches_every_worker_once(workers):
+    server, (sender, receiver) = workers
+    received = {"sender": [], "receiver": []}
+    sender.subscribe("connections:", received["sender"].extend)
+    receiver.subscribe("connections:", received["receiver"].extend)
+    await sender.set("connections:1:1", b"{}")
+
+    await sender.invalidate(["connections:1:1", "other:1"])
+    for _ in range(100):
+        if received["receiver"]:
+            break
+        await asyncio.sleep(0.01)
+
+    assert received == {"sender": ["connections:1:1"], "receiver": ["connections:1:1"]}
+    assert await receiver.get("connections:1:1") is None
+    assert receiver.counters["invalidations_received"] == 1
+
+
+async def test_redis_errors_are_cache_misses():
+    cache = RedisBackend(client=DownRedis(FakeRedisServer()))
+
+    assert await cache.mget(["a", "b"]) == [None, None]
+    await cache.set("a", b"1")
+    await cache.invalidate(["a"])
+    assert cache.counters["errors"] == 4
+    assert cache.counters["misses"] == 2
+
+
+async def test_connection_lookup_survives_redis_outage(migrated_db, monkeypatch):
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        await db.execute("INSERT INTO connections (user_id, provider_id, external_id, access_token) VALUES (1, 1, 'ext', 'at')")
+    monkeypatch.setattr(connection_cache, "shared_cache", RedisBackend(client=DownRedis(FakeRedisServer())))
+
+    connection = await get_active_connection(1, 1)
+
+    assert connection["external_id"] == "ext"
+
+
+async def test_cached_connection_has_no_tokens(migrated_db, monkeypatch):
+    cache = MemoryBackend()
+    monkeypatch.setattr(connection_cache, "shared_cache", cache)
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        cursor = await db.execute("""
+            INSERT INTO connections (user_id, provider_id, external_id, access_token, refresh_token)
+            VALUES (1, 1, 'ext', 'secret-at', 'secret-rt')
+        """)
+        connection_id = cursor.lastrowid
+
+    connection = await get_active_connection(1, 1)
+    stored = await cache.get(connection_cache.connection_key(1, 1))
+
+    assert "access_token" not in connection and "refresh_token" not in connection
+    assert b"secret" not in stored
+    assert await get_access_token(connection_id) == "secret-at"
+
+
+async def test_worker_starts_while_redis_is_down():
+    server = FakeRedisServer()
+    server.down = True
+    cache, sender = RedisBackend(client=OutageRedis(server)), RedisBackend(client=FakeRedis(server))
+    received = []
+    cache.subscribe("connections:", received.extend)
+
+    await cache.start()
+    try:
+        assert cache.counters["errors"] == 1
+        # The in-process cache serves until Redis is reachable
+        await cache.set("connections:1:1", b"{}")
+        assert await cache.get("connections:1:1") == b"{}"
+        # Let the listener fail against the outage before Redis comes back
+        await asyncio.sleep(0.05)
+        assert not cache._pubsub.subscribed
+
+        server.down = False
+        for _ in range(300):
+            if cache._pubsub.subscribed:
+                break
+            await asyncio.sleep(0.01)
+        await sender.invalidate(["connections:1:2"])
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+
+        # The listener subscribed on its retry, and reads go to Redis again
+        assert received == ["connections:1:2"]
+        assert await cache.get("connections:1:1") is None
+        assert cache.counters["errors"] > 3
+    finally:
+        await cache.close()
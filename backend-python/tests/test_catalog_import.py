@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from app.catalog_import import CatalogImport
+from app.routes import admin
+
+pytestmark = pytest.mark.anyio
+
+
+def manifest(name: str, **app) -> dict:
+    return {"pcarp_version": "1.0", "app": {"name": name, **app}}
+
+
+def ndjson(*records) -> bytes:
+    return "\n".join(json.dumps(record) for record in records).encode()
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """Worker counts the import route starts CatalogImport with"""
+    seen = []
+
+    class RecordingImport(CatalogImport):
+        def __init__(self, workers, **kwargs):
+            seen.append(workers)
+            # Validate inline whatever was asked for; the test only checks the request
+            super().__init__(workers=0, **kwargs)
+
+    monkeypatch.setattr(admin, "CatalogImport", RecordingImport)
+    monkeypatch.setattr(admin, "CATALOG_IMPORT_WORKERS", 2)
+    return seen
+
+
+async def test_negative_workers_are_rejected(client, started):
+    response = await client.post("/api/admin/apps/import", params={"workers": -1}, content=b"")
+    assert response.status_code == 422
+    assert started == []
+
+
+async def test_workers_are_capped_at_the_configured_maximum(client, started):
+    for workers in (0, 1, 64):
+        response = await client.post("/api/admin/apps/import", params={"workers": workers},
+                                     content=ndjson(manifest(f"app-{workers}")))
+        assert response.status_code == 200
+    assert started == [0, 1, 2]
+
+
+async def test_import_reports_each_manifest_and_indexes_it(client):
+    body = ndjson(
+        manifest("crm", description="Customer records"),
+        manifest("crm", description="Second copy"),
+        {"pcarp_version": "1.0", "app": {}},
+        manifest("helpdesk", display_name="Help Desk"),
+    )
+    report = (await client.post("/api/admin/apps/import", params={"workers": 0}, content=body)).json()
+
+    assert report["counts"] == {"inserted": 2, "updated": 0, "unchanged": 0, "rejected": 2}
+    assert {entry["source"]: entry["error"] for entry in report["rejected"]} == {
+        "line 2": "duplicate of line 1", "line 3": "name is required"
+    }
+    found = (await client.get("/api/admin/apps/search", params={"q": "custom"})).json()["apps"]
+    assert [app["name"] for app in found] == ["crm"]
+
+
+async def test_reimport_updates_only_changed_manifests(client):
+    first = ndjson(manifest("crm", description="Customer records"), manifest("helpdesk"))
+    second = ndjson(manifest("crm", description="Customer accounts"), manifest("helpdesk"))
+    await client.post("/api/admin/apps/import", params={"workers": 0}, content=first)
+
+    report = (await client.post("/api/admin/apps/import", params={"workers": 0}, content=second)).json()
+
+    assert report["counts"] == {"inserted": 0, "updated": 1, "unchanged": 1, "rejected": 0}
+    assert [entry["name"] for entry in report["updated"]] == ["crm"]
+    found = (await client.get("/api/admin/apps/search", params={"q": "accounts"})).json()["apps"]
+    assert [app["name"] for app in found] == ["crm"]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from app.database import ConnectionPool, PoolTimeoutError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05)
+    await pool.open()
+    yield pool
+    await pool.close()
+
+
+async def test_writer_timeout_leaves_the_lock_usable(pool):
+    async with pool.writer():
+        with pytest.raises(PoolTimeoutError):
+            async with pool.writer():
+                pass
+    async with pool.writer() as db:
+        await db.execute("CREATE TABLE t (x)")
+    assert pool.stats()["writer"]["timeouts"] == 1
+
+
+async def test_writer_cancelled_at_handover_releases_the_lock(pool):
+    async def waiter():
+        async with pool.writer():
+            pass
+
+    async with pool.writer():
+        waiter_task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+    # Leaving the block hands the lock to the waiter, which is cancelled before it runs again
+    waiter_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter_task
+
+    async with pool.writer():
+        pass
+    assert pool.stats()["writer"]["in_use"] == 0
+
+
+async def test_reader_timeout_when_all_readers_are_busy(pool):
+    async with pool.reader():
+        with pytest.raises(PoolTimeoutError):
+            async with pool.reader():
+                pass
+    async with pool.reader() as db:
+        assert (await (await db.execute("SELECT 1")).fetchone())[0] == 1
@@ -0,0 +1,133 @@
+from types import MappingProxyType
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+from app import google
+from app.google import GoogleClient, ProviderError
+from app.http_client import create_http_client
+from app.registry import Provider
+
+pytestmark = pytest.mark.anyio
+
+TOKEN_URL = "https://oauth.test/token"
+PROVIDER = Provider(id=1, name="google", display_name="Google", oauth_config=MappingProxyType({"tokenUrl": TOKEN_URL}),
+                    scopes=("email",), enabled=True, created_at=None)
+
+
+def google_client(handler) -> GoogleClient:
+    return GoogleClient(create_http_client(httpx.MockTransport(handler)), PROVIDER)
+
+
+@pytest.fixture(autouse=True)
+def credentials(monkeypatch):
+    monkeypatch.setattr(google, "GOOGLE_CLIENT_ID", "client-id")
+    monkeypatch.setattr(google, "GOOGLE_CLIENT_SECRET", "client-secret")
+
+
+async def test_exchange_code_posts_the_authorization_code():
+    seen = []
+
+    def handler(request):
+        seen.append((str(request.url), parse_qs(request.content.decode())))
+        return httpx.Response(200, json={"access_token": "at", "refresh_token": "rt", "expires_in": 3600})
+
+    tokens = await google_client(handler).exchange_code("the-code")
+
+    assert tokens["access_token"] == "at"
+    url, form = seen[0]
+    assert url == TOKEN_URL
+    assert form["grant_type"] == ["authorization_code"]
+    assert form["code"] == ["the-code"]
+    assert form["client_id"] == ["client-id"]
+
+
+async def test_refresh_token_posts_the_refresh_grant():
+    forms = []
+
+    def handler(request):
+        forms.append(parse_qs(request.content.decode()))
+        return httpx.Response(200, json={"access_token": "new", "expires_in": 3600})
+
+    tokens = await google_client(handler).refresh_token("rt")
+
+    assert tokens["access_token"] == "new"
+    assert forms[0]["grant_type"] == ["refresh_token"]
+    assert forms[0]["refresh_token"] == ["rt"]
+
+
+async def test_error_status_raises_provider_error():
+    client = google_client(lambda request: httpx.Response(401, json={"error": "invalid_grant"}))
+    with pytest.raises(ProviderError, match="401"):
+        await client.refresh_token("revoked")
+
+
+async def test_pages_follow_next_page_token():
+    pages = {None: (["m1", "m2"], "p2"), "p2": (["m3"], None)}
+    tokens = []
+
+    def handler(request):
+        assert request.headers["Authorization"] == "Bearer at"
+        if request.url.path.endswith("/profile"):
+            return httpx.Response(200, json={"historyId": "h100"})
+        token = request.url.params.get("pageToken")
+        tokens.append(token)
+        ids, next_token = pages[token]
+        body = {"messages": [{"id": i} for i in ids]}
+        if next_token:
+            body["nextPageToken"] = next_token
+        return httpx.Response(200, json=body)
+
+    listed = [page async for page in google_client(handler).pages("gmail", "at")]
+
+    assert tokens == [None, "p2"]
+    assert [[item["id"] for item in page.items] for page in listed] == [["m1", "m2"], ["m3"]]
+    assert [page.next_page_token for page in listed] == ["p2", None]
+    # messages.list has no historyId; the delta comes from the profile read before listing
+    assert [page.delta_token for page in listed] == [None, "h100"]
+
+
+async def test_gmail_delta_lists_history_since_the_checkpoint():
+    def handler(request):
+        assert request.url.path == "/gmail/v1/users/me/history"
+        assert request.url.params["startHistoryId"] == "h100"
+        return httpx.Response(200, json={"history": [{"messagesAdded": [{"message": {"id": "m4"}}]}], "historyId": "h105"})
+
+    listed = [page async for page in google_client(handler).pages("gmail", "at", delta_token="h100")]
+
+    assert [(page.items, page.delta_token) for page in listed] == [([{"id": "m4"}], "h105")]
+
+
+async def test_expired_calendar_sync_token_falls_back_to_a_full_listing():
+    requests = []
+
+    def handler(request):
+        requests.append(dict(request.url.params))
+        if "syncToken" in request.url.params:
+            return httpx.Response(410, json={"error": {"code": 410, "message": "Sync token is no longer valid"}})
+        return httpx.Response(200, json={"items": [{"id": "e1"}], "nextSyncToken": "s2"})
+
+    listed = [page async for page in google_client(handler).pages("calendar", "at", delta_token="s1")]
+
+    assert requests == [{"syncToken": "s1"}, {}]
+    assert [(page.items, page.delta_token) for page in listed] == [([{"id": "e1"}], "s2")]
+
+
+async def test_expired_gmail_history_relists_from_the_current_profile():
+    def handler(request):
+        if request.url.path.endswith("/history"):
+            return httpx.Response(404)
+        if request.url.path.endswith("/profile"):
+            return httpx.Response(200, json={"historyId": "h200"})
+        return httpx.Response(200, json={"messages": [{"id": "m1"}]})
+
+    listed = [page async for page in google_client(handler).pages("gmail", "at", delta_token="h1")]
+
+    assert [(page.items, page.delta_token) for page in listed] == [([{"id": "m1"}], "h200")]
+
+
+async def test_unsupported_service():
+    client = google_client(lambda request: httpx.Response(200, json={}))
+    with pytest.raises(ProviderError):
+        await client.fetch("drive", "at")
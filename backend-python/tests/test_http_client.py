@@ -0,0 +1,71 @@
+import asyncio
+from collections import Counter
+
+import httpx
+import pytest
+
+from app.http_client import PerHostLimitTransport, create_http_client
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowServer:
+    """MockTransport handler that holds each request open briefly and records per-host concurrency"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.active = Counter()
+        self.peak = Counter()
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.active[host] += 1
+        self.peak[host] = max(self.peak[host], self.active[host])
+        await asyncio.sleep(self.delay)
+        self.active[host] -= 1
+        return httpx.Response(200, json={"host": host})
+
+
+async def test_requests_per_host_are_capped():
+    server = SlowServer()
+    transport = PerHostLimitTransport(httpx.MockTransport(server), max_per_host=2)
+    async with httpx.AsyncClient(transport=transport) as client:
+        urls = [f"https://{host}.test/" for host in ("a", "b") for _ in range(6)]
+        responses = await asyncio.gather(*(client.get(url) for url in urls))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert server.peak == {"a.test": 2, "b.test": 2}
+    assert transport.in_flight == {"a.test": 0, "b.test": 0}
+
+
+async def test_slot_is_held_until_a_streamed_body_is_closed():
+    transport = PerHostLimitTransport(httpx.MockTransport(SlowServer(delay=0)), max_per_host=1)
+    async with httpx.AsyncClient(transport=transport) as client:
+        async with client.stream("GET", "https://a.test/") as response:
+            assert transport.in_flight["a.test"] == 1
+            second = asyncio.create_task(client.get("https://a.test/"))
+            await asyncio.sleep(0.01)
+            assert not second.done()
+            await response.aread()
+        assert (await second).status_code == 200
+    assert transport.in_flight["a.test"] == 0
+
+
+async def test_slot_is_released_when_the_request_fails():
+    def refuse(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    transport = PerHostLimitTransport(httpx.MockTransport(refuse), max_per_host=1)
+    async with httpx.AsyncClient(transport=transport) as client:
+        for _ in range(3):
+            with pytest.raises(httpx.ConnectError):
+                await client.get("https://a.test/")
+    assert transport.in_flight["a.test"] == 0
+
+
+async def test_shared_client_wraps_a_stand_in_transport():
+    client = create_http_client(httpx.MockTransport(lambda request: httpx.Response(204)))
+    async with client:
+        response = await client.get("https://a.test/")
+    assert response.status_code == 204
+    assert response.request.headers["User-Agent"].startswith("authcenter-backend/")
@@ -0,0 +1,57 @@
+import pytest
+
+from app.database import get_pool
+from app.pagination import PAGE_MAX_LIMIT, decode_cursor, encode_cursor, next_cursor
+from app.query_stats import QUERY_STATS_MAX_LIMIT
+
+pytestmark = pytest.mark.anyio
+
+CURSOR_ROUTES = ["/api/admin/logs", "/api/mapping/list", "/api/admin/logs/search"]
+# Admin lists without paging, with the largest limit each accepts
+BOUNDED_ROUTES = {"/api/admin/db/queries": QUERY_STATS_MAX_LIMIT, "/api/admin/webhooks/dead": PAGE_MAX_LIMIT}
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("2026-01-02 03:04:05", 42)) == ("2026-01-02 03:04:05", 42)
+
+
+def test_next_cursor_points_at_the_last_row_of_the_page():
+    rows = [{"created_at": f"2026-01-01 00:00:0{i}", "id": i} for i in (3, 2, 1)]
+    assert decode_cursor(next_cursor(rows, 2)) == ("2026-01-01 00:00:02", 2)
+    assert next_cursor(rows, 3) is None
+
+
+@pytest.mark.parametrize("route", CURSOR_ROUTES)
+@pytest.mark.parametrize("limit", [0, -1, PAGE_MAX_LIMIT + 1])
+async def test_limit_out_of_range_is_rejected(client, route, limit):
+    response = await client.get(route, params={"limit": limit, "mode": "cursor"})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("route", BOUNDED_ROUTES)
+async def test_admin_list_limits_are_bounded(client, route):
+    for limit in (0, -1, BOUNDED_ROUTES[route] + 1):
+        assert (await client.get(route, params={"limit": limit})).status_code == 422
+    assert (await client.get(route, params={"limit": BOUNDED_ROUTES[route]})).status_code == 200
+
+
+async def test_cursor_pages_visit_every_row_once(client):
+    pool = await get_pool()
+    async with pool.writer() as db:
+        # Shared timestamps make the id the tiebreaker
+        await db.executemany(
+            "INSERT INTO audit_logs (action, created_at) VALUES ('paged', ?)",
+            [(f"2026-01-01 00:00:0{i % 3}",) for i in range(7)]
+        )
+        expected = [row[0] for row in await (await db.execute(
+            "SELECT id FROM audit_logs ORDER BY created_at DESC, id DESC"
+        )).fetchall()]
+
+    seen, params = [], {"mode": "cursor", "limit": 1, "total": "none"}
+    while True:
+        body = (await client.get("/api/admin/logs", params=params)).json()
+        seen.extend(log["id"] for log in body["logs"])
+        if body["next_cursor"] is None:
+            break
+        params["cursor"] = body["next_cursor"]
+    assert seen == expected
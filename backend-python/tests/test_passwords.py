@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import database, passwords
+from app.auth import verify_admin_password
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphore(monkeypatch):
+    # The semaphore binds to the event loop it first waits on; each test runs its own loop
+    monkeypatch.setattr(passwords, "_semaphore", None)
+
+
+async def test_hash_and_check():
+    hashed = await passwords.hash_password("s3cret")
+    assert hashed.startswith("$2")
+    assert await passwords.check_password("s3cret", hashed)
+    assert not await passwords.check_password("wrong", hashed)
+
+
+async def test_checks_run_off_the_loop_with_bounded_concurrency(monkeypatch):
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def slow_checkpw(password, hashed):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.05)
+        with lock:
+            running -= 1
+        return True
+
+    monkeypatch.setattr(passwords.bcrypt, "checkpw", slow_checkpw)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    ticking = asyncio.create_task(ticker())
+    results = await asyncio.gather(*(passwords.check_password("pw", "hash") for _ in range(6)))
+    ticking.cancel()
+
+    assert results == [True] * 6
+    assert peak == passwords.PASSWORD_HASH_WORKERS
+    # 6 checks at 50 ms on 2 threads take ~150 ms, during which the loop kept running
+    assert ticks >= 10
+
+
+async def test_admin_password_is_hashed_once(db_path, monkeypatch):
+    calls = []
+    real_hash = passwords.hash_password
+
+    async def counting_hash(password):
+        calls.append(password)
+        return await real_hash(password)
+
+    monkeypatch.setattr(database, "hash_password", counting_hash)
+    await database.init_database()
+    await database.init_database()
+
+    assert len(calls) == 1
+    assert await verify_admin_password("De7au!t")
+    assert not await verify_admin_password("nope")
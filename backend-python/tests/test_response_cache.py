@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from app.database import write_connection
+from app.response_cache import ResponseCache, make_cache_key, response_cache
+
+pytestmark = pytest.mark.anyio
+
+KEY = make_cache_key(1, "google", "gmail", {"b": "2", "a": "1"})
+
+
+class Upstream:
+    """Loader that blocks until released and counts its calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return {"call": self.calls}
+
+
+def test_cache_key_ignores_query_order():
+    assert KEY == make_cache_key("1", "google", "gmail", {"a": "1", "b": "2"})
+
+
+async def test_concurrent_misses_share_one_load_then_hit():
+    cache, upstream = ResponseCache(), Upstream()
+    requests = [asyncio.create_task(cache.get_or_load(KEY, upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    upstream.release.set()
+    results = await asyncio.gather(*requests)
+
+    assert upstream.calls == 1
+    assert {body.body for body, _ in results} == {b'{"call":1}'}
+    assert cache.counters["coalesced"] == 4
+    assert (await cache.get_or_load(KEY, upstream))[1] == "HIT"
+
+
+async def test_cancelled_leader_does_not_cancel_waiters():
+    cache, upstream = ResponseCache(), Upstream()
+    leader = asyncio.create_task(cache.get_or_load(KEY, upstream))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_load(KEY, upstream)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    await asyncio.sleep(0)
+    upstream.release.set()
+    results = await asyncio.gather(*waiters)
+
+    # One waiter took over the load and the others coalesced onto it
+    assert upstream.calls == 2
+    assert {body.body for body, _ in results} == {b'{"call":2}'}
+    assert cache.stats()["in_flight"] == 0
+
+
+async def test_cancelled_waiter_leaves_the_load_running():
+    cache, upstream = ResponseCache(), Upstream()
+    leader = asyncio.create_task(cache.get_or_load(KEY, upstream))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get_or_load(KEY, upstream))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    upstream.release.set()
+
+    assert (await leader)[1] == "MISS"
+    assert upstream.calls == 1
+
+
+async def test_loader_error_reaches_every_waiter_and_is_not_cached():
+    cache = ResponseCache()
+    gate = asyncio.Event()
+
+    async def failing():
+        await gate.wait()
+        raise RuntimeError("upstream down")
+
+    requests = [asyncio.create_task(cache.get_or_load(KEY, failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*requests, return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.stats()["entries"] == 0
+
+
+async def test_invalidation_during_a_load_skips_storing():
+    cache, upstream = ResponseCache(), Upstream()
+    request = asyncio.create_task(cache.get_or_load(KEY, upstream))
+    await asyncio.sleep(0)
+    cache.invalidate(1)
+    upstream.release.set()
+    await request
+
+    assert cache.stats()["entries"] == 0
+
+
+async def test_data_route_serves_repeats_from_the_cache(client, auth_headers):
+    response_cache.clear()
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        await db.execute("INSERT INTO connections (user_id, provider_id, external_id) VALUES (1, 1, 'ext')")
+
+    first = await client.get("/api/v1/data/google/gmail", headers=auth_headers)
+    second = await client.get("/api/v1/data/google/gmail", headers=auth_headers)
+
+    assert first.status_code == second.status_code == 200
+    assert [first.headers["X-Cache"], second.headers["X-Cache"]] == ["MISS", "HIT"]
+    assert first.content == second.content
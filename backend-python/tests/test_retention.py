@@ -0,0 +1,107 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import retention
+from app.database import lock_path, read_connection, sibling_path, write_connection
+from app.locks import FileLock
+from app.retention import AuditRetention, RetentionInProgressError
+
+pytestmark = pytest.mark.anyio
+
+DAYS = [(datetime.utcnow() - timedelta(days=back)).strftime("%Y-%m-%d") for back in (12, 11, 10)]
+
+
+@pytest.fixture
+async def archived(migrated_db, tmp_path):
+    """Eight rows on each of three old days, moved to archives in small batches"""
+    async with write_connection() as db:
+        await db.executemany(
+            "INSERT INTO audit_logs (action, resource, created_at) VALUES (?, ?, ?)",
+            [("login" if hour % 2 else "logout", f"user:{hour}", f"{day} {hour:02d}:00:00")
+             for day in DAYS for hour in range(8)]
+        )
+    audit = AuditRetention(retention_days=7, archive_dir=str(tmp_path / "archive"), batch_size=5, pause=0)
+    result = await audit.run_once()
+    assert result["archived"] == 24
+    return audit
+
+
+def test_sibling_path_is_beside_the_database(tmp_path):
+    database = tmp_path / "data" / "authcenter.db"
+    assert sibling_path("audit_archive", str(database)) == str(tmp_path / "data" / "audit_archive")
+    assert os.path.isabs(sibling_path("audit_archive", "relative.db"))
+
+
+def test_retention_is_opt_in():
+    assert not AuditRetention(retention_days=0).enabled
+
+
+async def test_archived_rows_leave_the_table(archived):
+    async with read_connection() as db:
+        assert (await (await db.execute("SELECT COUNT(*) FROM audit_logs WHERE action IN ('login', 'logout')")).fetchone())[0] == 0
+        days = [row[0] for row in await (await db.execute("SELECT day FROM audit_archives ORDER BY day")).fetchall()]
+    assert days == DAYS
+
+
+async def test_archive_pages_are_newest_first(archived):
+    since = f"{DAYS[0]} 00:00:00"
+    pages, offset = [], 0
+    while True:
+        rows, more = await archived.query_archive(since, None, "login", offset, 3)
+        pages.append([row["created_at"] for row in rows])
+        if not more:
+            break
+        offset += 3
+
+    listed = [created_at for page in pages for created_at in page]
+    assert len(listed) == 12
+    assert listed == sorted(listed, reverse=True)
+    assert [len(page) for page in pages] == [3, 3, 3, 3]
+
+
+async def test_archive_query_stops_reading_once_the_page_is_full(archived, monkeypatch):
+    opened = []
+    real_read = retention.read_archive
+
+    def counting_read(path):
+        opened.append(os.path.basename(path))
+        return real_read(path)
+
+    monkeypatch.setattr(retention, "read_archive", counting_read)
+    rows, more = await archived.query_archive(f"{DAYS[0]} 00:00:00", None, None, 0, 5)
+
+    assert more
+    assert {row["created_at"][:10] for row in rows} == {DAYS[-1]}
+    assert opened == [f"audit_logs_{DAYS[-1]}.ndjson.gz"]
+
+
+async def test_archive_query_validates_the_range(archived):
+    with pytest.raises(ValueError):
+        await archived.query_archive(f"{DAYS[-1]} 00:00:00", f"{DAYS[0]} 00:00:00")
+
+
+async def test_archived_logs_route_pages_with_next_skip(archived, client):
+    params = {"archived": "true", "since": f"{DAYS[0]} 00:00:00", "limit": 20}
+    first = (await client.get("/api/admin/logs", params=params)).json()
+    second = (await client.get("/api/admin/logs", params={**params, "skip": first["next_skip"]})).json()
+
+    assert (len(first["logs"]), first["next_skip"]) == (20, 20)
+    assert (len(second["logs"]), second["next_skip"]) == (4, None)
+
+
+async def test_run_is_refused_while_another_worker_holds_the_lock(migrated_db, tmp_path, client, monkeypatch):
+    audit = AuditRetention(retention_days=7, archive_dir=str(tmp_path / "archive"), pause=0)
+    monkeypatch.setattr(retention.audit_retention, "retention_days", 7)
+    # flock excludes other open files in this process as it would another worker
+    held = FileLock(lock_path(".retention.lock"))
+    assert held.try_acquire()
+    try:
+        with pytest.raises(RetentionInProgressError):
+            await audit.run_once()
+        assert (await client.post("/api/admin/logs/retention/run")).status_code == 409
+    finally:
+        held.release()
+
+    assert (await audit.run_once())["archived"] == 0
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from app.serialization import JSON_BACKENDS, decode_json, row_to_dict
+
+MANIFEST = '{"app":{"name":"crm"},"capabilities":{"operations":["read","sync"],"realtime":true}}'
+
+
+def test_repeated_decodes_share_one_object():
+    assert decode_json(MANIFEST) is decode_json(MANIFEST)
+
+
+def test_shared_result_cannot_be_changed():
+    manifest = decode_json(MANIFEST)
+    with pytest.raises(TypeError):
+        manifest["app"]["name"] = "changed"
+    # Arrays come back as tuples
+    with pytest.raises(AttributeError):
+        manifest["capabilities"]["operations"].append("write")
+    with pytest.raises(TypeError):
+        manifest.pop("app")
+    assert decode_json(MANIFEST)["app"]["name"] == "crm"
+
+
+def test_copy_is_mutable():
+    manifest = dict(decode_json(MANIFEST))
+    manifest["app"] = {"name": "changed"}
+    assert decode_json(MANIFEST)["app"] == {"name": "crm"}
+
+
+@pytest.mark.parametrize("backend", JSON_BACKENDS)
+def test_frozen_values_serialize_like_the_source(backend):
+    try:
+        encoder = JSON_BACKENDS[backend]()
+    except ImportError:
+        pytest.skip(f"{backend} is not installed")
+    item = row_to_dict({"id": 1, "manifest_data": MANIFEST}, ("manifest_data",))
+    assert json.loads(encoder.dumps(item)) == {"id": 1, "manifest_data": json.loads(MANIFEST)}
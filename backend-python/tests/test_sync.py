@@ -0,0 +1,152 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.database import read_connection, write_connection
+from app.google import Page
+from app.sync import SyncEngine, SyncInProgressError, get_checkpoint, get_job, utc_now
+
+pytestmark = pytest.mark.anyio
+
+TARGETS = [{"mapping_id": 1, "app": "CRM", "url": "http://crm.test/sync", "fields": ["id"]}]
+
+
+class Pages:
+    """Page stream that can block before its last page and fail on close"""
+
+    def __init__(self, pages, fail_close: bool = False):
+        self.pages = list(pages)
+        self.fail_close = fail_close
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.pages:
+            raise StopAsyncIteration
+        if len(self.pages) == 1:
+            await self.gate.wait()
+        return self.pages.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+        if self.fail_close:
+            raise RuntimeError("stream close failed")
+
+
+def app_server(received):
+    def handler(request):
+        received.append(json.loads(request.content))
+        return httpx.Response(200)
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.fixture
+async def connection_id(migrated_db):
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        cursor = await db.execute("INSERT INTO connections (user_id, provider_id, external_id) VALUES (1, 1, 'ext')")
+        return cursor.lastrowid
+
+
+def two_pages():
+    return [Page([{"id": 1, "x": 1}, {"id": 2}, {"id": 3}], "p2", None), Page([{"id": 4}], None, "d1")]
+
+
+async def running_jobs(connection_id):
+    async with read_connection() as db:
+        cursor = await db.execute(
+            "SELECT COUNT(*) FROM sync_jobs WHERE connection_id = ? AND status = 'running'", (connection_id,)
+        )
+        return (await cursor.fetchone())[0]
+
+
+async def test_run_pushes_batches_and_checkpoints(connection_id):
+    received = []
+    engine = SyncEngine(batch_size=2)
+
+    result = await engine.run(app_server(received), 1, "google", "gmail", connection_id, Pages(two_pages()), TARGETS)
+
+    assert result["status"] == "completed"
+    assert [[r["data"] for r in body["records"]] for body in received] == [[{"id": 1}, {"id": 2}], [{"id": 3}], [{"id": 4}]]
+    checkpoint = await get_checkpoint(connection_id, "gmail")
+    assert (checkpoint["page_token"], checkpoint["delta_token"], checkpoint["records_synced"]) == (None, "d1", 4)
+    assert (await get_job(result["job_id"]))["status"] == "completed"
+
+
+async def test_failing_stream_close_still_records_the_end(connection_id):
+    engine = SyncEngine()
+    pages = Pages(two_pages(), fail_close=True)
+
+    result = await engine.run(app_server([]), 1, "google", "gmail", connection_id, pages, TARGETS)
+
+    assert pages.closed
+    assert (await get_job(result["job_id"]))["status"] == "completed"
+    assert engine.running_job(connection_id, "gmail") is None
+
+
+async def test_failing_status_write_frees_the_slot(connection_id, monkeypatch):
+    engine = SyncEngine()
+    pages = Pages(two_pages())
+
+    def failing_after_close():
+        # The terminal UPDATE is the only write after the stream is closed
+        if pages.closed:
+            raise RuntimeError("database is locked")
+        return write_connection()
+
+    monkeypatch.setattr("app.sync.write_connection", failing_after_close)
+    result = await engine.run(app_server([]), 1, "google", "gmail", connection_id, pages, TARGETS)
+
+    assert result["status"] == "completed"
+    assert engine.running_job(connection_id, "gmail") is None
+    assert await running_jobs(connection_id) == 1
+
+
+async def test_cancelled_run_is_recorded_as_interrupted(connection_id):
+    engine = SyncEngine()
+    pages = Pages(two_pages())
+    pages.gate.clear()
+    run = asyncio.create_task(engine.run(app_server([]), 1, "google", "gmail", connection_id, pages, TARGETS, "job-1"))
+    for _ in range(100):
+        if engine.running_job(connection_id, "gmail") and pages.pages == [two_pages()[1]]:
+            break
+        await asyncio.sleep(0.01)
+
+    run.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await run
+
+    assert (await get_job("job-1"))["status"] == "interrupted"
+    assert await running_jobs(connection_id) == 0
+
+
+async def test_live_running_row_blocks_a_second_worker(connection_id):
+    async with write_connection() as db:
+        await db.execute("""
+            INSERT INTO sync_jobs (id, connection_id, provider, service, status, started_at)
+            VALUES ('other-worker', ?, 'google', 'gmail', 'running', ?)
+        """, (connection_id, utc_now()))
+
+    with pytest.raises(SyncInProgressError):
+        await SyncEngine().run(app_server([]), 1, "google", "gmail", connection_id, Pages(two_pages()), TARGETS)
+
+
+async def test_stale_running_row_is_marked_interrupted(connection_id):
+    async with write_connection() as db:
+        await db.execute("""
+            INSERT INTO sync_jobs (id, connection_id, provider, service, status, started_at)
+            VALUES ('dead-worker', ?, 'google', 'gmail', 'running', ?)
+        """, (connection_id, utc_now(-7200)))
+
+    result = await SyncEngine(stale_after=3600).run(
+        app_server([]), 1, "google", "gmail", connection_id, Pages(two_pages()), TARGETS
+    )
+
+    assert result["status"] == "completed"
+    assert (await get_job("dead-worker"))["status"] == "interrupted"
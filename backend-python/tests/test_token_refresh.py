@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from app.connection_cache import get_access_token, get_active_connection
+from app.database import write_connection, read_connection
+from app.google import ProviderError
+from app.token_refresh import TokenRefreshScheduler, format_db_timestamp
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeRefresher:
+    """Stand-in for the provider token endpoint: fails the first `failures` calls"""
+
+    def __init__(self, failures: int = 0, delay: float = 0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, connection):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            raise ProviderError("token endpoint unavailable")
+        return {"access_token": f"new-{connection['id']}-{self.calls}", "expires_in": 3600}
+
+
+@pytest.fixture
+async def connection_id(migrated_db):
+    async with write_connection() as db:
+        await db.execute("INSERT INTO users (id, email, name) VALUES (1, 'user1@example.com', 'User 1')")
+        cursor = await db.execute("""
+            INSERT INTO connections (user_id, provider_id, external_id, access_token, refresh_token, expires_at)
+            VALUES (1, 1, 'ext', 'old-token', 'rt', ?)
+        """, (format_db_timestamp(time.time() - 60),))
+        return cursor.lastrowid
+
+
+async def stored_token(connection_id: int) -> str:
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT access_token FROM connections WHERE id = ?", (connection_id,))
+        return (await cursor.fetchone())[0]
+
+
+async def test_inline_refresh_is_persisted_without_the_scheduler(connection_id):
+    scheduler = TokenRefreshScheduler(refresher=FakeRefresher())
+    expired_at = (await get_active_connection(1, 1))["expires_at"]
+
+    result = await scheduler.refresh(connection_id)
+
+    assert await stored_token(connection_id) == result["access_token"]
+    assert await get_access_token(connection_id) == result["access_token"]
+    # The cached row was invalidated, so the next request does not refresh again
+    assert (await get_active_connection(1, 1))["expires_at"] > expired_at
+    assert scheduler.stats()["pending_writes"] == 0
+
+
+async def test_failed_refresh_is_not_queued_without_the_scheduler(connection_id):
+    scheduler = TokenRefreshScheduler(refresher=FakeRefresher(failures=10), max_retries=1, retry_base=0.001)
+    with pytest.raises(ProviderError):
+        await scheduler.refresh(connection_id)
+    assert scheduler.stats()["queued"] == 0
+    assert await stored_token(connection_id) == "old-token"
+
+
+async def test_concurrent_refreshes_share_one_call_and_retry(connection_id):
+    refresher = FakeRefresher(failures=1, delay=0.01)
+    scheduler = TokenRefreshScheduler(refresher=refresher, retry_base=0.001)
+
+    results = await asyncio.gather(*(scheduler.refresh(connection_id) for _ in range(5)))
+
+    assert len({result["access_token"] for result in results}) == 1
+    assert refresher.calls == 2
+    assert scheduler.counters["coalesced"] == 4
+    assert scheduler.counters["retries"] == 1
+
+
+async def test_cancelled_leader_does_not_cancel_waiters(connection_id):
+    refresher = FakeRefresher(delay=0.05)
+    scheduler = TokenRefreshScheduler(refresher=refresher)
+    leader = asyncio.create_task(scheduler.refresh(connection_id))
+    while not refresher.calls:
+        await asyncio.sleep(0.001)
+    waiters = [asyncio.create_task(scheduler.refresh(connection_id)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    results = await asyncio.gather(*waiters)
+
+    # One waiter took over the refresh and the others coalesced onto it
+    assert refresher.calls == 2
+    assert {result["access_token"] for result in results} == {f"new-{connection_id}-2"}
+    assert await stored_token(connection_id) == f"new-{connection_id}-2"
+
+
+async def test_cancelled_waiter_leaves_the_refresh_running(connection_id):
+    refresher = FakeRefresher(delay=0.05)
+    scheduler = TokenRefreshScheduler(refresher=refresher)
+    leader = asyncio.create_task(scheduler.refresh(connection_id))
+    while not refresher.calls:
+        await asyncio.sleep(0.001)
+    waiter = asyncio.create_task(scheduler.refresh(connection_id))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert (await leader)["access_token"] == f"new-{connection_id}-1"
+    assert refresher.calls == 1
+
+
+async def test_running_scheduler_refreshes_expiring_connections(connection_id):
+    scheduler = TokenRefreshScheduler(refresher=FakeRefresher(), flush_seconds=0.01)
+    await scheduler.start()
+    try:
+        for _ in range(100):
+            if await stored_token(connection_id) != "old-token":
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await scheduler.stop()
+
+    assert (await stored_token(connection_id)).startswith("new-")
+    # Requeued for lead_seconds before the new expiry
+    assert scheduler.stats()["queued"] == 1
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import webhooks
+from app.database import read_connection, write_connection
+from app.webhooks import WebhookDispatcher, notify_apps, webhook_dispatcher
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def webhooks_enabled(monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOKS_ENABLED", True)
+
+
+async def outbox_rows():
+    async with read_connection() as db:
+        cursor = await db.execute("SELECT app_id, event_type, payload FROM webhook_outbox ORDER BY id")
+        return [tuple(row) for row in await cursor.fetchall()]
+
+
+async def mapping_count():
+    async with read_connection() as db:
+        return (await (await db.execute("SELECT COUNT(*) FROM app_mappings")).fetchone())[0]
+
+
+async def test_event_commits_with_the_change(client):
+    response = await client.post("/api/mapping/create", json={"external_service": "gmail", "internal_app_id": 1})
+
+    assert response.status_code == 200
+    assert [(app_id, event_type) for app_id, event_type, _ in await outbox_rows()] == [(1, "mapping.created")]
+
+
+async def test_event_rolls_back_with_the_change(migrated_db):
+    published = webhook_dispatcher.counters["published"]
+    with pytest.raises(RuntimeError):
+        async with write_connection() as db:
+            await notify_apps(db, "mapping.created", {"mapping_id": 1}, app_id=1)
+            raise RuntimeError("mapping insert failed")
+
+    assert await outbox_rows() == []
+    assert webhook_dispatcher.counters["published"] == published
+
+
+async def test_outbox_failure_rolls_back_the_change(client, monkeypatch):
+    async def broken_enqueue(db, events):
+        raise RuntimeError("outbox unavailable")
+
+    monkeypatch.setattr(webhook_dispatcher, "enqueue", broken_enqueue)
+    response = await client.post("/api/mapping/create", json={"external_service": "gmail", "internal_app_id": 1})
+
+    assert response.status_code == 500
+    assert await mapping_count() == 0
+
+
+async def test_dispatcher_is_nudged_after_the_commit(migrated_db, monkeypatch):
+    seen = []
+
+    async def invalidate(keys):
+        # Runs after commit, so another worker polling the outbox already sees the row
+        seen.append((keys, len(await outbox_rows())))
+
+    monkeypatch.setattr(webhooks.shared_cache, "invalidate", invalidate)
+    async with write_connection() as db:
+        assert await notify_apps(db, "mapping.deleted", {"mapping_id": 1}, app_id=1) is None
+        assert seen == []
+
+    assert seen == [(["webhooks:pending"], 1)]
+
+
+async def test_events_for_apps_without_a_webhook_are_skipped(migrated_db):
+    async with write_connection() as db:
+        assert await webhook_dispatcher.enqueue(db, [("mapping.created", {}, 999)]) == 0
+    assert await outbox_rows() == []
+
+
+@pytest.mark.parametrize("url", ["http://host:abc/x", "http://[::1"])
+async def test_malformed_webhook_url_is_a_failed_attempt(migrated_db, monkeypatch, url):
+    receiver = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    monkeypatch.setattr(webhooks, "get_http_client", lambda: receiver)
+    async with write_connection() as db:
+        await db.execute("""
+            INSERT INTO webhook_outbox (app_id, url, event_type, payload, enqueued_at, next_attempt_at)
+            VALUES (1, ?, 'mapping.created', '{}', ?, ?)
+        """, (url, time.time(), time.time()))
+    dispatcher = WebhookDispatcher(max_attempts=1)
+
+    await dispatcher.dispatch_due()
+    await asyncio.gather(*dispatcher._deliveries)
+    await receiver.aclose()
+
+    async with read_connection() as db:
+        row = await (await db.execute("SELECT status, attempts, last_error FROM webhook_outbox")).fetchone()
+    assert (row["status"], row["attempts"]) == ("dead", 1)
+    assert row["last_error"].startswith("InvalidURL")
+    # The claim and the app's concurrency slot are released
+    assert not dispatcher._claimed and dispatcher._app_inflight[1] == 0